@@ -0,0 +1,90 @@
+# api/serializers.py
+"""
+Сериализаторы API. ?fields=a,b оставляет в ответе только перечисленные поля
+(sparse fieldsets) — на верхнем уровне, вложенные записи не трогаются.
+"""
+from rest_framework import serializers
+
+from manga.models import Chapter, Manga
+from users.models import Bookmark
+
+
+def requested_fields(request):
+    """Поля из ?fields=a,b или None, если параметра нет"""
+    if request is None:
+        return None
+    fields = request.query_params.get('fields')
+    if not fields:
+        return None
+    return set(filter(None, (name.strip() for name in fields.split(','))))
+
+
+class SparseFieldsMixin:
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Контекст с запросом есть только у корневого сериализатора
+        fields = requested_fields(self.context.get('request'))
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+    @classmethod
+    def model_fields(cls, names) -> set:
+        """Колонки модели под запрошенные поля (для QuerySet.only)"""
+        declared = cls().fields
+        concrete = {field.attname for field in cls.Meta.model._meta.concrete_fields}
+        sources = {declared[name].source for name in names if name in declared}
+        return sources & concrete
+
+
+class MangaSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    genres = serializers.SlugRelatedField(many=True, read_only=True, slug_field='name')
+    # Меняется вместе со списком глав: клиенту есть смысл перезапрашивать главы
+    chapters_version = serializers.CharField(source='chapters_hash', read_only=True)
+
+    class Meta:
+        model = Manga
+        fields = [
+            'id', 'slug', 'title', 'alternative_titles', 'description', 'source',
+            'cover_url', 'original_url', 'author', 'artist', 'year', 'genres',
+            'total_chapters', 'chapters_version', 'last_chapter_added_at',
+            'views_count', 'bookmarks_count', 'created_at', 'updated_at',
+        ]
+
+
+class ChapterSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+
+    class Meta:
+        model = Chapter
+        fields = [
+            'id', 'number', 'volume', 'title', 'pages_count', 'release_date',
+            'created_at', 'prev_chapter', 'next_chapter',
+        ]
+
+
+class LibraryMangaSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Manga
+        fields = ['id', 'slug', 'title', 'cover_url', 'total_chapters', 'last_chapter_added_at']
+
+
+class LibraryEntrySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Закладка из users.library.library_queryset вместе с прогрессом"""
+    manga = LibraryMangaSerializer(read_only=True)
+    last_chapter = serializers.IntegerField(source='last_chapter_id', read_only=True)
+    last_read_number = serializers.SerializerMethodField()
+    last_read_volume = serializers.IntegerField(read_only=True)
+    unread_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Bookmark
+        fields = [
+            'id', 'manga', 'status', 'created_at', 'last_chapter', 'last_read_number',
+            'last_read_volume', 'unread_count',
+        ]
+
+    def get_last_read_number(self, bookmark):
+        # library_queryset подставляет -1, когда прогресса нет
+        return bookmark.last_read_number if bookmark.last_chapter_id is not None else None
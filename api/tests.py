@@ -0,0 +1,190 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TestCase
+from django.utils import timezone
+from django.urls import reverse
+
+from manga import ingest
+from manga.models import Chapter, Manga
+from parser.parsers import ChapterRef, PageRef
+from users.models import Bookmark, ReadingProgress
+
+
+class ApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for slug in ('a', 'b', 'c'):
+            manga = Manga.objects.create(
+                title=slug.upper(), slug=slug, cover_url='https://e.com/c', original_url='https://e.com/m',
+            )
+            ingest.save_chapters(manga, [ChapterRef(number, 1, '', f'{slug}-{number}') for number in (1, 2, 2.5)])
+        cls.manga = Manga.objects.get(slug='a')
+
+    def setUp(self):
+        caches['tiered'].clear()
+        caches['buffers'].clear()
+        self.addCleanup(caches['tiered'].clear)
+
+    def test_bulk_lookup_with_sparse_fields(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('api:manga-list', args=['v1']), {'slug': 'a,c,x', 'fields': 'slug,title'})
+        results = response.json()['results']
+        self.assertEqual(sorted(item['slug'] for item in results), ['a', 'c'])
+        self.assertEqual(set(results[0]), {'slug', 'title'})
+
+        response = self.client.get(reverse('api:manga-detail', args=['v1', 'a']))
+        self.assertEqual(response.json()['total_chapters'], 3)
+        self.assertIn('genres', response.json())
+
+    def test_updated_since_includes_new_chapters(self):
+        since = timezone.now()
+        Manga.objects.update(updated_at=since)
+        ingest.save_chapters(Manga.objects.get(slug='b'), [ChapterRef(3, 1, '', 'b-3')])
+        response = self.client.get(reverse('api:manga-list', args=['v1']), {'updated_since': since.isoformat()})
+        self.assertEqual([item['slug'] for item in response.json()['results']], ['b'])
+
+    def test_bad_chapter_number_is_not_found(self):
+        for name in ('chapter-pages', 'chapter-manifest'):
+            response = self.client.get(reverse(f'api:{name}', args=['v1', 'a', 'abc']))
+            self.assertEqual(response.status_code, 404)
+
+    def test_manga_pages_ignore_updates_between_pages(self):
+        url = reverse('api:manga-list', args=['v1'])
+        first = self.client.get(url, {'limit': 2, 'fields': 'slug'}).json()
+        self.assertEqual([item['slug'] for item in first['results']], ['c', 'b'])
+        # Ещё не отданный тайтл обновился, пока клиент листал
+        ingest.save_chapters(self.manga, [ChapterRef(3, 1, '', 'a-3')])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([item['slug'] for item in second['results']], ['a'])
+        self.assertIsNone(second['next'])
+
+    def test_chapters_are_paged_by_cursor(self):
+        url = reverse('api:chapter-list', args=['v1', 'a'])
+        first = self.client.get(url, {'limit': 2}).json()
+        self.assertEqual([chapter['number'] for chapter in first['results']], [1, 2])
+        with self.assertNumQueries(2):  # манга + страница глав
+            second = self.client.get(first['next']).json()
+        self.assertEqual([chapter['number'] for chapter in second['results']], [2.5])
+        self.assertIsNone(second['next'])
+
+    def test_etag_answers_not_modified(self):
+        url = reverse('api:manga-detail', args=['v1', 'b'])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Manga.objects.filter(slug='b').update(title='B2')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_pages_are_fetched_once_and_cached(self):
+        parser = mock.Mock()
+        parser.aget_pages = mock.AsyncMock(return_value=[PageRef('https://e.com/1.jpg')])
+        url = reverse('api:chapter-pages', args=['v1', 'a', '2.5'])
+        with mock.patch('api.views.get_parser', return_value=parser):
+            self.client.get(url)
+            response = self.client.get(url)
+
+        self.assertEqual(response.json()['pages'], ['https://e.com/1.jpg'])
+        parser.aget_pages.assert_awaited_once()
+        self.assertEqual(Chapter.objects.get(manga=self.manga, number=2.5).pages_count, 1)
+
+    def test_stale_pages_are_refetched_and_kept_on_source_error(self):
+        chapter = Chapter.objects.filter(manga=self.manga, number=2.5)
+        chapter.update(pages=['https://e.com/old.jpg'], page_meta=[[800, 1200, 1, None]],
+                       pages_fetched_at=timezone.now() - timedelta(days=30))
+        parser = mock.Mock()
+        parser.aget_pages = mock.AsyncMock(side_effect=ConnectionError)
+        url = reverse('api:chapter-pages', args=['v1', 'a', '2.5'])
+        with mock.patch('api.views.get_parser', return_value=parser):
+            self.assertEqual(self.client.get(url).json()['pages'], ['https://e.com/old.jpg'])
+            parser.aget_pages = mock.AsyncMock(return_value=[PageRef('https://e.com/new.jpg')])
+            self.assertEqual(self.client.get(url).json()['pages'], ['https://e.com/new.jpg'])
+
+        refreshed = chapter.get()
+        self.assertEqual(refreshed.page_meta, [])
+        self.assertFalse(refreshed.pages_stale())
+
+    def test_stale_pages_with_same_urls_keep_sizes(self):
+        chapter = Chapter.objects.filter(manga=self.manga, number=2.5)
+        chapter.update(pages=['https://e.com/1.jpg'], page_meta=[[800, 1200, 1, None]],
+                       pages_fetched_at=timezone.now() - timedelta(days=30))
+        parser = mock.Mock()
+        parser.aget_pages = mock.AsyncMock(return_value=[PageRef('https://e.com/1.jpg')])
+        with mock.patch('api.views.get_parser', return_value=parser):
+            for name in ('api:chapter-pages', 'api:chapter-manifest'):
+                chapter.update(pages_fetched_at=timezone.now() - timedelta(days=30))
+                response = self.client.get(reverse(name, args=['v1', 'a', '2.5']))
+                self.assertEqual(response.status_code, 200)
+
+        refreshed = chapter.get()
+        self.assertEqual(refreshed.page_meta, [[800, 1200, 1, None]])
+        self.assertFalse(refreshed.pages_stale())
+
+    def test_manifest_lists_pages_and_neighbors(self):
+        Chapter.objects.filter(manga=self.manga, number=2).update(
+            pages=['https://e.com/1.jpg', 'https://e.com/2.jpg'], page_meta=[[800, 1200, 51234, '"a"'], None],
+            pages_fetched_at=timezone.now(),
+        )
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('api:chapter-manifest', args=['v1', 'a', '2']))
+
+        manifest = response.json()
+        self.assertEqual(manifest['pages'], [
+            {'url': 'https://e.com/1.jpg', 'width': 800, 'height': 1200, 'bytes': 51234, 'hash': '"a"'},
+            {'url': 'https://e.com/2.jpg', 'width': None, 'height': None, 'bytes': None, 'hash': None},
+        ])
+        self.assertEqual(manifest['reader'], '/manga/a/v1/c2/')
+        self.assertEqual(manifest['prev']['manifest'], '/api/v1/manga/a/chapters/1/manifest/')
+        self.assertEqual(manifest['next']['reader'], '/manga/a/v1/c2.5/')
+        self.assertIn('max-age=3600', response['Cache-Control'])
+
+        self.assertContains(self.client.get('/sw.js'), 'const MAX_CHAPTERS = 20;')
+
+    def test_manifest_lists_variant_sources_for_data_saver(self):
+        Chapter.objects.filter(manga=self.manga, number=2).update(
+            pages=['https://e.com/1.jpg'], page_meta=[[800, 1200, 51234, None]], pages_fetched_at=timezone.now(),
+        )
+        response = self.client.get(reverse('api:chapter-manifest', args=['v1', 'a', '2']), HTTP_SAVE_DATA='on')
+        page = response.json()['pages'][0]
+        self.assertEqual(page['src'], '/manga/a/v1/c2/p0/?q=saver')
+        self.assertIn('Save-Data', response['Vary'])
+
+    def test_unmeasured_manifest_queues_probe_instead_of_probing(self):
+        Chapter.objects.filter(manga=self.manga, number=2).update(
+            pages=['https://e.com/1.jpg'], pages_fetched_at=timezone.now(),
+        )
+        with mock.patch('manga.ingest.probe_pages') as probe:
+            response = self.client.get(reverse('api:chapter-manifest', args=['v1', 'a', '2']))
+
+        probe.assert_not_called()
+        self.assertIsNone(response.json()['pages'][0]['width'])
+        self.assertNotIn('max-age', response.get('Cache-Control', ''))
+        chapter = Chapter.objects.get(manga=self.manga, number=2)
+        self.assertEqual(ingest.take_probe_queue(), {chapter.pk})
+
+    def test_library_requires_login_and_reports_progress(self):
+        url = reverse('api:library', args=['v1'])
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+        user = User.objects.create_user('reader', password='pass')
+        Bookmark.objects.create(user=user, manga=self.manga, status='reading')
+        ReadingProgress.objects.create(
+            user=user, manga=self.manga, last_chapter=self.manga.chapters.get(number=2),
+        )
+        self.client.force_login(user)
+        entry = self.client.get(url).json()['results'][0]
+        self.assertEqual(entry['manga']['slug'], 'a')
+        self.assertEqual((entry['last_read_number'], entry['unread_count']), (2, 1))
+
+    def test_library_with_token(self):
+        user = User.objects.create_user('reader', password='pass')
+        Bookmark.objects.create(user=user, manga=self.manga, status='reading')
+
+        response = self.client.post(reverse('api:token', args=['v1']), {'username': 'reader', 'password': 'pass'})
+        token = response.json()['token']
+        response = self.client.get(reverse('api:library', args=['v1']), HTTP_AUTHORIZATION=f'Token {token}')
+        self.assertEqual(response.json()['results'][0]['manga']['slug'], 'a')
@@ -0,0 +1,22 @@
+# api/urls.py
+from django.urls import include, path, re_path
+from rest_framework.authtoken.views import obtain_auth_token
+
+from . import views
+
+app_name = 'api'
+
+v1 = [
+    path('manga/', views.MangaList.as_view(), name='manga-list'),
+    path('manga/<slug:slug>/', views.MangaDetail.as_view(), name='manga-detail'),
+    path('manga/<slug:slug>/chapters/', views.ChapterList.as_view(), name='chapter-list'),
+    path('manga/<slug:slug>/chapters/<str:number>/pages/', views.ChapterPages.as_view(), name='chapter-pages'),
+    path('manga/<slug:slug>/chapters/<str:number>/manifest/', views.ChapterManifest.as_view(),
+         name='chapter-manifest'),
+    path('library/', views.Library.as_view(), name='library'),
+    path('auth/token/', obtain_auth_token, name='token'),
+]
+
+urlpatterns = [
+    re_path(r'^(?P<version>v1)/', include(v1)),
+]
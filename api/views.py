@@ -0,0 +1,203 @@
+# api/views.py
+"""
+Версионированное API только для чтения (/api/v1/): манга, главы, списки
+страниц и манифесты глав, библиотека пользователя.
+
+Списки листаются курсором (?cursor=..., ?limit=N): страница — один запрос
+по индексу без COUNT и OFFSET. ?slug=a,b,c отдаёт несколько тайтлов одним
+запросом, ?updated_since=<ISO-дата> — только изменённые после синхронизации.
+Ответы GET несут ETag; повтор с If-None-Match получает 304 без тела.
+
+Клиенты вне сайта получают токен POST auth/token/ (username, password)
+и передают его в заголовке Authorization: Token <ключ>.
+"""
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers, set_response_etag,
+)
+from django.utils.dateparse import parse_datetime
+from rest_framework import generics, pagination, permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from manga import images, ingest
+from manga.manifest import chapter_manifest
+from manga.models import Chapter, Manga
+from manga.views import _aload_pages
+from parser.parsers import get_parser
+from users import progress
+from users.library import library_queryset
+
+from .serializers import (
+    ChapterSerializer, LibraryEntrySerializer, MangaSerializer, requested_fields,
+)
+
+# Сколько тайтлов можно запросить одним ?slug=
+MAX_BULK_SLUGS = 100
+
+
+class _Cursor(pagination.CursorPagination):
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 500
+
+
+class MangaCursor(_Cursor):
+    # Не по updated_at: его двигают счётчики и ingest, и тайтлы перескакивали бы
+    # между страницами. Изменения отбираются фильтром ?updated_since=
+    ordering = ('-id',)
+
+
+class ChapterCursor(_Cursor):
+    page_size = 200
+    max_page_size = 2000
+    ordering = ('number',)
+
+
+class LibraryCursor(_Cursor):
+    ordering = ('-created_at', '-id')
+
+
+class ETagMixin:
+    """ETag по телу ответа и 304 на If-None-Match (экономит трафик клиентов синхронизации)"""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+            return response
+        response.render()
+        set_response_etag(response)
+        return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+def _split(value: str) -> list:
+    return list(dict.fromkeys(filter(None, (item.strip() for item in value.split(',')))))
+
+
+def _sparse(queryset, serializer_class, request, always=()):
+    """Под ?fields= выбираем только нужные колонки; жанры — только если они запрошены"""
+    fields = requested_fields(request)
+    if fields is None:
+        return queryset.prefetch_related('genres') if queryset.model is Manga else queryset
+    if 'genres' in fields:
+        queryset = queryset.prefetch_related('genres')
+    return queryset.only(*serializer_class.model_fields(fields), *always)
+
+
+class MangaList(ETagMixin, generics.ListAPIView):
+    serializer_class = MangaSerializer
+    pagination_class = MangaCursor
+
+    def get_queryset(self):
+        queryset = Manga.objects.all()
+        params = self.request.query_params
+
+        if 'slug' in params:
+            slugs = _split(params['slug'])
+            if len(slugs) > MAX_BULK_SLUGS:
+                raise ValidationError({'slug': f'Не больше {MAX_BULK_SLUGS} тайтлов за запрос'})
+            queryset = queryset.filter(slug__in=slugs)
+        if 'source' in params:
+            queryset = queryset.filter(source=params['source'])
+        if 'updated_since' in params:
+            since = parse_datetime(params['updated_since'])
+            if since is None:
+                raise ValidationError({'updated_since': 'Ожидается дата в формате ISO 8601'})
+            queryset = queryset.filter(updated_at__gt=since)
+
+        return _sparse(queryset, self.serializer_class, self.request, always=('id',))
+
+
+class MangaDetail(ETagMixin, generics.RetrieveAPIView):
+    serializer_class = MangaSerializer
+    lookup_field = 'slug'
+
+    def get_queryset(self):
+        return _sparse(Manga.objects.all(), self.serializer_class, self.request, always=('id', 'slug'))
+
+
+class ChapterList(ETagMixin, generics.ListAPIView):
+    serializer_class = ChapterSerializer
+    pagination_class = ChapterCursor
+
+    def get_queryset(self):
+        manga = get_object_or_404(Manga.objects.only('id'), slug=self.kwargs['slug'])
+        queryset = Chapter.objects.filter(manga=manga)
+        fields = requested_fields(self.request)
+        if fields is None:
+            return queryset.defer('pages')
+        return queryset.only(*ChapterSerializer.model_fields(fields), 'id', 'number')
+
+
+def _number(number: str) -> float:
+    try:
+        return float(number)
+    except ValueError:
+        raise Http404("Неверный формат номера главы")
+
+
+def _load_pages(chapter, slug: str, number: str):
+    """Кэш Chapter.pages; если он пуст или устарел — страницы у источника (сохраняются в главу)"""
+    if not chapter.pages_stale():
+        return
+    source = chapter.manga.source
+    parser = get_parser(source)
+    if parser is not None:
+        async_to_sync(_aload_pages)(parser, source, slug, chapter.volume, number, chapter)
+
+
+class ChapterPages(ETagMixin, APIView):
+    """Список страниц главы: из кэша Chapter.pages, иначе у источника"""
+
+    def get(self, request, slug, number, **kwargs):
+        chapter = get_object_or_404(
+            Chapter.objects.select_related('manga').only('manga__slug', 'manga__source', 'volume', 'number',
+                                                         'url', 'pages', 'pages_count', 'pages_fetched_at',
+                                                         'page_meta'),
+            manga__slug=slug, number=_number(number),
+        )
+        _load_pages(chapter, slug, number)
+        return Response({'chapter': chapter.id, 'number': chapter.number, 'pages': chapter.pages})
+
+
+class ChapterManifest(ETagMixin, APIView):
+    """Манифест главы (manga/manifest.py) для упреждающей загрузки и чтения без сети"""
+
+    def get(self, request, slug, number, **kwargs):
+        chapter = get_object_or_404(
+            Chapter.objects.select_related('manga', 'prev_chapter', 'next_chapter')
+            .only('manga__slug', 'manga__source', 'volume', 'number', 'url', 'pages', 'pages_count',
+                  'pages_fetched_at', 'page_meta', 'prev_chapter__number', 'prev_chapter__volume',
+                  'next_chapter__number', 'next_chapter__volume'),
+            manga__slug=slug, number=_number(number),
+        )
+        _load_pages(chapter, slug, number)
+        measured = bool(chapter.page_meta)
+        if chapter.pages and not measured:
+            # Страницы измеряет manage.py probe_pages вне запроса, а пока размеры — null
+            ingest.queue_probe(chapter.pk)
+        # Адреса страниц — для уровня качества картинок клиента, как в читалке
+        response = Response(chapter_manifest(chapter, slug, images.image_tier(request)))
+        patch_vary_headers(response, ('Cookie', 'Authorization', 'Save-Data'))
+        if chapter.pages and measured:
+            # Список страниц главы почти не меняется; после срока — ревалидация по ETag.
+            # Неизмеренный манифест клиент перепроверяет сразу: размеры вот-вот появятся
+            patch_cache_control(response, max_age=settings.MANIFEST_MAX_AGE)
+        return response
+
+
+class Library(ETagMixin, generics.ListAPIView):
+    serializer_class = LibraryEntrySerializer
+    pagination_class = LibraryCursor
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        # Библиотека должна видеть ещё не сброшенный прогресс
+        if progress.has_pending(user.id):
+            progress.flush(user_id=user.id)
+        return library_queryset(user)
@@ -5,6 +5,28 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
+
+Профиль ASGI
+------------
+Поиск, карточка манги, читалка и ZIP-загрузка (manga/views.py) — async-вьюхи:
+пока парсер ждёт внешний API, воркер обслуживает другие запросы, и один
+процесс держит сотни медленных запросов без пула потоков.
+
+    PARSER_ASYNC_HTTP=1 CONN_MAX_AGE=0 \\
+    uvicorn luanovel.asgi:application --host 0.0.0.0 --port $PORT \\
+        --workers 2 --limit-concurrency 500 --timeout-keep-alive 5 --no-access-log
+
+- PARSER_ASYNC_HTTP=1 — запросы парсеров через aiohttp, одна сессия (пул
+  соединений, PARSER_ASYNC_CONNECTIONS) на воркер. Без него async-вьюхи
+  тоже работают, но каждый запрос к API занимает поток.
+- CONN_MAX_AGE=0 — под ASGI постоянные соединения с БД не переиспользуются
+  между запросами и копятся; при необходимости ставить пулер (pgbouncer).
+- --workers — по числу ядер: CPU-работа (шаблоны, ZIP) идёт в event loop.
+- Синхронные вьюхи (главная, профиль, закладки) Django выполняет в потоке,
+  middleware проекта поддерживают оба режима.
+
+Под WSGI (gunicorn luanovel.wsgi) async-вьюхи тоже работают, но каждый
+запрос держит поток воркера целиком.
 """
 
 import os
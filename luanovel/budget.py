@@ -0,0 +1,110 @@
+# luanovel/budget.py
+"""
+Учёт SQL-запросов, записей в БД и запросов парсеров к внешним API.
+
+    with track_usage() as usage:
+        ...
+    usage.queries, usage.writes, usage.upstream
+
+Бюджеты по имени URL задаются в settings.REQUEST_BUDGETS
+(поверх settings.REQUEST_BUDGET_DEFAULT).
+
+Счётчик запросов ставится на каждое соединение один раз (connection_created)
+и пишет в активные Usage из contextvar: так учитываются и запросы async-вьюх,
+которые выполняются в потоках sync_to_async со своими соединениями.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from parser.parsers.base import upstream_request
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+LIMITS = ('queries', 'writes', 'upstream')
+
+_active = contextvars.ContextVar('budget_usages', default=())
+
+
+class Usage:
+    """Счётчики ресурсов, потраченных внутри track_usage()"""
+
+    def __init__(self):
+        self.queries = 0
+        self.writes = 0
+        self.upstream = 0
+        self.db_time = 0.0
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in LIMITS}
+
+    def exceeded(self, budget: dict) -> dict:
+        """Возвращает {лимит: (потрачено, разрешено)} для превышенных лимитов"""
+        return {
+            name: (getattr(self, name), budget[name])
+            for name in LIMITS
+            if budget.get(name) is not None and getattr(self, name) > budget[name]
+        }
+
+    def __str__(self):
+        return ' '.join(f'{name}={value}' for name, value in self.as_dict().items())
+
+
+def _execute(execute, sql, params, many, context):
+    usages = _active.get()
+    if not usages:
+        return execute(sql, params, many, context)
+
+    write = sql.lstrip().split(None, 1)[0].upper() in WRITE_STATEMENTS
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        for usage in usages:
+            usage.queries += 1
+            usage.writes += write
+            usage.db_time += elapsed
+
+
+def _install(connection):
+    # В начало списка: execute_wrapper() снимает свои обёртки через pop()
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _execute)
+
+
+@receiver(connection_created)
+def _on_connection_created(sender, connection, **kwargs):
+    _install(connection)
+
+
+@contextmanager
+def track_usage():
+    """Считает запросы ко всем БД и к внешним API в текущем контексте"""
+    usage = Usage()
+    # Соединения этого потока могли открыться до импорта модуля
+    for alias in connections:
+        _install(connections[alias])
+    token = _active.set(_active.get() + (usage,))
+    try:
+        yield usage
+    finally:
+        _active.reset(token)
+
+
+def get_budget(view_name: str = None) -> dict:
+    """Бюджет вьюхи по имени URL ('manga:reader')"""
+    budget = dict(getattr(settings, 'REQUEST_BUDGET_DEFAULT', {}))
+    budget.update(getattr(settings, 'REQUEST_BUDGETS', {}).get(view_name, {}))
+    return budget
+
+
+@receiver(upstream_request)
+def _count_upstream(sender, **kwargs):
+    for usage in _active.get():
+        usage.upstream += 1
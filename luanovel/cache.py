@@ -0,0 +1,300 @@
+# luanovel/cache.py
+"""
+Двухуровневый кэш и пересчёт без «стада».
+
+TieredCache (CACHES['tiered']) — LRU в памяти процесса перед общим для всех
+воркеров бэкендом (CACHES['default']: файлы, БД, Memcached или Redis).
+Локальная копия живёт не дольше LOCAL_TIMEOUT секунд, поэтому удаление
+ключа в одном воркере остальные увидят не позже чем через это время.
+
+get_or_compute()/aget_or_compute() хранят значение вместе со сроком и
+временем вычисления и пересчитывают его заранее с растущей к концу срока
+вероятностью (XFetch), пока остальные отдают ещё живое значение. Если
+значения нет совсем, считает один процесс (блокировка через cache.add),
+остальные ждут его результат не дольше lock_timeout. С metric='<имя>'
+попадания и промахи учитываются в luanovel_cache_requests_total.
+
+FileCache — файловый бэкенд с атомарными между процессами add()/incr():
+на нём держатся эти блокировки и буферы записи (CACHES['buffers']).
+"""
+import asyncio
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+
+from luanovel.metrics import record_cache
+
+_MISSING = object()
+
+
+class _LRU:
+    """Потокобезопасный LRU с истечением записей"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float):
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class FileCache(FileBasedCache):
+    """
+    FileBasedCache, у которого add() не перезаписывает чужой ключ: файл
+    ключа появляется через os.link, который падает, если файл уже есть
+    (в Django add — это has_key + set). incr()/decr() идут под блокировкой
+    на том же add, иначе параллельные инкременты теряются.
+    """
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._createdir()
+        fname = self._key_to_file(key, version)
+        self._cull()
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        try:
+            with open(fd, 'wb') as f:
+                self._write_content(f, timeout, value)
+            for _ in range(2):
+                try:
+                    os.link(tmp_path, fname)
+                    return True
+                except FileExistsError:
+                    # Просроченный файл has_key удаляет — тогда ещё одна попытка
+                    if self.has_key(key, version):
+                        return False
+            return False
+        finally:
+            os.remove(tmp_path)
+
+    def incr(self, key, delta=1, version=None):
+        with lock(self, f'{key}:incr-lock'):
+            return super().incr(key, delta, version)
+
+
+@contextmanager
+def lock(cache, key: str, timeout: float = 5):
+    """
+    Взаимоисключение между воркерами на атомарном cache.add. Блокировка
+    истекает сама через timeout, если держатель упал, — поэтому ожидание
+    не дольше timeout.
+    """
+    while not cache.add(key, 1, timeout):
+        time.sleep(0.005)
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+class TieredCache(BaseCache):
+    """
+    OPTIONS:
+        SHARED: алиас общего кэша (по умолчанию 'default')
+        LOCAL_MAX_ENTRIES: размер LRU в процессе (по умолчанию 1000)
+        LOCAL_TIMEOUT: сколько секунд держать локальную копию (по умолчанию 5)
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'default')
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self._local = _LRU(options.get('LOCAL_MAX_ENTRIES', 1000))
+
+    @property
+    def shared(self) -> BaseCache:
+        return caches[self._shared_alias]
+
+    def _local_ttl(self, timeout) -> float:
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self._local_timeout
+        return min(self._local_timeout, timeout)
+
+    def _remember(self, key, value, version, timeout=DEFAULT_TIMEOUT):
+        self._local.set(self.make_and_validate_key(key, version), value, self._local_ttl(timeout))
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version)
+        value = self._local.get(local_key)
+        if value is not _MISSING:
+            return value
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        self._local.set(local_key, value, self._local_ttl(DEFAULT_TIMEOUT))
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._remember(key, value, version, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._remember(key, value, version, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._local.delete(self.make_and_validate_key(key, version))
+        return self.shared.delete(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local.delete(self.make_and_validate_key(key, version))
+        return self.shared.incr(key, delta, version=version)
+
+    def clear(self):
+        self._local.clear()
+        self.shared.clear()
+
+    # Попадание в локальный уровень отдаём без перехода в поток
+
+    async def aget(self, key, default=None, version=None):
+        value = self._local.get(self.make_and_validate_key(key, version))
+        if value is not _MISSING:
+            return value
+        value = await self.shared.aget(key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        self._remember(key, value, version)
+        return value
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        await self.shared.aset(key, value, timeout, version=version)
+        self._remember(key, value, version, timeout)
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = await self.shared.aadd(key, value, timeout, version=version)
+        if added:
+            self._remember(key, value, version, timeout)
+        return added
+
+    async def adelete(self, key, version=None):
+        self._local.delete(self.make_and_validate_key(key, version))
+        return await self.shared.adelete(key, version=version)
+
+
+def _fresh(entry, beta: float) -> bool:
+    """XFetch: чем ближе срок и дольше пересчёт, тем вероятнее считать заранее"""
+    _, delta, expires_at = entry
+    return time.time() - delta * beta * math.log(1 - random.random()) < expires_at
+
+
+def _entry(value, started: float, timeout: int):
+    now = time.time()
+    return value, now - started, now + timeout
+
+
+def _cache(cache):
+    return caches['tiered'] if cache is None else cache
+
+
+def _record(metric, hit: bool):
+    if metric:
+        record_cache(metric, hit)
+
+
+def get_or_compute(key, compute, timeout: int, cache=None, beta: float = 1.0,
+                   lock_timeout: float = 10, should_cache=None, metric: str = None):
+    """
+    Значение из кэша или compute() с защитой от одновременного пересчёта.
+    should_cache(value) -> False — не сохранять (например, пустой ответ при сбое источника).
+    """
+    cache = _cache(cache)
+    lock_key = f'{key}:lock'
+    entry = cache.get(key)
+    if entry is not None:
+        if _fresh(entry, beta) or not cache.add(lock_key, 1, lock_timeout):
+            _record(metric, True)
+            return entry[0]
+    elif not cache.add(lock_key, 1, lock_timeout):
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None:
+                _record(metric, True)
+                return entry[0]
+        _record(metric, False)
+        return compute()
+
+    _record(metric, False)
+    try:
+        started = time.time()
+        value = compute()
+        if should_cache is None or should_cache(value):
+            # Запись живёт дольше срока: её отдают, пока один процесс пересчитывает
+            cache.set(key, _entry(value, started, timeout), timeout + lock_timeout)
+        return value
+    finally:
+        cache.delete(lock_key)
+
+
+async def aget_or_compute(key, compute, timeout: int, cache=None, beta: float = 1.0,
+                          lock_timeout: float = 10, should_cache=None, metric: str = None):
+    """Async-вариант get_or_compute: compute — корутинная функция"""
+    cache = _cache(cache)
+    lock_key = f'{key}:lock'
+    entry = await cache.aget(key)
+    if entry is not None:
+        if _fresh(entry, beta) or not await cache.aadd(lock_key, 1, lock_timeout):
+            _record(metric, True)
+            return entry[0]
+    elif not await cache.aadd(lock_key, 1, lock_timeout):
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            entry = await cache.aget(key)
+            if entry is not None:
+                _record(metric, True)
+                return entry[0]
+        _record(metric, False)
+        return await compute()
+
+    _record(metric, False)
+    try:
+        started = time.time()
+        value = await compute()
+        if should_cache is None or should_cache(value):
+            await cache.aset(key, _entry(value, started, timeout), timeout + lock_timeout)
+        return value
+    finally:
+        await cache.adelete(lock_key)
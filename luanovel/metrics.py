@@ -0,0 +1,377 @@
+# luanovel/metrics.py
+"""
+Метрики в формате Prometheus без внешних зависимостей.
+
+Значения копятся в памяти процесса, но /metrics отдаёт любой из воркеров
+gunicorn, а instance у них общий. Поэтому при заданном METRICS_DIR каждый
+процесс фоновым потоком раз в METRICS_SYNC_INTERVAL секунд (а также перед
+ответом /metrics и при выходе) пишет свой снимок в METRICS_DIR/<pid>.json,
+а /metrics отдаёт сумму снимков. Снимки завершившихся процессов сливаются
+в archive.json, чтобы счётчики не убывали, в том числе когда pid достаётся
+новому воркеру. Каталог очищается, когда его занимает процесс нового запуска
+сервиса (с другим родителем — мастером gunicorn). Без METRICS_DIR
+(runserver, тесты) отдаются значения одного процесса.
+Отдаются вьюхой luanovel.views.metrics (/metrics, по токену METRICS_TOKEN).
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.dispatch import receiver
+
+from parser.parsers.base import upstream_request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(label_values), value] for label_values, value in self._values.items()]
+
+    @staticmethod
+    def merge(values: dict, snapshot: list):
+        for label_values, value in snapshot:
+            key = tuple(label_values)
+            values[key] = values.get(key, 0) + value
+
+    def samples(self, values=None):
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labels, label_values), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * len(self.buckets), 0, 0.0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += 1
+            state[2] += value
+
+    def count(self, *label_values) -> int:
+        state = self._values.get(label_values)
+        return state[1] if state else 0
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(label_values), [[*state[0]], state[1], state[2]]]
+                    for label_values, state in self._values.items()]
+
+    @staticmethod
+    def merge(values: dict, snapshot: list):
+        for label_values, (counts, total, amount) in snapshot:
+            key = tuple(label_values)
+            state = values.get(key)
+            if state is None:
+                values[key] = [[*counts], total, amount]
+                continue
+            state[0] = [mine + theirs for mine, theirs in zip(state[0], counts)]
+            state[1] += total
+            state[2] += amount
+
+    def samples(self, values=None):
+        if values is None:
+            with self._lock:
+                values = {key: [[*state[0]], state[1], state[2]] for key, state in self._values.items()}
+        for label_values, (counts, total, amount) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield (f'{self.name}_bucket',
+                       _format_labels(self.labels, label_values, ('le', _format_value(float(bound)))),
+                       cumulative)
+            yield f'{self.name}_bucket', _format_labels(self.labels, label_values, ('le', '+Inf')), total
+            yield f'{self.name}_sum', _format_labels(self.labels, label_values), amount
+            yield f'{self.name}_count', _format_labels(self.labels, label_values), total
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def merge(self, snapshots) -> dict:
+        """Сумма снимков процессов: {имя метрики: {метки: значение}}"""
+        merged = {}
+        for metric in self._metrics.values():
+            values = merged[metric.name] = {}
+            for snapshot in snapshots:
+                metric.merge(values, snapshot.get(metric.name, ()))
+        return merged
+
+    def render(self, snapshots=None) -> str:
+        """Текст для Prometheus; snapshots — снимки процессов (суммируются) вместо своих значений"""
+        merged = self.merge(snapshots) if snapshots is not None else {}
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples(merged.get(metric.name)):
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+ARCHIVE = 'archive.json'
+PARENT = 'parent'
+
+# Процесс, который уже занял свой <pid>.json, и процесс с запущенным потоком записи
+# (после fork pid другой: и поток, и снимок нужны заново)
+_started_pid = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def _directory():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    return Path(directory) if directory else None
+
+
+def _dir_lock():
+    # luanovel.cache сам пишет в метрики, поэтому импорт здесь
+    from luanovel.cache import lock
+    return lock(caches['buffers'], 'metrics-dir', timeout=10)
+
+
+def _read(path: Path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path: Path, data):
+    tmp = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, path)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _process_snapshots(directory: Path) -> list:
+    return [path for path in directory.glob('*.json') if path.stem.isdigit()]
+
+
+def _archive(directory: Path, paths):
+    """Сливает снимки завершившихся процессов в archive.json (под _dir_lock)"""
+    snapshots = [snapshot for snapshot in map(_read, paths) if snapshot]
+    if snapshots:
+        merged = registry.merge([_read(directory / ARCHIVE) or {}, *snapshots])
+        _write(directory / ARCHIVE, {name: [[list(labels), value] for labels, value in values.items()]
+                                     for name, values in merged.items()})
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+def _start(directory: Path):
+    """
+    Первая запись процесса. Новый запуск сервиса (другой родитель) очищает
+    каталог; снимок с нашим pid остался от умершего процесса — в архив.
+    """
+    global _started_pid
+    directory.mkdir(parents=True, exist_ok=True)
+    parent = str(os.getppid())
+    with _dir_lock():
+        marker = directory / PARENT
+        try:
+            current = marker.read_text()
+        except OSError:
+            current = None
+        if current != parent:
+            for path in [*_process_snapshots(directory), directory / ARCHIVE]:
+                path.unlink(missing_ok=True)
+            marker.write_text(parent)
+        else:
+            _archive(directory, [directory / f'{os.getpid()}.json'])
+    _started_pid = os.getpid()
+
+
+def sync():
+    """Записывает снимок процесса в METRICS_DIR/<pid>.json (атомарно)"""
+    directory = _directory()
+    if directory is None:
+        return
+    path = directory / f'{os.getpid()}.json'
+    try:
+        if _started_pid != os.getpid():
+            _start(directory)
+        _write(path, registry.snapshot())
+    except OSError as e:
+        logger.warning(f"Не удалось записать снимок метрик {path}: {e}")
+
+
+def _write_loop():
+    while True:
+        time.sleep(getattr(settings, 'METRICS_SYNC_INTERVAL', 5))
+        sync()
+
+
+def _ensure_writer():
+    """Запускает в процессе фоновый поток записи снимка: запросы сами файлы не пишут"""
+    global _writer_pid
+    if _writer_pid == os.getpid() or _directory() is None:
+        return
+    with _writer_lock:
+        if _writer_pid == os.getpid():
+            return
+        _writer_pid = os.getpid()
+        threading.Thread(target=_write_loop, name='metrics-sync', daemon=True).start()
+        atexit.register(sync)
+
+
+def render() -> str:
+    """Метрики всех процессов (снимки METRICS_DIR и архив завершившихся) или только этого процесса"""
+    directory = _directory()
+    if directory is None:
+        return registry.render()
+    sync()
+    with _dir_lock():
+        _archive(directory, [path for path in _process_snapshots(directory) if not _alive(int(path.stem))])
+        snapshots = [_read(path) for path in [*_process_snapshots(directory), directory / ARCHIVE]]
+    return registry.render([snapshot for snapshot in snapshots if snapshot])
+
+request_duration = registry.register(Histogram(
+    'luanovel_request_duration_seconds', 'Время обработки запроса по имени URL',
+    labels=('view', 'method'),
+))
+request_db_time = registry.register(Histogram(
+    'luanovel_request_db_seconds', 'Суммарное время SQL-запросов за запрос',
+    labels=('view',),
+))
+request_queries = registry.register(Counter(
+    'luanovel_db_queries_total', 'Количество SQL-запросов', labels=('view',),
+))
+responses = registry.register(Counter(
+    'luanovel_responses_total', 'Ответы по статусу', labels=('view', 'status'),
+))
+upstream_duration = registry.register(Histogram(
+    'luanovel_upstream_duration_seconds', 'Время запросов парсеров к внешним API',
+    labels=('source', 'operation'),
+))
+upstream_errors = registry.register(Counter(
+    'luanovel_upstream_errors_total', 'Ошибки запросов парсеров', labels=('source', 'operation'),
+))
+upstream_bytes = registry.register(Histogram(
+    'luanovel_upstream_response_bytes', 'Размер ответов внешних API',
+    labels=('source', 'operation'), buckets=SIZE_BUCKETS,
+))
+cache_requests = registry.register(Counter(
+    'luanovel_cache_requests_total', 'Обращения к кэшам', labels=('cache', 'result'),
+))
+
+image_bytes = registry.register(Counter(
+    'luanovel_image_bytes_total', 'Байты картинок: оригиналы и отданные варианты (manga/images.py)',
+    labels=('format', 'tier', 'kind'),
+))
+
+
+def record_image(fmt: str, tier: str, original: int, served: int):
+    """Отданный вариант картинки: разница original и served — сэкономленный трафик"""
+    image_bytes.inc(fmt, tier, 'original', amount=original)
+    image_bytes.inc(fmt, tier, 'served', amount=served)
+
+
+def record_cache(cache_name: str, hit: bool):
+    """Учитывает попадание/промах кэша (для hit ratio)"""
+    cache_requests.inc(cache_name, 'hit' if hit else 'miss')
+
+
+def record_request(view: str, method: str, status: int, duration: float, usage=None):
+    view = view or 'unmatched'
+    request_duration.observe(duration, view, method)
+    responses.inc(view, str(status))
+    if usage is not None:
+        request_db_time.observe(usage.db_time, view)
+        request_queries.inc(view, amount=usage.queries)
+    _ensure_writer()
+
+
+@receiver(upstream_request)
+def _record_upstream(sender, source=None, operation='', duration=0.0, error=None, size=0, **kwargs):
+    source = source or 'unknown'
+    upstream_duration.observe(duration, source, operation)
+    if error is not None:
+        upstream_errors.inc(source, operation)
+    else:
+        upstream_bytes.observe(size, source, operation)
@@ -0,0 +1,153 @@
+# luanovel/middleware.py
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics, routers
+from .budget import get_budget, track_usage
+
+logger = logging.getLogger(__name__)
+
+
+class _HybridMiddleware:
+    """
+    База для middleware, работающих и под WSGI, и под ASGI без перехода в поток:
+    в async-цепочке __call__ возвращает корутину.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+
+class AsyncWhiteNoiseMiddleware(_HybridMiddleware, WhiteNoiseMiddleware):
+    """
+    WhiteNoise только синхронный: под ASGI Django держал бы поток на каждый
+    запрос, пока ниже по цепочке работает async-вьюха. Статику отдаём так же,
+    остальное передаём дальше без смены режима.
+    """
+
+    def __init__(self, get_response, **kwargs):
+        WhiteNoiseMiddleware.__init__(self, get_response, **kwargs)
+        _HybridMiddleware.__init__(self, get_response)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class RequestBudgetMiddleware(_HybridMiddleware):
+    """
+    Считает SQL-запросы, записи и вызовы парсеров за запрос и пишет
+    в лог запросы, превысившие бюджет своей вьюхи.
+
+    Стоит после SessionMiddleware: сохранение сессии (SESSION_SAVE_EVERY_REQUEST)
+    не зависит от вьюхи и в её бюджет не входит; загрузка сессии и пользователя
+    входит — она ленивая и происходит во вьюхе.
+    """
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with track_usage() as usage:
+            request.usage = usage
+            response = self.get_response(request)
+        return self._finish(request, response, usage)
+
+    async def __acall__(self, request):
+        with track_usage() as usage:
+            request.usage = usage
+            response = await self.get_response(request)
+        return self._finish(request, response, usage)
+
+    def _finish(self, request, response, usage):
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else None
+
+        exceeded = usage.exceeded(get_budget(view_name))
+        if exceeded:
+            details = ', '.join(
+                f'{name}={spent} (лимит {limit})' for name, (spent, limit) in exceeded.items()
+            )
+            logger.warning(f"Request budget exceeded: {request.method} {request.path} [{view_name}] {details}")
+
+        if settings.DEBUG:
+            response['X-Request-Budget'] = str(usage)
+        return response
+
+
+class MetricsMiddleware(_HybridMiddleware):
+    """
+    Латентность и статусы ответов по имени URL для /metrics.
+    Время SQL берётся из RequestBudgetMiddleware (request.usage), если он подключён.
+    """
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        return self._finish(request, response, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        return self._finish(request, response, started)
+
+    def _finish(self, request, response, started):
+        match = getattr(request, 'resolver_match', None)
+        if match is None or match.url_name != 'metrics':
+            metrics.record_request(
+                match.view_name if match else None,
+                request.method,
+                response.status_code,
+                time.perf_counter() - started,
+                getattr(request, 'usage', None),
+            )
+        return response
+
+
+class ReplicaPinMiddleware(_HybridMiddleware):
+    """
+    Read-your-writes для реплик (luanovel.routers): после записи в каталог
+    клиент получает cookie и REPLICA_STICKY_SECONDS читает каталог с основной базы.
+    """
+    cookie_name = 'db_primary'
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with routers.pin_requests(self.cookie_name in request.COOKIES) as pin:
+            response = self.get_response(request)
+        return self._finish(response, pin)
+
+    async def __acall__(self, request):
+        with routers.pin_requests(self.cookie_name in request.COOKIES) as pin:
+            response = await self.get_response(request)
+        return self._finish(response, pin)
+
+    def _finish(self, response, pin):
+        if pin.wrote and routers.replicas():
+            response.set_cookie(
+                self.cookie_name, '1',
+                max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 10),
+                httponly=True, samesite='Lax',
+            )
+        return response
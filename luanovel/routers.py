@@ -0,0 +1,101 @@
+# luanovel/routers.py
+"""
+Маршрутизация БД: чтение каталога (приложение manga) идёт на реплики,
+всё остальное (сессии, auth, прогресс, закладки) и любые записи — на
+основную базу.
+
+Реплики задаются в DATABASE_REPLICA_URLS и попадают в settings.DATABASE_REPLICAS.
+Запрос читает с одной реплики, выбранной при первом чтении.
+Read-your-writes: после записи в каталог запрос до конца читает с основной
+базы, а ReplicaPinMiddleware ставит клиенту cookie, по которой его запросы
+ещё REPLICA_STICKY_SECONDS не ходят на реплики, пока те догоняют основную.
+Записи вне каталога (сессии, прогресс) и сброс буферов (unpinned_writes)
+клиента не закрепляют: с реплик читается только каталог.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = 'default'
+CATALOG_APPS = {'manga'}
+
+
+class _Pin:
+    """Состояние запроса: закреплён ли он за основной базой, была ли запись в каталог, его реплика"""
+    __slots__ = ('pinned', 'wrote', 'replica')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+        self.replica = None
+
+
+# Объект, а не флаг: sync_to_async копирует контекст, и запись в потоке
+# должна быть видна middleware
+_request_pin = ContextVar('db_request_pin', default=None)
+_unpinned = ContextVar('db_unpinned_writes', default=False)
+
+
+@contextmanager
+def pin_requests(pinned=False):
+    """Область одного запроса; pinned=True — читать только с основной базы"""
+    pin = _Pin(pinned)
+    token = _request_pin.set(pin)
+    try:
+        yield pin
+    finally:
+        _request_pin.reset(token)
+
+
+@contextmanager
+def unpinned_writes():
+    """Записи, после которых читать с основной базы не нужно (сброс буферов)"""
+    token = _unpinned.set(True)
+    try:
+        yield
+    finally:
+        _unpinned.reset(token)
+
+
+def replicas() -> list:
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in CATALOG_APPS or not replicas():
+            return PRIMARY
+        pin = _request_pin.get()
+        if pin is not None and (pin.pinned or pin.wrote):
+            return PRIMARY
+        # Внутри транзакции читаем то, что сами же записали
+        if connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        if pin is None:
+            return random.choice(replicas())
+        if pin.replica is None:
+            pin.replica = random.choice(replicas())
+        return pin.replica
+
+    def db_for_write(self, model, **hints):
+        pin = _request_pin.get()
+        if pin is not None and model._meta.app_label in CATALOG_APPS and not _unpinned.get():
+            pin.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы
+        aliases = {PRIMARY, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема на реплики приходит репликацией
+        if db in replicas():
+            return False
+        return None
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import sys
 import dj_database_url
 
 load_dotenv()
@@ -42,15 +43,22 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     
+    'rest_framework',
+    'rest_framework.authtoken',
+
     'manga',
     'users',
+    'api',
 
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'luanovel.middleware.AsyncWhiteNoiseMiddleware',
+    'luanovel.middleware.MetricsMiddleware',
+    'luanovel.middleware.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'luanovel.middleware.RequestBudgetMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -85,8 +93,72 @@ DATABASES = {
     'default': dj_database_url.config(
         # Если переменной DATABASE_URL нет (локально), используем SQLite
         default=f'sqlite:///{os.path.join(BASE_DIR, "db.sqlite3")}',
-        conn_max_age=600
+        # Под ASGI (см. luanovel/asgi.py) — CONN_MAX_AGE=0
+        conn_max_age=int(os.getenv('CONN_MAX_AGE', 600))
+    )
+}
+
+# Реплики для чтения каталога (luanovel.routers), URL через запятую.
+# Локально можно указать копию (или ту же) SQLite-базу: sqlite:///db.sqlite3
+DATABASE_REPLICAS = []
+for _i, _url in enumerate(filter(None, os.getenv('DATABASE_REPLICA_URLS', '').split(','))):
+    DATABASES[f'replica_{_i}'] = dj_database_url.parse(
+        _url.strip(), conn_max_age=int(os.getenv('CONN_MAX_AGE', 600))
     )
+    DATABASES[f'replica_{_i}']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(f'replica_{_i}')
+
+DATABASE_ROUTERS = ['luanovel.routers.ReplicaRouter']
+# Сколько секунд после записи клиент читает с основной базы
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
+
+# Кэш (luanovel/cache.py). default — общий для всех воркеров бэкенд:
+# file | db (manage.py createcachetable) | memcached | redis | locmem.
+# tiered — LRU в памяти процесса перед default для горячих ключей.
+# Тесты всегда идут на locmem, а не на .cache/ в репозитории.
+TESTING = sys.argv[1:2] == ['test']
+CACHE_BACKEND = 'locmem' if TESTING else os.getenv('CACHE_BACKEND', 'file')
+CACHE_LOCATION = os.getenv('CACHE_LOCATION')
+_CACHE_BACKENDS = {
+    'file': ('luanovel.cache.FileCache', os.path.join(BASE_DIR, '.cache')),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'luanovel_cache'),
+    'memcached': ('django.core.cache.backends.memcached.PyMemcacheCache', '127.0.0.1:11211'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379'),
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+}
+_CACHE_LOCATION = CACHE_LOCATION or _CACHE_BACKENDS[CACHE_BACKEND][1]
+# Буферы записи (прогресс, счётчики) и их блокировки — отдельно от кэша:
+# ключи с timeout=None живут до сброса в БД, вытеснять их нельзя. Для file,
+# db и locmem — своя папка/таблица/область без предела MAX_ENTRIES; redis
+# общий (сам не вытесняет ключи без срока при noeviction/volatile-*).
+# memcached вытесняет что угодно при нехватке памяти — для буферов не годится.
+_BUFFERS_LOCATION = {
+    'file': os.path.join(_CACHE_LOCATION, 'buffers'),
+    'db': 'luanovel_buffers',
+    'locmem': 'buffers',
+}
+CACHES = {
+    'default': {
+        'BACKEND': _CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': _CACHE_LOCATION,
+        'TIMEOUT': 3600,
+    },
+    'buffers': {
+        'BACKEND': _CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': _BUFFERS_LOCATION.get(CACHE_BACKEND, _CACHE_LOCATION),
+        'KEY_PREFIX': 'buffers',
+        'TIMEOUT': None,
+        **({'OPTIONS': {'MAX_ENTRIES': 10 ** 9}} if CACHE_BACKEND in _BUFFERS_LOCATION else {}),
+    },
+    'tiered': {
+        'BACKEND': 'luanovel.cache.TieredCache',
+        'OPTIONS': {
+            'SHARED': 'default',
+            'LOCAL_MAX_ENTRIES': int(os.getenv('CACHE_LOCAL_MAX_ENTRIES', 1000)),
+            'LOCAL_TIMEOUT': int(os.getenv('CACHE_LOCAL_TIMEOUT', 5)),
+        },
+    },
 }
 
 
@@ -141,4 +213,111 @@ LOGOUT_REDIRECT_URL = '/'
 
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 SESSION_COOKIE_AGE = 1209600
-SESSION_SAVE_EVERY_REQUEST = True
\ No newline at end of file
+SESSION_SAVE_EVERY_REQUEST = True
+
+# Буфер прогресса чтения (users/progress.py): сброс в БД пачкой
+PROGRESS_BUFFER_SIZE = int(os.getenv('PROGRESS_BUFFER_SIZE', 200))
+PROGRESS_FLUSH_INTERVAL = int(os.getenv('PROGRESS_FLUSH_INTERVAL', 30))
+
+# Бюджеты запроса (luanovel/middleware.py): SQL-запросы, записи в БД и
+# вызовы парсеров. Превышение пишется в лог, в тестах — BudgetTestMixin.
+# Бюджеты рассчитаны на «тёплый» путь: первая загрузка тайтла с источника
+# в них не укладывается и будет видна в логе. None — без лимита.
+REQUEST_BUDGET_DEFAULT = {'queries': 30, 'writes': 5, 'upstream': 3}
+REQUEST_BUDGETS = {
+    'manga:home': {'queries': 6, 'writes': 1, 'upstream': 0},
+    'manga:search': {'queries': 3, 'writes': 1, 'upstream': 2},
+    'manga:api_search': {'queries': 3, 'writes': 1, 'upstream': 1},
+    'manga:detail': {'queries': 10, 'writes': 1, 'upstream': 0},
+    'manga:detail_with_source': {'queries': 10, 'writes': 1, 'upstream': 0},
+    # +2 запроса у вошедшего читателя: сессия и пользователь
+    'manga:reader': {'queries': 6, 'writes': 1, 'upstream': 1},
+    'manga:reader_with_source': {'queries': 6, 'writes': 1, 'upstream': 1},
+    'manga:download_chapter': {'queries': 4, 'writes': 1, 'upstream': None},
+    'manga:download_chapter_with_source': {'queries': 4, 'writes': 1, 'upstream': None},
+    'users:profile': {'queries': 6, 'writes': 1, 'upstream': 0},
+    'api:manga-list': {'queries': 3, 'writes': 1, 'upstream': 0},
+    'api:manga-detail': {'queries': 3, 'writes': 1, 'upstream': 0},
+    'api:chapter-list': {'queries': 3, 'writes': 1, 'upstream': 0},
+    'api:chapter-pages': {'queries': 3, 'writes': 1, 'upstream': 1},
+    'api:chapter-manifest': {'queries': 3, 'writes': 2, 'upstream': None},
+    'manga:service_worker': {'queries': 0, 'writes': 0, 'upstream': 0},
+    'manga:page_image': {'queries': 1, 'writes': 0, 'upstream': 1},
+    'manga:cover': {'queries': 1, 'writes': 0, 'upstream': 1},
+    'manga:page_tile': {'queries': 1, 'writes': 0, 'upstream': 1},
+    'api:library': {'queries': 6, 'writes': 1, 'upstream': 0},
+}
+
+# API (api/): только JSON, версия в пути (/api/v1/)
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+    # Token — для мобильных и сторонних клиентов (POST /api/v1/auth/token/), сессия — для сайта
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.TokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
+    'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.URLPathVersioning',
+    'ALLOWED_VERSIONS': ['v1'],
+}
+
+# /metrics (luanovel/metrics.py) отдаётся только с заголовком Authorization: Bearer <токен>
+# (bearer_token в scrape_config Prometheus); без токена /metrics выключен
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+# Общий каталог снимков метрик воркеров: /metrics отдаёт их сумму (пусто — только
+# свой процесс). METRICS_SYNC_INTERVAL — как часто воркер пишет свой снимок
+METRICS_DIR = None if TESTING else os.getenv('METRICS_DIR', os.path.join(BASE_DIR, '.cache', 'metrics')) or None
+METRICS_SYNC_INTERVAL = float(os.getenv('METRICS_SYNC_INTERVAL', 5))
+
+# Транспорт парсеров (parser/parsers/transport.py): live | record | replay
+PARSER_TRANSPORT = os.getenv('PARSER_TRANSPORT', 'live')
+PARSER_FIXTURES_DIR = os.getenv('PARSER_FIXTURES_DIR', os.path.join(BASE_DIR, 'fixtures', 'upstream'))
+# Адрес заглушки внешних API (manage.py stub_upstream), например http://127.0.0.1:8765
+PARSER_UPSTREAM_URL = os.getenv('PARSER_UPSTREAM_URL') or None
+# Async-вызовы парсеров через aiohttp (профиль ASGI); иначе синхронный запрос в потоке
+PARSER_ASYNC_HTTP = os.getenv('PARSER_ASYNC_HTTP', '0') == '1'
+PARSER_ASYNC_CONNECTIONS = int(os.getenv('PARSER_ASYNC_CONNECTIONS', 100))
+
+# import_catalog: запросов в секунду к каждому источнику
+IMPORT_RATE_LIMITS = {
+    'mangalib': float(os.getenv('IMPORT_RATE_MANGALIB', 3)),
+    'senkuro': float(os.getenv('IMPORT_RATE_SENKURO', 2)),
+}
+# Persisted-запрос каталога Senkuro (хэш снимается из запросов сайта).
+# Без хэша import_catalog --source senkuro недоступен
+SENKURO_CATALOG_QUERY_HASH = os.getenv('SENKURO_CATALOG_QUERY_HASH') or None
+SENKURO_CATALOG_OPERATION = os.getenv('SENKURO_CATALOG_OPERATION', 'fetchMangas')
+
+# Сколько секунд хранить результаты поиска по источникам (кэш tiered)
+SEARCH_CACHE_TIMEOUT = int(os.getenv('SEARCH_CACHE_TIMEOUT', 300))
+# Отрендеренный список глав страницы тайтла (ключ меняется вместе с главами)
+CHAPTER_LIST_CACHE_TIMEOUT = int(os.getenv('CHAPTER_LIST_CACHE_TIMEOUT', 86400))
+
+# Чтение без сети (manga/templates/manga/sw.js): сколько следующих глав
+# читалка просит скачать заранее и сколько глав service worker хранит
+OFFLINE_PRECACHE_CHAPTERS = int(os.getenv('OFFLINE_PRECACHE_CHAPTERS', 3))
+OFFLINE_MAX_CHAPTERS = int(os.getenv('OFFLINE_MAX_CHAPTERS', 20))
+# Сколько секунд клиент может не перепроверять манифест главы
+MANIFEST_MAX_AGE = int(os.getenv('MANIFEST_MAX_AGE', 3600))
+# Через сколько секунд сохранённый список страниц главы (Chapter.pages)
+# запрашивается у источника заново: адреса картинок на CDN со временем меняются
+CHAPTER_PAGES_TTL = int(os.getenv('CHAPTER_PAGES_TTL', 7 * 24 * 3600))
+
+# Измерение страниц по заголовкам картинок (ingest.probe_pages): сколько
+# байт читать Range-запросом и сколько страниц измерять одновременно
+PAGE_PROBE_BYTES = int(os.getenv('PAGE_PROBE_BYTES', 16384))
+PAGE_PROBE_CONCURRENCY = int(os.getenv('PAGE_PROBE_CONCURRENCY', 8))
+
+# Облегчённые варианты картинок (manga/images.py, нужен Pillow): уровень по
+# умолчанию без Save-Data и настройки профиля — original | high | saver
+IMAGE_TRANSCODING = os.getenv('IMAGE_TRANSCODING', '1') == '1'
+IMAGE_DEFAULT_TIER = os.getenv('IMAGE_DEFAULT_TIER', 'original')
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'images'))
+IMAGE_MAX_AGE = int(os.getenv('IMAGE_MAX_AGE', 30 * 86400))
+# Страницы выше PAGE_TILE_MIN_HEIGHT px (длинные ленты) читалка грузит кусками
+# по PAGE_TILE_HEIGHT px; 0 — не резать
+PAGE_TILE_MIN_HEIGHT = int(os.getenv('PAGE_TILE_MIN_HEIGHT', 4000))
+PAGE_TILE_HEIGHT = int(os.getenv('PAGE_TILE_HEIGHT', 1280))
+
+# Сколько страниц главы download_chapter_zip качает одновременно
+DOWNLOAD_CONCURRENCY = int(os.getenv('DOWNLOAD_CONCURRENCY', 6))
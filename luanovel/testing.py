@@ -0,0 +1,31 @@
+# luanovel/testing.py
+"""Хелперы для тестов"""
+from contextlib import contextmanager
+
+from .budget import get_budget, track_usage
+
+
+class BudgetTestMixin:
+    """
+    Проверка бюджета запросов в тестах:
+
+        with self.assertWithinBudget('manga:reader'):
+            self.client.get(url)
+
+    Без имени вьюхи используются только переданные лимиты.
+    """
+
+    @contextmanager
+    def assertWithinBudget(self, view_name: str = None, **limits):
+        budget = get_budget(view_name) if view_name else {}
+        budget.update(limits)
+
+        with track_usage() as usage:
+            yield usage
+
+        exceeded = usage.exceeded(budget)
+        if exceeded:
+            details = ', '.join(
+                f'{name}: {spent} > {limit}' for name, (spent, limit) in exceeded.items()
+            )
+            self.fail(f"Бюджет {view_name or ''} превышен: {details}")
@@ -16,10 +16,13 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from . import views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', views.metrics, name='metrics'),
     path('', include('manga.urls')),
     path('parser/', include('parser.urls')),
     path('users/', include('users.urls')),
+    path('api/', include('api.urls')),
 ]
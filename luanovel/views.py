@@ -0,0 +1,20 @@
+# luanovel/views.py
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from . import metrics as metrics_registry
+
+
+def metrics(request):
+    """Метрики всех воркеров (luanovel/metrics.py) в текстовом формате Prometheus"""
+    # Только по токену: за локальным прокси REMOTE_ADDR у всех клиентов 127.0.0.1
+    token = settings.METRICS_TOKEN
+    if not token or not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        raise Http404()
+
+    return HttpResponse(
+        metrics_registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
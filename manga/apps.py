@@ -1,5 +1,23 @@
+import atexit
+
 from django.apps import AppConfig
 
 
 class MangaConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
     name = 'manga'
+
+    def ready(self):
+        from manga import counters
+        from manga import images  # noqa: F401 — сброс кэша Profile.image_quality по сигналу
+        from manga import views  # noqa: F401 — сброс списка глав по ingest.catalog_changed
+
+        # Не теряем буфер счётчиков при штатной остановке воркера
+        atexit.register(_flush_counters, counters)
+
+
+def _flush_counters(counters):
+    try:
+        counters.flush()
+    except Exception:
+        pass
@@ -0,0 +1,143 @@
+# manga/counters.py
+"""
+Буферизованные счётчики популярности (views_count, bookmarks_count).
+
+Просмотр или закладка только увеличивает счётчик в кэше — запросов к БД
+на чтении нет. Накопленные дельты применяются через F() (одним UPDATE на
+группу тайтлов с одинаковой дельтой) только вне запросов: командой
+`manage.py flush_counters` по cron и при остановке воркера. Дельта
+вычитается из кэша только после коммита, так что при падении посреди
+сброса ничего не теряется (в худшем случае дельта применится повторно).
+
+Просмотр — это один атомарный cache.incr без блокировок. Общая блокировка
+(luanovel.cache.lock) нужна, только когда тайтл попадает в индекс тайтлов
+с дельтами: при создании ключа и при первом инкременте после сброса (до него
+дельта была нулём). Сброс не удаляет обнулённые ключи — инкремент без
+блокировки между чтением и удалением потерялся бы, — а даёт им срок
+DRAINED_TIMEOUT; первый инкремент снова делает ключ бессрочным.
+"""
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+
+from luanovel.cache import lock
+from luanovel.routers import unpinned_writes
+from .models import Manga
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('views_count', 'bookmarks_count')
+
+INDEX_KEY = 'counters:dirty'
+INDEX_LOCK_KEY = 'counters:index_lock'
+FLUSH_LOCK_KEY = 'counters:flush_lock'
+# Сколько живёт обнулённый сбросом ключ тайтла, который больше не смотрят
+DRAINED_TIMEOUT = 24 * 3600
+
+
+def _cache():
+    return caches[getattr(settings, 'COUNTERS_CACHE_ALIAS', 'buffers')]
+
+
+def _key(manga_id, field) -> str:
+    return f'counters:{field}:{manga_id}'
+
+
+def incr(manga_id: int, field: str = 'views_count', delta: int = 1):
+    """Увеличивает счётчик тайтла в буфере"""
+    if field not in FIELDS:
+        raise ValueError(f"Неизвестный счётчик: {field}")
+
+    cache = _cache()
+    key = _key(manga_id, field)
+    try:
+        value = cache.incr(key, delta)
+    except ValueError:
+        value = None
+    if value is not None and value != delta:
+        # Дельта была ненулевой — тайтл уже в индексе
+        return
+
+    with lock(cache, INDEX_LOCK_KEY):
+        # Ключа не было, или он истёк сразу после инкремента выше
+        if (value is None or not cache.touch(key, None)) and not cache.add(key, delta, None):
+            cache.incr(key, delta)
+        index = cache.get(INDEX_KEY) or set()
+        if manga_id not in index:
+            index.add(manga_id)
+            cache.set(INDEX_KEY, index, None)
+
+
+def pending(manga_id: int) -> dict:
+    """Ещё не сброшенные дельты тайтла"""
+    values = _cache().get_many([_key(manga_id, field) for field in FIELDS])
+    return {field: values.get(_key(manga_id, field), 0) for field in FIELDS}
+
+
+def flush() -> int:
+    """
+    Применяет накопленные дельты к Manga. Одновременно идёт только один сброс.
+
+    Returns:
+        int: Количество обновлённых тайтлов
+    """
+    cache = _cache()
+    if not cache.add(FLUSH_LOCK_KEY, 1, 60):
+        return 0
+    try:
+        return _flush(cache)
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+
+def _flush(cache) -> int:
+    index = cache.get(INDEX_KEY) or set()
+    if not index:
+        return 0
+
+    keys = [_key(manga_id, field) for manga_id in index for field in FIELDS]
+    values = cache.get_many(keys)
+
+    # Группируем тайтлы с одинаковыми дельтами, чтобы обойтись меньшим числом UPDATE
+    groups = defaultdict(list)
+    for manga_id in index:
+        deltas = tuple(values.get(_key(manga_id, field), 0) for field in FIELDS)
+        if any(deltas):
+            groups[deltas].append(manga_id)
+
+    # Сброс счётчиков не повод читать каталог с основной базы
+    with unpinned_writes(), transaction.atomic():
+        for deltas, manga_ids in groups.items():
+            Manga.objects.filter(id__in=manga_ids).update(**{
+                field: F(field) + delta
+                for field, delta in zip(FIELDS, deltas)
+                if delta
+            })
+
+    with lock(cache, INDEX_LOCK_KEY):
+        for deltas, manga_ids in groups.items():
+            for manga_id in manga_ids:
+                for field, delta in zip(FIELDS, deltas):
+                    if delta:
+                        cache.decr(_key(manga_id, field), delta)
+
+        # Тайтлы без дельт убираем из индекса, а их ключам даём срок. Инкремент
+        # после чтения left увидит ноль в ключе и вернёт тайтл в индекс, когда
+        # блокировка освободится
+        left = cache.get_many(keys)
+        for key in keys:
+            if key in left and not left[key]:
+                cache.touch(key, DRAINED_TIMEOUT)
+        clean = {
+            manga_id for manga_id in index
+            if not any(left.get(_key(manga_id, field)) for field in FIELDS)
+        }
+        current = cache.get(INDEX_KEY) or set()
+        current.difference_update(clean)
+        cache.set(INDEX_KEY, current, None)
+
+    return sum(len(manga_ids) for manga_ids in groups.values())
@@ -0,0 +1,343 @@
+# manga/images.py
+"""
+Перекодирование страниц и обложек в облегчённые варианты (AVIF/WebP) для
+мобильного трафика.
+
+Уровень качества (tier) выбирается по запросу страницы: настройка
+Profile.image_quality, иначе заголовок Save-Data, иначе
+settings.IMAGE_DEFAULT_TIER. При 'original' картинки грузятся прямо с CDN
+источника, как раньше; иначе — через manga:page_image / manga:cover с ?q=<tier>.
+Формат выбирается по заголовку Accept запроса картинки (AVIF, WebP, иначе JPEG),
+ширина — по ?w= из srcset, не больше предела уровня.
+
+Варианты хранятся на диске в IMAGE_CACHE_DIR рядом с размером оригинала,
+чтобы считать сэкономленные байты (метрики luanovel_image_bytes_total и
+команда transcode_pages). Pillow — необязательная зависимость: без него
+всё отдаётся в оригинале.
+
+Длинные ленты вебтунов (выше PAGE_TILE_MIN_HEIGHT по Chapter.page_meta)
+отдаются кусками по PAGE_TILE_HEIGHT px через manga:page_tile: браузеру не
+нужно качать и декодировать всю ленту, чтобы показать её начало. Куски
+нумеруются сверху вниз; их число и высоты читалка знает заранее
+(tile_heights), а режутся и сохраняются они все разом при первом запросе.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.http import FileResponse, Http404, HttpResponseRedirect
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from luanovel import metrics
+from luanovel.cache import lock
+from parser.parsers import get_parser
+from users.models import Profile
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Оригинал не скачался или Pillow не смог его разобрать (в том числе слишком
+# длинная лента: DecompressionBombError) — отдаём оригинал без перекодирования
+_IMAGE_ERRORS = (requests.exceptions.RequestException, OSError, ValueError,
+                 *((Image.DecompressionBombError,) if Image is not None else ()))
+
+logger = logging.getLogger(__name__)
+
+ORIGINAL = 'original'
+# Предельная ширина и качество кодировщика по уровням
+TIERS = {
+    'high': {'width': 1080, 'quality': 80},
+    'saver': {'width': 720, 'quality': 50},
+}
+WIDTHS = (480, 720, 1080)
+# Куски ленты без уровня качества: ширина оригинала, почти без потерь
+TILE_ORIGINAL = {'width': None, 'quality': 90}
+# Формат в порядке предпочтения: (расширение, MIME, имя формата Pillow)
+FORMATS = (
+    ('avif', 'image/avif', 'AVIF'),
+    ('webp', 'image/webp', 'WEBP'),
+)
+JPEG = ('jpg', 'image/jpeg', 'JPEG')
+# WebP не кодирует стороны больше 16383 px — длинные ленты уходят в JPEG
+WEBP_MAX_SIDE = 16383
+
+
+def available() -> bool:
+    return Image is not None and getattr(settings, 'IMAGE_TRANSCODING', True)
+
+
+def _preference_key(user_id) -> str:
+    return f'image_quality:{user_id}'
+
+
+@receiver(post_save, sender=Profile)
+def _profile_saved(sender, instance, **kwargs):
+    caches['tiered'].delete(_preference_key(instance.user_id))
+
+
+def preference(user) -> str:
+    """Profile.image_quality пользователя ('auto' для анонимов), кэшируется"""
+    if user is None or not user.is_authenticated:
+        return 'auto'
+    key = _preference_key(user.id)
+    quality = caches['tiered'].get(key)
+    if quality is None:
+        quality = (
+            Profile.objects.filter(user_id=user.id).values_list('image_quality', flat=True).first() or 'auto'
+        )
+        caches['tiered'].set(key, quality, 3600)
+    return quality
+
+
+def image_tier(request, user=None) -> str:
+    """Уровень качества картинок для запроса: 'original' | 'high' | 'saver'"""
+    if not available():
+        return ORIGINAL
+    quality = preference(user if user is not None else getattr(request, 'user', None))
+    if quality != 'auto':
+        return quality
+    if request.headers.get('Save-Data', '').lower() == 'on':
+        return 'saver'
+    return getattr(settings, 'IMAGE_DEFAULT_TIER', ORIGINAL)
+
+
+def negotiate(accept: str, width: int, height: int):
+    """Формат варианта по заголовку Accept и размерам"""
+    for fmt in FORMATS:
+        if fmt[1] in accept and (fmt[0] != 'webp' or max(width, height) <= WEBP_MAX_SIDE):
+            return fmt
+    return JPEG
+
+
+def _width(value, tier: str) -> int:
+    limit = TIERS[tier]['width']
+    try:
+        requested = int(value)
+    except (TypeError, ValueError):
+        return limit
+    # Ближайшая стандартная ширина не меньше запрошенной — вариантов немного
+    return min([width for width in WIDTHS if width >= requested and width <= limit] or [limit])
+
+
+@dataclass
+class Variant:
+    path: Path
+    content_type: str
+    original_size: int
+
+    @property
+    def size(self) -> int:
+        return self.path.stat().st_size
+
+
+def _cache_dir() -> Path:
+    return Path(getattr(settings, 'IMAGE_CACHE_DIR', Path(settings.BASE_DIR) / '.cache' / 'images'))
+
+
+def _base_path(url: str, tier: str, width, accept_key: str) -> Path:
+    digest = hashlib.sha256(f'{url}\n{tier}\n{width}\n{accept_key}'.encode()).hexdigest()
+    return _cache_dir() / digest[:2] / digest
+
+
+def tile_heights(height) -> list:
+    """Высоты кусков страницы в px оригинала сверху вниз; [] — страница не режется"""
+    min_height = settings.PAGE_TILE_MIN_HEIGHT
+    if not available() or not min_height or not height or height <= min_height:
+        return []
+    step = settings.PAGE_TILE_HEIGHT
+    return [min(step, height - top) for top in range(0, height, step)]
+
+
+def _encode(image, quality: int, accept: str):
+    fmt = negotiate(accept, image.width, image.height)
+    if image.mode not in ('RGB', 'RGBA', 'L') or (fmt is JPEG and image.mode != 'RGB'):
+        image = image.convert('RGB' if fmt is JPEG or 'A' not in image.getbands() else 'RGBA')
+    out = io.BytesIO()
+    image.save(out, fmt[2], quality=quality)
+    return out.getvalue(), fmt
+
+
+def transcode(data: bytes, tier: str, width: int, accept: str):
+    """
+    Перекодирует картинку. Returns: (bytes, (расширение, MIME, формат Pillow))
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        return _encode(image, TIERS[tier]['quality'], accept)
+
+
+def cut(data: bytes, tier: str, accept: str) -> list:
+    """
+    Режет страницу на куски tile_heights() сверху вниз и кодирует каждый.
+    Returns: [(bytes, (расширение, MIME, формат Pillow)), ...]
+    """
+    options = TIERS.get(tier, TILE_ORIGINAL)
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        scale = min(1, options['width'] / image.width) if options['width'] else 1
+        tiles, top = [], 0
+        for height in tile_heights(image.height) or [image.height]:
+            tile = image.crop((0, top, image.width, top + height))
+            if scale < 1:
+                tile = tile.resize((round(image.width * scale), max(1, round(height * scale))), Image.LANCZOS)
+            tiles.append(_encode(tile, options['quality'], accept))
+            top += height
+    return tiles
+
+
+def _accept_key(accept: str) -> str:
+    # Ключ по поддерживаемым форматам, а не по всему Accept: вариантов меньше
+    return ','.join(fmt[0] for fmt in FORMATS if fmt[1] in accept)
+
+
+def _write(path: Path, data: bytes):
+    """Атомарная запись: параллельный запрос не увидит недописанный файл"""
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _stored_variant(base: Path):
+    meta_path = base.with_suffix('.json')
+    if not meta_path.exists():
+        return None
+    meta = json.loads(meta_path.read_text())
+    path = base.with_suffix('.' + meta['ext'])
+    return Variant(path, meta['content_type'], meta['original']) if path.exists() else None
+
+
+def _variant_lock(base: Path):
+    # Первые одновременные запросы одной картинки не качают и не кодируют её каждый сам
+    return lock(caches['default'], f'image-variant:{base.name}', timeout=60)
+
+
+def get_variant(url: str, source: str, tier: str, width: int, accept: str):
+    """Вариант с диска или перекодированный оригинал (сохраняется атомарно). None — отдать оригинал"""
+    base = _base_path(url, tier, width, _accept_key(accept))
+    variant = _stored_variant(base)
+    metrics.record_cache('image_variants', variant is not None)
+    if variant is not None:
+        return variant
+
+    with _variant_lock(base):
+        variant = _stored_variant(base)
+        if variant is not None:
+            return variant
+        parser = get_parser(source)
+        if parser is None:
+            return None
+        try:
+            original = parser.fetch_image(url)
+            data, fmt = transcode(original, tier, width, accept)
+        except _IMAGE_ERRORS as e:
+            logger.warning(f"Не удалось перекодировать {url}: {e}")
+            return None
+        if len(data) >= len(original):
+            # Оригинал уже меньше — вариант не нужен
+            data, fmt = original, None
+
+        base.parent.mkdir(parents=True, exist_ok=True)
+        ext = fmt[0] if fmt else 'orig'
+        content_type = fmt[1] if fmt else Image.MIME.get(Image.open(io.BytesIO(original)).format, 'image/jpeg')
+        path = base.with_suffix('.' + ext)
+        _write(path, data)
+        _write(base.with_suffix('.json'),
+               json.dumps({'ext': ext, 'content_type': content_type, 'original': len(original)}).encode())
+    return Variant(path, content_type, len(original))
+
+
+def _stored_tiles(base: Path):
+    meta_path = base / 'meta.json'
+    return json.loads(meta_path.read_text()) if meta_path.exists() else None
+
+
+def _tile(base: Path, meta: dict, index: int):
+    tiles = meta['tiles']
+    if index >= len(tiles) or not (base / tiles[index][0]).exists():
+        return None
+    return Variant(base / tiles[index][0], tiles[index][1], meta['original'] // len(tiles))
+
+
+def get_tile(url: str, source: str, tier: str, accept: str, index: int):
+    """
+    Кусок index длинной страницы с диска; при промахе оригинал качается и
+    режется на все куски сразу. None — такого куска нет или оригинал не скачался.
+    original_size у куска — его доля объёма оригинала.
+    """
+    base = _base_path(url, tier, f'tiles:{settings.PAGE_TILE_HEIGHT}', _accept_key(accept))
+    meta = _stored_tiles(base)
+    metrics.record_cache('image_tiles', meta is not None)
+    if meta is not None:
+        return _tile(base, meta, index)
+
+    with _variant_lock(base):
+        meta = _stored_tiles(base)
+        if meta is not None:
+            return _tile(base, meta, index)
+        parser = get_parser(source)
+        if parser is None:
+            return None
+        try:
+            original = parser.fetch_image(url)
+            parts = cut(original, tier, accept)
+        except _IMAGE_ERRORS as e:
+            logger.warning(f"Не удалось разрезать {url}: {e}")
+            return None
+
+        base.mkdir(parents=True, exist_ok=True)
+        tiles = []
+        for number, (data, fmt) in enumerate(parts):
+            name = f'{number}.{fmt[0]}'
+            _write(base / name, data)
+            tiles.append([name, fmt[1]])
+        # meta.json последним: по нему куски считаются готовыми
+        meta = {'tiles': tiles, 'original': len(original)}
+        _write(base / 'meta.json', json.dumps(meta).encode())
+    return _tile(base, meta, index)
+
+
+def _file_response(variant: Variant, tier: str):
+    size = variant.size
+    fmt = variant.content_type.partition('/')[2]
+    metrics.record_image(fmt, tier, variant.original_size, size)
+    response = FileResponse(variant.path.open('rb'), content_type=variant.content_type)
+    response['Content-Length'] = size
+    patch_vary_headers(response, ('Accept',))
+    patch_cache_control(response, public=True, max_age=settings.IMAGE_MAX_AGE)
+    return response
+
+
+def serve(request, url: str, source: str):
+    """Ответ с вариантом картинки по ?q= и Accept; без уровня или при ошибке — редирект на оригинал"""
+    tier = request.GET.get('q')
+    if tier not in TIERS or not available():
+        return HttpResponseRedirect(url)
+    accept = request.headers.get('Accept', '')
+    variant = get_variant(url, source, tier, _width(request.GET.get('w'), tier), accept)
+    if variant is None:
+        return HttpResponseRedirect(url)
+    return _file_response(variant, tier)
+
+
+def serve_tile(request, url: str, source: str, index: int):
+    """Ответ с куском длинной страницы; ?q= — уровень качества (по умолчанию original)"""
+    tier = request.GET.get('q', ORIGINAL)
+    if (tier not in TIERS and tier != ORIGINAL) or not available():
+        raise Http404("Куски страниц недоступны")
+    variant = get_tile(url, source, tier, request.headers.get('Accept', ''), index)
+    if variant is None:
+        raise Http404("Кусок страницы не найден")
+    return _file_response(variant, tier)
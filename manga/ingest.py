@@ -0,0 +1,401 @@
+# manga/ingest.py
+"""
+Сохранение данных парсеров в БД (общее для manga/views.py и parser/views.py).
+
+Жанры разрешаются через кэш имя -> id в памяти процесса: он прогревается
+из таблицы Genre одним запросом, недостающие жанры вставляются одним
+bulk_create, связи manga-genre — одной вставкой в through-таблицу. Кэш у
+каждого процесса свой: если жанр удалили в другом воркере, его устаревший id
+не свяжется, и кэш перечитывается из Genre.
+Сохранение тайтла делает постоянное число запросов при любом числе жанров,
+главы пишутся пачками по CHAPTER_BATCH_SIZE.
+
+У манги хранятся хэши данных источника (content_hash — метаданные,
+chapters_hash — список глав): refresh_manga/refresh_chapters при совпадении
+хэша ничего не пишут и не шлют catalog_changed (по нему сбрасываются кэши).
+
+Страницы глав измеряются (probe_pages) только вне запросов: манифест ставит
+неизмеренную главу в очередь (queue_probe), команда `manage.py probe_pages`
+по cron измеряет сначала её, а пока размеры неизвестны, в манифесте null.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, router, transaction
+from django.db.models.constants import OnConflict
+from django.db.models.signals import post_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+from django.utils.text import slugify
+
+from luanovel.cache import lock
+from .models import Manga, Chapter, ChapterEvent, Genre
+
+logger = logging.getLogger(__name__)
+
+# Глав в одной пакетной вставке (save_chapters)
+CHAPTER_BATCH_SIZE = 500
+
+# Очередь глав на измерение страниц (queue_probe) в кэше буферов
+PROBE_QUEUE_KEY = 'probe:queue'
+PROBE_QUEUE_LOCK_KEY = 'probe:queue_lock'
+
+# Отправляется после коммита изменений каталога. Аргументы: manga, part ('metadata' | 'chapters')
+catalog_changed = Signal()
+
+# Поля манги, которые приходят из источника (records.MangaDetails) и входят в content_hash
+MANGA_FIELDS = ('title', 'description', 'cover_url', 'original_url', 'author', 'artist', 'year')
+
+# None — кэш ещё не прогрет. Новые жанры попадают сюда только после коммита,
+# чтобы откат транзакции не оставил в кэше несуществующих id.
+_genre_ids = None
+
+
+def reset_genre_cache():
+    global _genre_ids
+    _genre_ids = None
+
+
+@receiver(post_delete, sender=Genre)
+def _genre_deleted(sender, **kwargs):
+    reset_genre_cache()
+
+
+def _genre_cache() -> dict:
+    global _genre_ids
+    if _genre_ids is None:
+        _genre_ids = dict(Genre.objects.values_list('name', 'id'))
+    return _genre_ids
+
+
+def _genre_slug(name: str) -> str:
+    return slugify(name, allow_unicode=True) or f"genre-{name[:10]}"
+
+
+def resolve_genres(names) -> dict:
+    """
+    Возвращает {имя: id} для жанров, создавая недостающие.
+
+    Жанр, который не удалось создать (slug уже занят другим именем),
+    пропускается с предупреждением в лог.
+    """
+    names = list(dict.fromkeys(name for name in names if name))
+    cache = _genre_cache()
+    resolved = {name: cache[name] for name in names if name in cache}
+    missing = [name for name in names if name not in resolved]
+    if not missing:
+        return resolved
+
+    Genre.objects.bulk_create(
+        [Genre(name=name, slug=_genre_slug(name)) for name in missing],
+        ignore_conflicts=True,
+    )
+    created = dict(Genre.objects.filter(name__in=missing).values_list('name', 'id'))
+    for name in missing:
+        if name not in created:
+            logger.warning(f"Genre '{name}' skipped: slug conflict")
+    resolved.update(created)
+
+    transaction.on_commit(lambda: cache.update(created))
+    return resolved
+
+
+def link_genres(manga, genre_ids) -> int:
+    """
+    Связывает мангу с жанрами одной вставкой в through-таблицу. Вставка идёт
+    через SELECT из Genre, поэтому id уже удалённого жанра (кэш другого
+    воркера устарел) не нарушает внешний ключ, а просто не связывается.
+    Возвращает число новых связей.
+    """
+    genre_ids = list(genre_ids)
+    if not genre_ids:
+        return 0
+    through = Manga.genres.through
+    connection = connections[router.db_for_write(through)]
+    ops = connection.ops
+    quote = ops.quote_name
+    sql = '{} {} ({}, {}) SELECT %s, {} FROM {} WHERE {} IN ({}) {}'.format(
+        ops.insert_statement(on_conflict=OnConflict.IGNORE),
+        quote(through._meta.db_table),
+        quote(through._meta.get_field('manga').column),
+        quote(through._meta.get_field('genre').column),
+        quote(Genre._meta.pk.column),
+        quote(Genre._meta.db_table),
+        quote(Genre._meta.pk.column),
+        ', '.join(['%s'] * len(genre_ids)),
+        ops.on_conflict_suffix_sql([], OnConflict.IGNORE, None, None),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [manga.id, *genre_ids])
+        return cursor.rowcount
+
+
+def _link_genre_names(manga, names):
+    """Жанры по именам через кэш; если часть id устарела — кэш перечитывается из Genre и ещё одна попытка"""
+    genre_ids = resolve_genres(names)
+    if link_genres(manga, genre_ids.values()) < len(genre_ids):
+        reset_genre_cache()
+        link_genres(manga, resolve_genres(names).values())
+
+
+def _hash(parts) -> str:
+    return hashlib.blake2b('\x1f'.join(parts).encode(), digest_size=16).hexdigest()
+
+
+def manga_hash(details) -> str:
+    """Хэш метаданных манги (порядок жанров не важен)"""
+    values = [str(getattr(details, field) or '') for field in MANGA_FIELDS]
+    return _hash([*values, *sorted(name for name in details.genres or [] if name)])
+
+
+class ChapterListHash:
+    """
+    Хэш списка глав, не зависящий от порядка: сумма хэшей глав по модулю 2**128.
+    Считается на лету, поэтому годится и для потока parser.iter_chapters.
+    """
+    MODULUS = 2 ** 128
+
+    def __init__(self, chapters=()):
+        self.total = 0
+        for chapter in chapters:
+            self.add(chapter)
+
+    def add(self, chapter):
+        digest = _hash((repr(float(chapter.number)), str(chapter.volume), chapter.title or '', chapter.url or ''))
+        self.total = (self.total + int(digest, 16)) % self.MODULUS
+
+    def hexdigest(self) -> str:
+        return f'{self.total:032x}'
+
+
+def _changed(manga, part: str):
+    transaction.on_commit(lambda: catalog_changed.send(sender=Manga, manga=manga, part=part))
+
+
+def save_manga(slug: str, source: str, details):
+    """Создаёт мангу из records.MangaDetails вместе с жанрами"""
+    # Прогрев до транзакции: после отката в кэше не должно остаться её строк
+    _genre_cache()
+
+    with transaction.atomic():
+        manga = Manga.objects.create(
+            title=details.title,
+            slug=slug,
+            description=details.description,
+            cover_url=details.cover_url,
+            original_url=details.original_url,
+            author=details.author,
+            artist=details.artist,
+            year=details.year,
+            total_chapters=details.total_chapters,
+            source=source,
+            content_hash=manga_hash(details),
+        )
+
+        if details.genres:
+            _link_genre_names(manga, details.genres)
+
+    return manga
+
+
+def refresh_manga(manga, details) -> bool:
+    """
+    Обновляет метаданные манги из records.MangaDetails. Если хэш не изменился,
+    ничего не пишет и возвращает False.
+    """
+    content_hash = manga_hash(details)
+    if content_hash == manga.content_hash:
+        return False
+
+    _genre_cache()
+    with transaction.atomic():
+        for field in MANGA_FIELDS:
+            setattr(manga, field, getattr(details, field))
+        manga.content_hash = content_hash
+        manga.save(update_fields=[*MANGA_FIELDS, 'content_hash', 'updated_at'])
+
+        Manga.genres.through.objects.filter(manga_id=manga.id).delete()
+        if details.genres:
+            _link_genre_names(manga, details.genres)
+        _changed(manga, 'metadata')
+    return True
+
+
+def record_new_chapters(manga, chapters: list, initial: bool = False) -> list:
+    """
+    Пишет события о новых главах и обновляет у манги last_chapter_added_at
+    и latest_chapter (для ленты обновлений), а также updated_at — по нему
+    клиенты API забирают изменения (?updated_since=). Возвращает изменённые поля манги.
+
+    initial — первая загрузка глав тайтла (в том числе import_catalog): это не
+    выход новых глав, поэтому ни событий, ни подъёма в ленте, только latest_chapter.
+    """
+    if not chapters:
+        return []
+    changed = ['latest_chapter', 'updated_at']
+    if not initial:
+        ChapterEvent.objects.bulk_create([ChapterEvent(manga=manga, chapter=chapter) for chapter in chapters])
+        manga.last_chapter_added_at = timezone.now()
+        changed.append('last_chapter_added_at')
+
+    newest = max(chapters, key=lambda chapter: chapter.number)
+    current = manga.latest_chapter if manga.latest_chapter_id else None
+    if current is None or newest.number >= current.number:
+        manga.latest_chapter = newest
+    return changed
+
+
+def _batches(items, size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _create_chapters(manga, batch: list) -> list:
+    """Создаёт главы пачки, которых ещё нет в БД: одна выборка номеров и один bulk_create"""
+    by_number = {}
+    for chapter_data in batch:
+        # Повтор номера — как у get_or_create: остаётся первая глава
+        by_number.setdefault(float(chapter_data.number), chapter_data)
+    existing = set(
+        Chapter.objects.filter(manga=manga, number__in=list(by_number)).order_by().values_list('number', flat=True)
+    )
+    chapters = [
+        Chapter(
+            manga=manga,
+            number=number,
+            title=chapter_data.title or '',
+            url=chapter_data.url or '',
+            volume=chapter_data.volume,
+        )
+        for number, chapter_data in by_number.items()
+        if number not in existing
+    ]
+    Chapter.objects.bulk_create(chapters)
+
+    if chapters and chapters[0].pk is None:
+        # БД без RETURNING при пакетной вставке: id нужны для событий
+        ids = dict(
+            Chapter.objects.filter(manga=manga, number__in=[chapter.number for chapter in chapters])
+            .values_list('number', 'id')
+        )
+        for chapter in chapters:
+            chapter.pk = ids[chapter.number]
+    return chapters
+
+
+def save_chapters(manga, chapters_data, batch_size: int = CHAPTER_BATCH_SIZE) -> int:
+    """
+    Сохраняет главы records.ChapterRef пачками по batch_size, связывает соседние
+    и пишет события о новых (кроме первой загрузки). chapters_data может быть генератором
+    (parser.iter_chapters) — весь список глав в памяти не собирается.
+    Уже существующие главы не перезаписываются. Возвращает число новых глав.
+
+    Каждая пачка пишется своей короткой транзакцией, а следующая качается уже
+    вне её: загрузка из сети не держит блокировку записи (на SQLite — всю базу).
+    Если поток оборвался, записанные пачки остаются, а chapters_hash не
+    обновляется — refresh_chapters дозапишет остальное.
+    """
+    list_hash = ChapterListHash()
+    created = 0
+    # Список глав ещё ни разу не сохранялся целиком — это первая загрузка, а не новые главы
+    initial = not manga.chapters_hash
+    for batch in _batches(chapters_data, batch_size):
+        for chapter_data in batch:
+            list_hash.add(chapter_data)
+        with transaction.atomic():
+            new_chapters = _create_chapters(manga, batch)
+            created += len(new_chapters)
+            changed = record_new_chapters(manga, new_chapters, initial=initial)
+            if changed:
+                manga.save(update_fields=changed)
+
+    with transaction.atomic():
+        manga.total_chapters = manga.chapters.count()
+        manga.chapters_hash = list_hash.hexdigest()
+        manga.save(update_fields=['total_chapters', 'chapters_hash'])
+        manga.link_chapters()
+        if created:
+            _changed(manga, 'chapters')
+    return created
+
+
+def refresh_chapters(manga, chapters_data) -> bool:
+    """
+    Досинхронизирует главы, если список на источнике изменился (по chapters_hash).
+    Хэш нужен до записи, поэтому список записей собирается целиком — это
+    компактные ChapterRef, сырой ответ API при этом всё равно разбирается потоково.
+    """
+    chapters = list(chapters_data)
+    if ChapterListHash(chapters).hexdigest() == manga.chapters_hash:
+        return False
+    save_chapters(manga, chapters)
+    return True
+
+
+def skipped_writes(part: str, details=None) -> int:
+    """
+    Сколько записей в БД сделал бы refresh_manga ('metadata', нужны details)
+    или refresh_chapters ('chapters') без проверки хэша на тех же данных.
+    """
+    if part == 'metadata':
+        # UPDATE манги, DELETE связей с жанрами и одна их вставка
+        return 2 + bool(details.genres)
+    # total_chapters/chapters_hash одним UPDATE; существующие главы и ссылки не пишутся
+    return 1
+
+
+def probe_pages(chapter, parser, workers: int = 8) -> int:
+    """
+    Размеры и объём страниц главы по заголовкам картинок (parser.probe_image,
+    Range-запросы пулом потоков) в Chapter.page_meta. Страница, которую не
+    удалось измерить, остаётся null. Возвращает число измеренных страниц.
+    """
+    head_bytes = getattr(settings, 'PAGE_PROBE_BYTES', 16384)
+
+    def probe(url):
+        try:
+            info = parser.probe_image(url, head_bytes=head_bytes)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Не удалось измерить страницу {url}: {e}")
+            return None
+        if info.width is None:
+            return None
+        return [info.width, info.height, info.size, info.etag]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        chapter.page_meta = list(pool.map(probe, chapter.pages))
+    Chapter.objects.filter(pk=chapter.pk).update(page_meta=chapter.page_meta)
+    return sum(meta is not None for meta in chapter.page_meta)
+
+
+def _probe_cache():
+    return caches[getattr(settings, 'PROBE_QUEUE_CACHE_ALIAS', 'buffers')]
+
+
+def queue_probe(chapter_id: int):
+    """Ставит главу в очередь на измерение страниц (manage.py probe_pages)"""
+    cache = _probe_cache()
+    with lock(cache, PROBE_QUEUE_LOCK_KEY):
+        queue = cache.get(PROBE_QUEUE_KEY) or set()
+        if chapter_id not in queue:
+            queue.add(chapter_id)
+            cache.set(PROBE_QUEUE_KEY, queue, None)
+
+
+def take_probe_queue() -> set:
+    """Забирает очередь на измерение; измеренные главы в неё не возвращаются"""
+    cache = _probe_cache()
+    with lock(cache, PROBE_QUEUE_LOCK_KEY):
+        queue = cache.get(PROBE_QUEUE_KEY) or set()
+        cache.delete(PROBE_QUEUE_KEY)
+    return queue
@@ -0,0 +1,259 @@
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from manga.models import Manga
+from parser.parsers import MangaLibParser, SenkuroParser, ChapterRef, MangaDetails
+from parser.parsers.records import iter_json_array, loads
+
+DEFAULT_SIZES = '10,1000,10000'
+
+
+# --- Синтетические ответы API ---
+
+def tiptap_localizations(size: int) -> list:
+    """Описание Senkuro в формате Tiptap: size абзацев по 3 текстовых узла"""
+    paragraphs = [
+        {'type': 'paragraph', 'content': [
+            {'type': 'text', 'text': f'Абзац {i}. '},
+            {'type': 'hardBreak'},
+            {'type': 'text', 'text': 'Текст описания ' * 4},
+            {'type': 'text', 'text': 'конец.', 'marks': [{'type': 'bold'}]},
+        ]}
+        for i in range(size)
+    ]
+    return [{'lang': 'EN', 'description': []}, {'lang': 'RU', 'description': paragraphs}]
+
+
+def senkuro_chapters_page(size: int) -> dict:
+    return {'edges': [
+        {'node': {'id': str(i), 'number': str(i + 1), 'volume': str(i // 10 + 1),
+                  'title': f'Глава {i + 1}', 'slug': f'chapter-{i + 1}', 'createdAt': '2025-01-01'}}
+        for i in range(size)
+    ], 'pageInfo': {'hasNextPage': False, 'endCursor': None}}
+
+
+def senkuro_search(size: int) -> dict:
+    return {'data': {'search': {'edges': [
+        {'node': {
+            'slug': f'manga-{i}',
+            'titles': [{'lang': 'EN', 'content': f'Manga {i}'}, {'lang': 'RU', 'content': f'Манга {i}'}],
+            'cover': {'original': {'url': f'https://senkuro.me/covers/{i}.jpg'}},
+            'releaseYear': 2000 + i % 25,
+        }}
+        for i in range(size)
+    ]}}}
+
+
+def mangalib_chapters(size: int) -> dict:
+    return {'data': [
+        {'id': i, 'number': str(i + 1), 'volume': str(i // 10 + 1), 'name': f'Глава {i + 1}',
+         'branches_count': 1, 'branches': [{'branch_id': None, 'created_at': '2025-01-01T00:00:00'}]}
+        for i in range(size)
+    ]}
+
+
+def mangalib_search(size: int) -> dict:
+    return {'data': [
+        {'rus_name': f'Манга {i}', 'name': f'Manga {i}', 'slug_url': f'{i}--manga-{i}',
+         'cover': {'default': f'https://cover.imglib.info/{i}.jpg'}, 'summary': 'Описание',
+         'type': {'label': 'Манхва'}, 'releaseDate': '2020', 'rate_avg': '9.1'}
+        for i in range(size)
+    ]}
+
+
+def chapter_records(size: int) -> list:
+    return [
+        ChapterRef(number=i + 1, volume=i // 10 + 1, title=f'Глава {i + 1}', url=f'chapter-{i + 1}')
+        for i in range(size)
+    ]
+
+
+# --- Стадии ---
+
+def stage_senkuro_description(size):
+    parser, payload = SenkuroParser(), tiptap_localizations(size)
+    return lambda: parser._get_description(payload)
+
+
+def stage_senkuro_chapters(size):
+    parser, payload = SenkuroParser(), senkuro_chapters_page(size)
+    return lambda: parser._parse_chapters(payload)
+
+
+def stage_senkuro_search(size):
+    parser, payload = SenkuroParser(), senkuro_search(size)
+    return lambda: parser._parse_search_results(payload, limit=size)
+
+
+def stage_mangalib_chapters(size):
+    parser, payload = MangaLibParser(), mangalib_chapters(size)
+    return lambda: parser._parse_chapters(payload, 'manga')
+
+
+def stage_mangalib_chapters_decode(size):
+    """Ответ API как байты: JSON-декодирование + разбор"""
+    parser, payload = MangaLibParser(), json.dumps(mangalib_chapters(size)).encode()
+    return lambda: parser._parse_chapters(loads(payload), 'manga')
+
+
+def stage_mangalib_chapters_stream(size):
+    """Тот же ответ, разобранный потоково кусками по 64 KiB (MangaLibParser.iter_chapters)"""
+    parser, payload = MangaLibParser(), json.dumps(mangalib_chapters(size)).encode()
+    step = parser.STREAM_CHUNK_SIZE
+
+    def run():
+        chunks = (payload[i:i + step] for i in range(0, len(payload), step))
+        for chapter in iter_json_array(chunks, 'data'):
+            parser._chapter_ref(chapter, 'manga')
+
+    return run
+
+
+def stage_mangalib_search(size):
+    parser, payload = MangaLibParser(), mangalib_search(size)
+    return lambda: parser._parse_search_results(payload)
+
+
+def stage_save_chapters(size):
+    """Запись глав в БД (ingest.save_chapters); каждый прогон откатывается"""
+    from manga.ingest import save_chapters
+
+    records = chapter_records(size)
+
+    def run():
+        with transaction.atomic():
+            manga = Manga.objects.create(
+                title='Benchmark', slug='benchmark-manga',
+                cover_url='https://example.com/c.jpg', original_url='https://example.com/m',
+            )
+            save_chapters(manga, records)
+            transaction.set_rollback(True)
+
+    return run
+
+
+def stage_save_manga(size):
+    """Создание тайтла с size новыми жанрами (ingest.save_manga); прогоны откатываются"""
+    from manga.ingest import save_manga
+
+    details = MangaDetails(
+        title='Benchmark', slug='benchmark-manga', source='senkuro',
+        cover_url='https://example.com/c.jpg', original_url='https://example.com/m',
+        genres=[f'Жанр {i}' for i in range(size)],
+    )
+
+    def run():
+        with transaction.atomic():
+            save_manga(details.slug, details.source, details)
+            transaction.set_rollback(True)
+
+    return run
+
+
+STAGES = {
+    'senkuro_description': stage_senkuro_description,
+    'senkuro_chapters': stage_senkuro_chapters,
+    'senkuro_search': stage_senkuro_search,
+    'mangalib_chapters': stage_mangalib_chapters,
+    'mangalib_chapters_decode': stage_mangalib_chapters_decode,
+    'mangalib_chapters_stream': stage_mangalib_chapters_stream,
+    'mangalib_search': stage_mangalib_search,
+    'save_chapters': stage_save_chapters,
+    'save_manga': stage_save_manga,
+}
+
+
+def measure(func, repeat: int, min_time: float = 0.2, max_time: float = 5.0) -> dict:
+    """Медиана времени (без tracemalloc) и пик памяти отдельного прогона"""
+    t0 = time.perf_counter()
+    func()  # прогрев
+    # Медленные стадии (тысячи INSERT) гоняем меньше раз
+    repeat = max(1, min(repeat, int(max_time / (time.perf_counter() - t0))))
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < repeat or (time.perf_counter() - started < min_time and len(timings) < 50):
+        t0 = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'time': statistics.median(timings), 'peak': peak, 'runs': len(timings)}
+
+
+class Command(BaseCommand):
+    help = (
+        'Микробенчмарки CPU-части парсеров и записи глав в БД на синтетических данных. '
+        'Сравнивает с сохранённым baseline и падает при регрессии больше порога.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stages', default=','.join(STAGES), help='Стадии через запятую')
+        parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Размеры данных через запятую')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--baseline', default=str(Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'))
+        parser.add_argument('--save', action='store_true', help='Сохранить результаты как baseline')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Допустимая регрессия (0.25 = +25%% к времени или памяти)')
+
+    def handle(self, *args, **options):
+        stages = [name.strip() for name in options['stages'].split(',') if name.strip()]
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise CommandError(f"Неизвестные стадии: {', '.join(sorted(unknown))}")
+        sizes = [int(size) for size in options['sizes'].split(',')]
+
+        baseline_path = Path(options['baseline'])
+        baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+
+        results = {}
+        regressions = []
+        self.stdout.write(f"{'stage':<22}{'size':>7}{'time ms':>11}{'peak KiB':>11}{'vs base':>10}")
+        for stage in stages:
+            for size in sizes:
+                key = f'{stage}:{size}'
+                result = measure(STAGES[stage](size), options['repeat'])
+                results[key] = result
+
+                base = baseline.get(key)
+                delta = ''
+                if base:
+                    ratio = result['time'] / base['time'] if base['time'] else 1
+                    delta = f'{(ratio - 1) * 100:+.0f}%'
+                    if self._regressed(result, base, options['threshold']):
+                        regressions.append(key)
+                        delta += ' !'
+
+                self.stdout.write(
+                    f"{stage:<22}{size:>7}{result['time'] * 1000:>11.3f}"
+                    f"{result['peak'] / 1024:>11.1f}{delta:>10}"
+                )
+
+        if options['save']:
+            baseline.update(results)
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True))
+            self.stdout.write(self.style.SUCCESS(f'Baseline сохранён: {baseline_path}'))
+        elif regressions:
+            raise CommandError(f"Регрессия больше {options['threshold']:.0%}: {', '.join(regressions)}")
+
+    @staticmethod
+    def _regressed(result, base, threshold) -> bool:
+        # Пороги шума: 1 мс по времени и 64 KiB по памяти
+        slower = (result['time'] > base['time'] * (1 + threshold)
+                  and result['time'] - base['time'] > 0.001)
+        heavier = (result['peak'] > base['peak'] * (1 + threshold)
+                   and result['peak'] - base['peak'] > 64 * 1024)
+        return slower or heavier
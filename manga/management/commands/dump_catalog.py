@@ -0,0 +1,31 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand
+
+from manga import snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает каталог (жанры, манга, главы и кэш страниц) в сжатый JSONL-снимок '
+        'для load_catalog. Память не зависит от размера каталога.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='catalog.jsonl.gz',
+                            help='Файл снимка (- для stdout)')
+        parser.add_argument('--compresslevel', type=int, default=6, help='Уровень gzip, 1-9')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        target = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            with gzip.GzipFile(fileobj=target, mode='wb', compresslevel=options['compresslevel']) as stream:
+                counts = snapshot.dump(stream.write)
+        finally:
+            if target is not sys.stdout.buffer:
+                target.close()
+
+        summary = ', '.join(f'{name}: {count}' for name, count in counts.items())
+        self.stderr.write(self.style.SUCCESS(f'Снимок {output}: {summary}'))
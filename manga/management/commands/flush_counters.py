@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from manga import counters
+
+
+class Command(BaseCommand):
+    help = 'Применяет буферизованные счётчики просмотров и закладок (запускать по cron)'
+
+    def handle(self, *args, **options):
+        updated = counters.flush()
+        self.stdout.write(self.style.SUCCESS(f'Обновлено тайтлов: {updated}'))
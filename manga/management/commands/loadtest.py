@@ -0,0 +1,126 @@
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from manga.models import Manga, Chapter
+
+SCENARIOS = ('search', 'api_search', 'detail', 'reader', 'download')
+
+
+def percentile(values: list, p: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(p / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный сценарий по основным вьюхам. Запускать против сервера, '
+        'у которого парсеры смотрят в заглушку (PARSER_UPSTREAM_URL + stub_upstream) '
+        'или работают из фикстур (PARSER_TRANSPORT=replay).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=30, help='Длительность, сек')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                            help=f'Через запятую: {", ".join(SCENARIOS)}')
+        parser.add_argument('--sample', type=int, default=50, help='Сколько тайтлов/глав брать из БД')
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+        targets = self._build_targets(scenarios, options['sample'])
+        if not targets:
+            raise CommandError('Нет данных для сценариев: импортируйте каталог или загрузите фикстуры')
+
+        base_url = options['base_url'].rstrip('/')
+        deadline = time.monotonic() + options['duration']
+        results = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+
+        def worker():
+            session = requests.Session()
+            while time.monotonic() < deadline:
+                name, path = random.choice(targets)
+                started = time.perf_counter()
+                try:
+                    response = session.get(base_url + path, timeout=60)
+                    failed = response.status_code >= 500
+                except requests.exceptions.RequestException:
+                    failed = True
+                elapsed = time.perf_counter() - started
+                with lock:
+                    results[name].append(elapsed)
+                    if failed:
+                        errors[name] += 1
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.monotonic() - started
+
+        self._report(results, errors, wall)
+
+    def _build_targets(self, scenarios, sample) -> list:
+        mangas = list(Manga.objects.order_by('?').values('slug', 'title')[:sample])
+        chapters = list(
+            Chapter.objects.select_related('manga').order_by('?')
+            .only('volume', 'number', 'manga__slug')[:sample]
+        )
+        targets = []
+        for manga in mangas:
+            query = (manga['title'] or manga['slug']).split()[0]
+            if 'search' in scenarios:
+                targets.append(('search', f"{reverse('manga:search')}?q={query}"))
+            if 'api_search' in scenarios:
+                targets.append(('api_search', f"{reverse('manga:api_search')}?q={query}"))
+            if 'detail' in scenarios:
+                targets.append(('detail', reverse('manga:detail', args=[manga['slug']])))
+        for chapter in chapters:
+            kwargs = {
+                'slug': chapter.manga.slug,
+                'volume': chapter.volume,
+                'number': f'{chapter.number:g}',
+            }
+            if 'reader' in scenarios:
+                targets.append(('reader', reverse('manga:reader', kwargs=kwargs)))
+            if 'download' in scenarios:
+                targets.append(('download', reverse('manga:download_chapter', kwargs=kwargs)))
+        return targets
+
+    def _report(self, results, errors, wall):
+        header = f"{'view':<12}{'reqs':>8}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        total = 0
+        for name in SCENARIOS:
+            latencies = results.get(name)
+            if not latencies:
+                continue
+            total += len(latencies)
+            self.stdout.write(
+                f"{name:<12}{len(latencies):>8}{errors[name]:>6}{len(latencies) / wall:>9.1f}"
+                f"{percentile(latencies, 50) * 1000:>10.1f}"
+                f"{percentile(latencies, 95) * 1000:>10.1f}"
+                f"{percentile(latencies, 99) * 1000:>10.1f}"
+            )
+        self.stdout.write('-' * len(header))
+        self.stdout.write(f"Итого: {total} запросов за {wall:.1f} с, {total / wall:.1f} rps")
@@ -0,0 +1,63 @@
+import statistics
+import time
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from parser.parsers import get_parser
+from parser.parsers.base import PROFILE_SEARCH_CARD, PROFILE_DETAIL_INGEST, PROFILE_REFRESH_CHECK, PROFILE_FULL
+from parser.parsers.records import loads
+
+# (операция, профиль) в порядке вывода; full — прежний набор полей для сравнения
+CASES = [
+    ('search', PROFILE_FULL),
+    ('search', PROFILE_SEARCH_CARD),
+    ('details', PROFILE_FULL),
+    ('details', PROFILE_DETAIL_INGEST),
+    ('details', PROFILE_REFRESH_CHECK),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Размер ответа и время декодирования JSON (records.loads) по профилям полей. '
+        'Работает через транспорт парсеров: live, record или replay (PARSER_TRANSPORT).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help='Slug манги на источнике')
+        parser.add_argument('--source', default='mangalib')
+        parser.add_argument('--query', help='Запрос для поиска (по умолчанию — slug)')
+        parser.add_argument('--repeat', type=int, default=20, help='Прогонов json.loads на ответ')
+
+    def handle(self, *args, **options):
+        parser = get_parser(options['source'])
+        if parser is None:
+            raise CommandError(f"Неизвестный источник: {options['source']}")
+        if not hasattr(parser, '_details_url'):
+            raise CommandError(f"{options['source']}: поля запроса не настраиваются (persisted queries)")
+
+        query = options['query'] or options['slug']
+        self.stdout.write(f"{'operation':<10}{'profile':<16}{'bytes':>10}{'decode ms':>11}")
+        for operation, profile in CASES:
+            if operation == 'search':
+                url = parser._search_url(query, 10, profile)
+            else:
+                url = parser._details_url(options['slug'], profile)
+
+            try:
+                response = parser._request('GET', url, operation=operation,
+                                           headers=parser.headers, timeout=parser.timeout)
+            except requests.exceptions.RequestException as e:
+                self.stdout.write(self.style.ERROR(f"{operation:<10}{profile:<16} ошибка: {e}"))
+                continue
+            content = response.content
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                loads(content)
+                timings.append(time.perf_counter() - started)
+
+            self.stdout.write(
+                f"{operation:<10}{profile:<16}{len(content):>10}{statistics.median(timings) * 1000:>11.3f}"
+            )
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from manga import ingest
+from manga.models import Chapter
+from parser.parsers import PARSERS, get_parser
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет страницы глав с сохранённым списком страниц, но без размеров: '
+        'ширина, высота и объём по заголовкам картинок (Range-запросы), '
+        'чтобы читалка заранее резервировала место под страницы. Сначала — главы, '
+        'чьи манифесты уже запрашивали (ingest.queue_probe).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=sorted(PARSERS), help='Только главы тайтлов этого источника')
+        parser.add_argument('--slug', action='append', dest='slugs', help='Конкретные тайтлы (можно несколько)')
+        parser.add_argument('--limit', type=int, help='Не больше N глав')
+        parser.add_argument('--workers', type=int, default=settings.PAGE_PROBE_CONCURRENCY,
+                            help='Страниц одной главы одновременно')
+
+    def handle(self, *args, **options):
+        chapters = (
+            Chapter.objects.filter(page_meta=[]).exclude(pages=[])
+            .select_related('manga').only('number', 'pages', 'page_meta', 'manga__slug', 'manga__source')
+            .order_by('-pk')
+        )
+        if options['source']:
+            chapters = chapters.filter(manga__source=options['source'])
+        if options['slugs']:
+            chapters = chapters.filter(manga__slug__in=options['slugs'])
+        limit = options['limit']
+        ids = list(chapters.filter(pk__in=ingest.take_probe_queue()).values_list('pk', flat=True))
+        for pk in ids[limit:] if limit is not None else ():
+            # Не уместившиеся в --limit ждут следующего запуска
+            ingest.queue_probe(pk)
+        ids = ids[:limit]
+        rest = chapters.exclude(pk__in=ids).values_list('pk', flat=True)
+        ids += rest[:limit - len(ids)] if limit is not None else rest
+
+        done = pages = measured = 0
+        for pk in ids:
+            chapter = chapters.get(pk=pk)
+            parser = get_parser(chapter.manga.source)
+            if parser is None:
+                continue
+            measured += ingest.probe_pages(chapter, parser, workers=options['workers'])
+            pages += len(chapter.pages)
+            done += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{chapter.manga.slug} гл. {chapter.number:g}: {len(chapter.pages)} стр.")
+
+        self.stdout.write(self.style.SUCCESS(f"Глав: {done}, страниц измерено {measured} из {pages}"))
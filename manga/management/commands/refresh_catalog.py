@@ -0,0 +1,85 @@
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from luanovel.budget import track_usage
+from manga import ingest
+from manga.models import Manga
+from parser.parsers import PARSERS, get_parser
+from parser.parsers.transport import RateLimitedTransport, get_transport, set_transport
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет метаданные и главы сохранённых тайтлов с источников. '
+        'Тайтлы, у которых хэш данных не изменился, в БД не пишутся; '
+        'в конце — сколько записей удалось пропустить.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=sorted(PARSERS), help='Только тайтлы этого источника')
+        parser.add_argument('--slug', action='append', dest='slugs', help='Конкретные тайтлы (можно несколько)')
+        parser.add_argument('--limit', type=int, help='Не больше N тайтлов')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Тайтлов в одной выборке из БД')
+
+    def handle(self, *args, **options):
+        mangas = Manga.objects.order_by('pk')
+        if options['source']:
+            mangas = mangas.filter(source=options['source'])
+        if options['slugs']:
+            mangas = mangas.filter(slug__in=options['slugs'])
+        ids = list(mangas.values_list('pk', flat=True)[:options['limit']])
+
+        self.verbosity = options['verbosity']
+        self.stats = dict.fromkeys(
+            ('metadata_updated', 'metadata_unchanged', 'chapters_updated', 'chapters_unchanged', 'errors',
+             'writes_skipped'), 0
+        )
+        previous = get_transport()
+        set_transport(RateLimitedTransport(previous, getattr(settings, 'IMPORT_RATE_LIMITS', {})))
+        try:
+            with track_usage() as usage:
+                for start in range(0, len(ids), options['chunk_size']):
+                    chunk = Manga.objects.filter(pk__in=ids[start:start + options['chunk_size']]).order_by('pk')
+                    for manga in chunk:
+                        self._refresh(manga)
+        finally:
+            set_transport(previous)
+
+        stats = self.stats
+        self.stdout.write(
+            f"Тайтлов: {len(ids)}, ошибок: {stats['errors']}\n"
+            f"Метаданные: обновлено {stats['metadata_updated']}, без изменений {stats['metadata_unchanged']}\n"
+            f"Главы: обновлено {stats['chapters_updated']}, без изменений {stats['chapters_unchanged']}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Записей в БД: {usage.writes}, пропущено записей по хэшу: {stats['writes_skipped']}"
+        ))
+
+    def _refresh(self, manga):
+        parser = get_parser(manga.source)
+        if parser is None:
+            self.stats['errors'] += 1
+            return
+
+        details = parser.get_manga_details(manga.slug)
+        if details is None:
+            self.stderr.write(f"{manga.slug}: не удалось получить данные")
+            self.stats['errors'] += 1
+            return
+        metadata = ingest.refresh_manga(manga, details)
+        self.stats['metadata_updated' if metadata else 'metadata_unchanged'] += 1
+        if not metadata:
+            self.stats['writes_skipped'] += ingest.skipped_writes('metadata', details)
+
+        try:
+            chapters = ingest.refresh_chapters(manga, parser.iter_chapters(manga.slug))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self.stderr.write(f"{manga.slug}: главы не загрузились: {e}")
+            self.stats['errors'] += 1
+            return
+        self.stats['chapters_updated' if chapters else 'chapters_unchanged'] += 1
+        if not chapters:
+            self.stats['writes_skipped'] += ingest.skipped_writes('chapters')
+        if self.verbosity > 1:
+            self.stdout.write(f"{manga.slug}: метаданные {'+' if metadata else '='}, главы {'+' if chapters else '='}")
@@ -0,0 +1,113 @@
+import random
+import struct
+import threading
+import time
+import zlib
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from parser.parsers.transport import FixtureStore, fixture_key
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+
+@lru_cache(maxsize=8)
+def placeholder_png(width: int, height: int) -> bytes:
+    """Серый PNG заданного размера (без Pillow)"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    row = b'\x00' + bytes([0x80]) * width
+    raw = zlib.compress(row * height, 6)
+    header = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', raw) + chunk(b'IEND', b'')
+
+
+class Command(BaseCommand):
+    help = (
+        'Заглушка внешних API: отдаёт записанные фикстуры (PARSER_TRANSPORT=record) '
+        'с настраиваемой задержкой и ошибками. Приложение направляется на неё через '
+        'PARSER_UPSTREAM_URL=http://<host>:<port>'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--fixtures', default=settings.PARSER_FIXTURES_DIR)
+        parser.add_argument('--latency', type=float, default=0, help='Задержка ответа, мс')
+        parser.add_argument('--jitter', type=float, default=0, help='Разброс задержки, мс')
+        parser.add_argument('--error-rate', type=float, default=0, help='Доля ответов 503 (0..1)')
+        parser.add_argument('--image-size', default='800x1200',
+                            help='Размер картинок-заглушек для страниц без фикстуры')
+
+    def handle(self, *args, **options):
+        store = FixtureStore(options['fixtures'])
+        width, height = (int(v) for v in options['image_size'].lower().split('x'))
+        stats = {'served': 0, 'missing': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+
+                delay = options['latency'] + random.uniform(-options['jitter'], options['jitter'])
+                if delay > 0:
+                    time.sleep(delay / 1000)
+
+                if random.random() < options['error_rate']:
+                    with lock:
+                        stats['errors'] += 1
+                    return self._reply(503, b'{"error": "injected"}', 'application/json')
+
+                original_url = 'https://' + self.path.lstrip('/')
+                fixture = store.load(fixture_key(self.command, original_url, body))
+                if fixture:
+                    meta, content = fixture
+                    with lock:
+                        stats['served'] += 1
+                    return self._reply(meta['status'], content, meta.get('content_type', ''))
+
+                if self.path.split('?')[0].lower().endswith(IMAGE_EXTENSIONS):
+                    with lock:
+                        stats['served'] += 1
+                    return self._reply(200, placeholder_png(width, height), 'image/png')
+
+                with lock:
+                    stats['missing'] += 1
+                return self._reply(404, b'{"error": "no fixture"}', 'application/json')
+
+            def _reply(self, status, content, content_type):
+                self.send_response(status)
+                if content_type:
+                    self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(content)
+
+            do_GET = do_POST = do_HEAD = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((options['host'], options['port']), Handler)
+        server.daemon_threads = True
+        self.stdout.write(
+            f"Заглушка на http://{options['host']}:{options['port']} "
+            f"(фикстуры: {options['fixtures']}). Ctrl+C для остановки."
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(
+                f"Отдано: {stats['served']}, без фикстуры: {stats['missing']}, ошибок: {stats['errors']}"
+            )
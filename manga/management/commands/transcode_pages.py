@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from manga import images
+from manga.models import Chapter
+
+
+class Command(BaseCommand):
+    help = (
+        'Готовит облегчённые варианты страниц глав (manga/images.py) и печатает '
+        'по каждой главе объём оригиналов, вариантов и сэкономленные байты.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slug', action='append', dest='slugs', required=True,
+                            help='Тайтлы (можно несколько)')
+        parser.add_argument('--chapter', type=float, action='append', dest='numbers', help='Только эти главы')
+        parser.add_argument('--tier', choices=sorted(images.TIERS), default='saver')
+        parser.add_argument('--width', type=int, help='Ширина (по умолчанию предел уровня)')
+        parser.add_argument('--accept', default='image/avif,image/webp',
+                            help='Какие форматы поддерживает клиент (как заголовок Accept)')
+
+    def handle(self, *args, **options):
+        if not images.available():
+            raise CommandError('Перекодирование недоступно: нужен Pillow и IMAGE_TRANSCODING=1')
+
+        chapters = (
+            Chapter.objects.filter(manga__slug__in=options['slugs']).exclude(pages=[])
+            .select_related('manga').only('number', 'pages', 'manga__slug', 'manga__source')
+            .order_by('manga__slug', 'number')
+        )
+        if options['numbers']:
+            chapters = chapters.filter(number__in=options['numbers'])
+        width = images._width(options['width'], options['tier'])
+
+        total_original = total_served = 0
+        for chapter in chapters.iterator():
+            original = served = failed = 0
+            for url in chapter.pages:
+                variant = images.get_variant(url, chapter.manga.source, options['tier'], width, options['accept'])
+                if variant is None:
+                    failed += 1
+                    continue
+                original += variant.original_size
+                served += variant.size
+            total_original += original
+            total_served += served
+            self.stdout.write(
+                f"{chapter.manga.slug} гл. {chapter.number:g}: {_mb(original)} -> {_mb(served)}, "
+                f"сэкономлено {_mb(original - served)}{_percent(original, served)}"
+                + (f", ошибок {failed}" if failed else '')
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Итого: {_mb(total_original)} -> {_mb(total_served)}, "
+            f"сэкономлено {_mb(total_original - total_served)}{_percent(total_original, total_served)}"
+        ))
+
+
+def _mb(size: int) -> str:
+    return f'{size / 2 ** 20:.2f} МБ'
+
+
+def _percent(original: int, served: int) -> str:
+    return f' ({100 * (original - served) / original:.0f}%)' if original else ''
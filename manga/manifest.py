@@ -0,0 +1,107 @@
+# manga/manifest.py
+"""
+Манифест главы для клиентов (api/v1 .../manifest/ и service worker читалки):
+страницы по порядку, их размеры, объём и хэши (ETag источника, см.
+ingest.probe_pages), соседние главы и ссылки на их манифесты. По манифесту
+клиент заранее качает следующие главы прямо с CDN источника и читает их
+без сети.
+
+version — хэш списка страниц: пока он не изменился, сохранённые клиентом
+картинки главы актуальны.
+
+Страницы читалки и манифеста одни и те же (reader_pages): при уровне качества
+картинок не 'original' у страниц есть src/srcset облегчённых вариантов с
+нашего сервера, у длинных лент — tiles. Service worker сохраняет именно их,
+поэтому глава читается без сети с теми же адресами, что и в сети.
+"""
+import hashlib
+
+from django.template.defaultfilters import floatformat
+from django.urls import reverse
+
+from . import images
+
+# Поля страницы в манифесте; неизвестные значения — null
+PAGE_FIELDS = ('url', 'width', 'height', 'bytes', 'hash')
+
+
+def page_entries(chapter) -> list:
+    """Страницы главы из кэша Chapter.pages с размерами из Chapter.page_meta"""
+    meta = chapter.page_meta if len(chapter.page_meta) == len(chapter.pages) else [None] * len(chapter.pages)
+    return [
+        dict(zip(PAGE_FIELDS, [url, *(page or (None,) * 4)]))
+        for url, page in zip(chapter.pages, meta)
+    ]
+
+
+def _add_variant_sources(entries, slug, chapter, tier):
+    """Страницы через manga:page_image: облегчённые варианты нужной ширины (src/srcset)"""
+    kwargs = {'slug': slug, 'volume': chapter.volume, 'number': _number(chapter), 'index': 0}
+    prefix = reverse('manga:page_image', kwargs=kwargs)[:-len('0/')]
+    for index, entry in enumerate(entries):
+        url = f'{prefix}{index}/?q={tier}'
+        entry['src'] = url
+        entry['srcset'] = ', '.join(
+            f'{url}&w={width} {width}w' for width in images.WIDTHS if width <= images.TIERS[tier]['width']
+        )
+
+
+def _add_tiles(entries, slug, chapter, tier):
+    """Длинные ленты кусками через manga:page_tile: читалка грузит только куски у экрана"""
+    kwargs = {'slug': slug, 'volume': chapter.volume, 'number': _number(chapter), 'tile': 0}
+    for index, entry in enumerate(entries):
+        heights = images.tile_heights(entry.get('height'))
+        if heights:
+            prefix = reverse('manga:page_tile', kwargs={**kwargs, 'index': index})[:-len('0/')]
+            entry['tiles'] = [
+                {'src': f'{prefix}{number}/?q={tier}', 'height': height}
+                for number, height in enumerate(heights)
+            ]
+
+
+def reader_pages(chapter, slug: str, tier: str = images.ORIGINAL) -> list:
+    """page_entries с адресами вариантов и кусков для уровня качества tier (manga/images.py)"""
+    entries = page_entries(chapter)
+    if tier != images.ORIGINAL:
+        _add_variant_sources(entries, slug, chapter, tier)
+    _add_tiles(entries, slug, chapter, tier)
+    return entries
+
+
+def _number(chapter) -> str:
+    return floatformat(chapter.number, -1)
+
+
+def _links(slug: str, chapter) -> dict:
+    kwargs = {'slug': slug, 'volume': chapter.volume, 'number': _number(chapter)}
+    return {
+        'reader': reverse('manga:reader', kwargs=kwargs),
+        'manifest': reverse('api:chapter-manifest', kwargs={
+            'version': 'v1', 'slug': slug, 'number': _number(chapter),
+        }),
+    }
+
+
+def _neighbor(slug: str, chapter):
+    if chapter is None:
+        return None
+    return {'number': chapter.number, 'volume': chapter.volume, **_links(slug, chapter)}
+
+
+def chapter_manifest(chapter, slug: str, tier: str = images.ORIGINAL) -> dict:
+    """
+    Манифест главы. У chapter должны быть загружены pages и prev_chapter/next_chapter
+    (select_related), иначе соседи достанутся отдельными запросами.
+    """
+    pages = reader_pages(chapter, slug, tier)
+    return {
+        'manga': slug,
+        'chapter': chapter.id,
+        'number': chapter.number,
+        'volume': chapter.volume,
+        'version': hashlib.blake2b('\n'.join(chapter.pages).encode(), digest_size=8).hexdigest(),
+        **_links(slug, chapter),
+        'pages': pages,
+        'prev': _neighbor(slug, chapter.prev_chapter),
+        'next': _neighbor(slug, chapter.next_chapter),
+    }
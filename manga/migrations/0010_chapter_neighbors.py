@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-18 22:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_chapters(apps, schema_editor):
+    Manga = apps.get_model('manga', 'Manga')
+    Chapter = apps.get_model('manga', 'Chapter')
+
+    for manga_id in Manga.objects.values_list('id', flat=True).iterator():
+        chapters = list(Chapter.objects.filter(manga_id=manga_id).order_by('number'))
+        for i, chapter in enumerate(chapters):
+            chapter.prev_chapter_id = chapters[i - 1].id if i > 0 else None
+            chapter.next_chapter_id = chapters[i + 1].id if i + 1 < len(chapters) else None
+        Chapter.objects.bulk_update(chapters, ['prev_chapter', 'next_chapter'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0009_remove_manga_manga_manga_source_c6416d_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapter',
+            name='next_chapter',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='manga.chapter'),
+        ),
+        migrations.AddField(
+            model_name='chapter',
+            name='prev_chapter',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='manga.chapter'),
+        ),
+        migrations.RunPython(link_chapters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 22:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0010_chapter_neighbors'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='manga',
+            index=models.Index(fields=['-views_count', '-bookmarks_count'], name='manga_manga_views_c_8cadcd_idx'),
+        ),
+    ]
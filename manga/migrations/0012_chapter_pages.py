@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 23:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0011_manga_popularity_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapter',
+            name='pages',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 6.0.1 on 2026-10-18 23:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_latest_chapter(apps, schema_editor):
+    Manga = apps.get_model('manga', 'Manga')
+    Chapter = apps.get_model('manga', 'Chapter')
+    chapters = Chapter.objects.filter(manga=models.OuterRef('pk'))
+    Manga.objects.update(
+        last_chapter_added_at=models.Subquery(chapters.order_by('-created_at').values('created_at')[:1]),
+        latest_chapter=models.Subquery(chapters.order_by('-number').values('pk')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0012_chapter_pages'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChapterEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='manga',
+            name='last_chapter_added_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='manga',
+            name='latest_chapter',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='manga.chapter'),
+        ),
+        migrations.AddIndex(
+            model_name='manga',
+            index=models.Index(fields=['-last_chapter_added_at'], name='manga_manga_last_ch_4a9425_idx'),
+        ),
+        migrations.AddField(
+            model_name='chapterevent',
+            name='chapter',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='manga.chapter'),
+        ),
+        migrations.AddField(
+            model_name='chapterevent',
+            name='manga',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chapter_events', to='manga.manga'),
+        ),
+        migrations.AddIndex(
+            model_name='chapterevent',
+            index=models.Index(fields=['-created_at'], name='manga_chapt_created_803679_idx'),
+        ),
+        migrations.RunPython(backfill_latest_chapter, migrations.RunPython.noop),
+    ]
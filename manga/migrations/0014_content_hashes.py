@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 23:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0013_chapter_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='manga',
+            name='chapters_hash',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='manga',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 23:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0014_content_hashes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapter',
+            name='page_meta',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0015_chapter_page_meta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapter',
+            name='pages_fetched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, models, router
+from django.utils import timezone
 
 class Genre(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -38,6 +42,16 @@ class Manga(models.Model):
     
 
     total_chapters = models.IntegerField(default=0)
+    # Лента обновлений: когда последний раз появлялись новые главы и самая свежая из них
+    # (проставляется ingest.save_chapters, в отличие от updated_at не меняется от прочих save)
+    last_chapter_added_at = models.DateTimeField(null=True, blank=True)
+    latest_chapter = models.ForeignKey(
+        'Chapter', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    # Хэши данных источника (ingest.manga_hash / ChapterListHash): обновление
+    # без изменений на источнике ничего не пишет
+    content_hash = models.CharField(max_length=32, blank=True)
+    chapters_hash = models.CharField(max_length=32, blank=True)
     views_count = models.IntegerField(default=0)
     bookmarks_count = models.IntegerField(default=0)
     
@@ -50,11 +64,41 @@ class Manga(models.Model):
         indexes = [
             models.Index(fields=['slug']),
             models.Index(fields=['-updated_at']),
+            models.Index(fields=['-views_count', '-bookmarks_count']),
+            models.Index(fields=['-last_chapter_added_at']),
         ]
     
     def __str__(self):
         return self.title
 
+    def link_chapters(self):
+        """Пересчитывает ссылки на соседние главы (по возрастанию номера)"""
+        rows = list(
+            self.chapters.order_by('number').values_list('id', 'prev_chapter_id', 'next_chapter_id')
+        )
+        changed = []
+        for i, (chapter_id, old_prev, old_next) in enumerate(rows):
+            prev_id = rows[i - 1][0] if i > 0 else None
+            next_id = rows[i + 1][0] if i + 1 < len(rows) else None
+            if old_prev != prev_id or old_next != next_id:
+                changed.append((prev_id, next_id, chapter_id))
+
+        if changed:
+            # Один UPDATE с executemany: bulk_update строит CASE на каждую строку
+            # и на тысячах глав дороже самой записи
+            model = self.chapters.model
+            using = router.db_for_write(model)
+            quote = connections[using].ops.quote_name
+            sql = 'UPDATE {} SET {} = %s, {} = %s WHERE {} = %s'.format(
+                quote(model._meta.db_table),
+                quote(model._meta.get_field('prev_chapter').column),
+                quote(model._meta.get_field('next_chapter').column),
+                quote(model._meta.pk.column),
+            )
+            with connections[using].cursor() as cursor:
+                cursor.executemany(sql, changed)
+        return len(changed)
+
 
 class Chapter(models.Model):
     manga = models.ForeignKey(Manga, on_delete=models.CASCADE, related_name='chapters')
@@ -65,10 +109,26 @@ class Chapter(models.Model):
 
     url = models.URLField()
     pages_count = models.IntegerField(default=0)
+    # Кэш списка страниц (url), заполняется при первом открытии главы.
+    # Адреса на CDN источника со временем меняются: после CHAPTER_PAGES_TTL
+    # или ошибки загрузки (pages_fetched_at сбрасывается) список берётся заново
+    pages = models.JSONField(default=list, blank=True)
+    pages_fetched_at = models.DateTimeField(null=True, blank=True)
+    # Параллельно pages: [ширина, высота, байт, etag] по заголовкам картинок
+    # (ingest.probe_pages); null — страницу измерить не удалось
+    page_meta = models.JSONField(default=list, blank=True)
     
 
     release_date = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    # Соседние главы, проставляются при синхронизации (Manga.link_chapters)
+    prev_chapter = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    next_chapter = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
     
     class Meta:
         ordering = ['-number']
@@ -78,4 +138,26 @@ class Chapter(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.manga.title} - Ch. {self.number}"
\ No newline at end of file
+        return f"{self.manga.title} - Ch. {self.number}"
+
+    def pages_stale(self) -> bool:
+        """Кэш страниц пуст, сброшен после ошибки или старше CHAPTER_PAGES_TTL"""
+        if not self.pages or self.pages_fetched_at is None:
+            return True
+        return timezone.now() - self.pages_fetched_at > timedelta(seconds=settings.CHAPTER_PAGES_TTL)
+
+
+class ChapterEvent(models.Model):
+    """Журнал появления новых глав (пишет синхронизация глав)"""
+    manga = models.ForeignKey(Manga, on_delete=models.CASCADE, related_name='chapter_events')
+    chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.chapter} ({self.created_at:%Y-%m-%d %H:%M})"
@@ -0,0 +1,179 @@
+# manga/snapshot.py
+"""
+Снимок каталога (Genre, Manga, связи с жанрами, Chapter вместе с кэшем
+страниц) для быстрого развёртывания нового узла без повторного парсинга.
+
+Формат — gzip с JSON по строке: первая строка — заголовок с версией и
+списком колонок каждой таблицы, дальше строки ["таблица", значения...],
+сгруппированные по таблицам в порядке TABLES. Выгрузка и загрузка
+потоковые: память не зависит от размера каталога.
+
+Загрузка сохраняет первичные ключи (на них ссылаются prev/next глав),
+вставляет строки пачками через executemany в одной транзакции, а индексы
+из Meta.indexes снимает на время загрузки и строит заново в конце.
+"""
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from parser.parsers.records import dumps, loads
+
+from .models import Chapter, Genre, Manga
+
+FORMAT = 'luanovel-catalog'
+VERSION = 1
+
+
+def _tables() -> dict:
+    # Порядок важен: внешние ключи ссылаются на уже загруженные строки
+    return {
+        'genre': Genre,
+        'manga': Manga,
+        'manga_genres': Manga.genres.through,
+        'chapter': Chapter,
+    }
+
+
+def _columns(model) -> list:
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def dump(write, chunk_size: int = 2000) -> dict:
+    """
+    Пишет снимок построчно через write(bytes).
+
+    Returns:
+        dict: {таблица: число строк}
+    """
+    tables = _tables()
+    header = {
+        'format': FORMAT,
+        'version': VERSION,
+        'columns': {name: _columns(model) for name, model in tables.items()},
+    }
+    write(dumps(header) + b'\n')
+
+    counts = {}
+    for name, model in tables.items():
+        rows = model.objects.order_by('pk').values_list(*_columns(model)).iterator(chunk_size=chunk_size)
+        count = 0
+        for row in rows:
+            write(dumps([name, *row]) + b'\n')
+            count += 1
+        counts[name] = count
+    return counts
+
+
+# Значения этих полей в JSON не совпадают с тем, что ждёт драйвер БД
+_CONVERTED_TYPES = {'DateTimeField', 'DateField', 'TimeField', 'JSONField', 'DecimalField', 'UUIDField'}
+
+
+def _passthrough(value):
+    return value
+
+
+def _converters(model, columns: list) -> list:
+    """Python-значения из JSON -> значения для БД (даты из строк, JSON-поля)"""
+    converters = []
+    for column in columns:
+        field = model._meta.get_field(column)
+        if field.get_internal_type() in _CONVERTED_TYPES:
+            converters.append(lambda value, field=field: (
+                None if value is None else field.get_db_prep_save(field.to_python(value), connection)
+            ))
+        else:
+            converters.append(_passthrough)
+    return converters
+
+
+class _Table:
+    """Пачка строк одной таблицы для executemany"""
+
+    def __init__(self, model, columns: list):
+        unknown = set(columns) - set(_columns(model))
+        if unknown:
+            raise ValueError(f"{model._meta.db_table}: неизвестные колонки {sorted(unknown)}")
+        quote = connection.ops.quote_name
+        self.sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(model._meta.db_table),
+            ', '.join(quote(model._meta.get_field(column).column) for column in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+        self.converters = _converters(model, columns)
+        self.rows = []
+        self.count = 0
+
+    def add(self, values):
+        self.rows.append([convert(value) for convert, value in zip(self.converters, values)])
+
+    def flush(self, cursor):
+        if self.rows:
+            cursor.executemany(self.sql, self.rows)
+            self.count += len(self.rows)
+            self.rows = []
+
+
+def _indexes() -> list:
+    return [(model, index) for model in (Genre, Manga, Chapter) for index in model._meta.indexes]
+
+
+def load(lines, batch_size: int = 5000, progress=None) -> dict:
+    """
+    Загружает снимок из итератора строк (bytes) в пустые таблицы каталога.
+
+    Args:
+        lines: Строки файла снимка
+        batch_size: Строк в одном executemany
+        progress: Необязательный callback(таблица, загружено строк)
+
+    Returns:
+        dict: {таблица: число строк}
+    """
+    lines = iter(lines)
+    header = loads(next(lines, b'{}'))
+    if header.get('format') != FORMAT:
+        raise ValueError('Это не снимок каталога')
+    if header.get('version') != VERSION:
+        raise ValueError(f"Неподдерживаемая версия снимка: {header.get('version')}")
+    if Manga.objects.exists() or Genre.objects.exists():
+        raise ValueError('Каталог в БД не пуст')
+
+    models = _tables()
+    tables = {}
+    editor = connection.schema_editor()
+    with transaction.atomic(), connection.cursor() as cursor:
+        quote = connection.ops.quote_name
+        for model, index in _indexes():
+            cursor.execute(editor.sql_delete_index % {
+                'name': quote(index.name), 'table': quote(model._meta.db_table),
+            })
+
+        current = None
+        for line in lines:
+            if not line.strip():
+                continue
+            name, *values = loads(line)
+            table = tables.get(name)
+            if table is None:
+                if name not in models:
+                    raise ValueError(f"Неизвестная таблица в снимке: {name}")
+                table = tables[name] = _Table(models[name], header['columns'][name])
+            if name != current:
+                # Таблица сменилась: дописываем предыдущую до её зависимых
+                if current is not None:
+                    tables[current].flush(cursor)
+                current = name
+            table.add(values)
+            if len(table.rows) >= batch_size:
+                table.flush(cursor)
+                if progress:
+                    progress(name, table.count)
+        for table in tables.values():
+            table.flush(cursor)
+
+        for model, index in _indexes():
+            cursor.execute(str(index.create_sql(model, editor)))
+        # Ключи вставлены явно: сдвигаем последовательности (PostgreSQL)
+        for sql in connection.ops.sequence_reset_sql(no_style(), list(models.values())):
+            cursor.execute(sql)
+
+    return {name: table.count for name, table in tables.items()}
@@ -0,0 +1,156 @@
+// Service worker читалки (отдаётся с /sw.js, см. manga.views.service_worker).
+// Читалка присылает {type: 'precache', manifest: <url манифеста следующей главы>, count: N}:
+// воркер по цепочке manifest.next скачивает N глав — HTML читалки в CHAPTERS,
+// картинки страниц в PAGES — и потом отдаёт их из кэша без сети.
+// Картинки — те же адреса, что грузит читалка (manifest.pages[].src/tiles, см.
+// manga/manifest.py). Качаются с CORS и сохраняются только успешные ответы: непрозрачный
+// (no-cors) ответ мог бы оказаться ошибкой CDN, а квоту он занимает в разы больше
+// своего размера. CDN без CORS — страницы не сохраняются, читаются из сети.
+// Хранится не больше MAX_CHAPTERS глав, самые старые удаляются.
+const VERSION = 'v1';
+const CHAPTERS = `luanovel-chapters-${VERSION}`;
+const PAGES = `luanovel-pages-${VERSION}`;
+const MAX_CHAPTERS = {{ max_chapters }};
+const PAGE_CONCURRENCY = 3;
+const NETWORK_TIMEOUT = 4000;
+
+self.addEventListener('install', () => self.skipWaiting());
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil((async () => {
+        for (const name of await caches.keys()) {
+            if (name.startsWith('luanovel-') && name !== CHAPTERS && name !== PAGES) {
+                await caches.delete(name);
+            }
+        }
+        await self.clients.claim();
+    })());
+});
+
+function withTimeout(promise, ms) {
+    return Promise.race([
+        promise,
+        new Promise((_, reject) => setTimeout(() => reject(new Error('timeout')), ms)),
+    ]);
+}
+
+// Сначала сеть (с таймаутом — на плохой связи не ждём), при ошибке — сохранённая копия
+async function networkFirst(request) {
+    try {
+        return await withTimeout(fetch(request), NETWORK_TIMEOUT);
+    } catch (error) {
+        const cached = await caches.match(request, {cacheName: CHAPTERS});
+        if (cached) return cached;
+        throw error;
+    }
+}
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+
+    if (request.destination === 'image') {
+        event.respondWith((async () => {
+            const cached = await caches.match(request.url, {cacheName: PAGES, ignoreVary: true});
+            if (cached) return cached;
+            try {
+                return await fetch(request);
+            } catch (error) {
+                // Без сети вариант другой ширины из srcset (&w=) заменяем сохранённым
+                const url = new URL(request.url);
+                if (url.origin !== self.location.origin || !url.searchParams.has('w')) throw error;
+                url.searchParams.delete('w');
+                const fallback = await caches.match(url.href, {cacheName: PAGES, ignoreVary: true});
+                if (fallback) return fallback;
+                throw error;
+            }
+        })());
+    } else if (request.mode === 'navigate' || new URL(request.url).pathname.endsWith('/manifest/')) {
+        event.respondWith(networkFirst(request));
+    }
+});
+
+self.addEventListener('message', (event) => {
+    const data = event.data || {};
+    if (data.type === 'precache' && data.manifest) {
+        event.waitUntil(precache(data.manifest, data.count || 1));
+    }
+});
+
+// Адреса картинок страницы, которые грузит читалка: куски длинной ленты,
+// облегчённый вариант с нашего сервера (manga/images.py) или оригинал с CDN
+function pageUrls(page) {
+    if (page.tiles) return page.tiles.map((tile) => new URL(tile.src, self.location.origin).href);
+    return [new URL(page.src || page.url, self.location.origin).href];
+}
+
+async function fetchRetrying(request, attempts = 2) {
+    for (let attempt = 1; ; attempt++) {
+        try {
+            const response = await fetch(request);
+            if (response.ok) return response;
+            throw new Error(`HTTP ${response.status}`);
+        } catch (error) {
+            if (attempt >= attempts) throw error;
+            await new Promise((resolve) => setTimeout(resolve, 1000 * attempt));
+        }
+    }
+}
+
+async function precache(manifestUrl, count) {
+    const chapters = await caches.open(CHAPTERS);
+    let url = manifestUrl;
+    for (let i = 0; i < count && url; i++) {
+        let manifest;
+        try {
+            const response = await fetchRetrying(url);
+            await chapters.put(url, response.clone());
+            manifest = await response.json();
+        } catch (error) {
+            return;  // нет связи — попробуем при следующем открытии главы
+        }
+        await cacheChapter(chapters, manifest);
+        url = manifest.next && manifest.next.manifest;
+    }
+    await trim(chapters);
+}
+
+async function cacheChapter(chapters, manifest) {
+    if (!await chapters.match(manifest.reader)) {
+        try {
+            await chapters.put(manifest.reader, await fetchRetrying(manifest.reader));
+        } catch (error) {
+            // Без HTML главы картинки всё равно пригодятся при следующем открытии
+        }
+    }
+
+    const pages = await caches.open(PAGES);
+    const queue = manifest.pages.flatMap(pageUrls);
+    const worker = async () => {
+        while (queue.length) {
+            const url = queue.shift();
+            if (await pages.match(url, {ignoreVary: true})) continue;
+            try {
+                await pages.put(url, await fetchRetrying(new Request(url, {mode: 'cors', credentials: 'omit'})));
+            } catch (error) {
+                // Ошибка или CDN без CORS — пропускаем: при чтении страница загрузится из сети
+            }
+        }
+    };
+    await Promise.all(Array.from({length: PAGE_CONCURRENCY}, worker));
+}
+
+// Ключи кэша идут в порядке добавления: удаляем самые старые главы сверх лимита
+async function trim(chapters) {
+    const manifests = (await chapters.keys()).filter((request) => new URL(request.url).pathname.endsWith('/manifest/'));
+    const pages = await caches.open(PAGES);
+    for (const request of manifests.slice(0, Math.max(0, manifests.length - MAX_CHAPTERS))) {
+        const response = await chapters.match(request);
+        const manifest = response && await response.json().catch(() => null);
+        if (manifest) {
+            await Promise.all(manifest.pages.flatMap(pageUrls).map((url) => pages.delete(url, {ignoreVary: true})));
+            await chapters.delete(manifest.reader);
+        }
+        await chapters.delete(request);
+    }
+}
@@ -0,0 +1,14 @@
+from django import template
+from django.urls import reverse
+
+from manga.images import ORIGINAL
+
+register = template.Library()
+
+
+@register.filter
+def cover_src(manga, tier):
+    """Адрес обложки для уровня качества картинок (manga/images.py)"""
+    if not tier or tier == ORIGINAL:
+        return manga.cover_url
+    return f"{reverse('manga:cover', args=[manga.slug])}?q={tier}"
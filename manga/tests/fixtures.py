@@ -0,0 +1,11 @@
+"""Общие данные для тестов manga"""
+from manga.models import Chapter, Manga
+
+
+def create_manga(slug: str = 't', chapters=(), **fields) -> Manga:
+    """Тайтл с заполненными обязательными полями и главами chapters (номера, том 1, url '<slug>-<номер>')"""
+    fields = {'title': slug.upper(), 'cover_url': 'https://e.com/c', 'original_url': 'https://e.com/m', **fields}
+    manga = Manga.objects.create(slug=slug, **fields)
+    for number in chapters:
+        Chapter.objects.create(manga=manga, number=number, url=f'{slug}-{number}')
+    return manga
@@ -0,0 +1,113 @@
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from luanovel import metrics
+from luanovel.cache import FileCache, get_or_compute
+from parser.parsers import SearchHit
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tiered-tests'},
+    'tiered': {'BACKEND': 'luanovel.cache.TieredCache', 'OPTIONS': {'SHARED': 'default', 'LOCAL_TIMEOUT': 60}},
+})
+class TieredCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['tiered'].clear()
+
+    def test_local_hit_skips_shared_tier(self):
+        tiered = caches['tiered']
+        tiered.set('key', 'value')
+        with mock.patch.object(caches['default'], 'get', side_effect=AssertionError):
+            self.assertEqual(tiered.get('key'), 'value')
+        tiered.delete('key')
+        self.assertIsNone(tiered.get('key'))
+
+    def test_expired_entry_is_served_while_another_worker_recomputes(self):
+        compute = mock.Mock(return_value='old')
+        get_or_compute('answer', compute, timeout=0)
+        # Срок истёк, но блокировку держит другой воркер: отдаём старое значение
+        caches['tiered'].add('answer:lock', 1)
+        compute.return_value = 'new'
+        self.assertEqual(get_or_compute('answer', compute, timeout=0), 'old')
+        self.assertEqual(compute.call_count, 1)
+
+        caches['tiered'].delete('answer:lock')
+        self.assertEqual(get_or_compute('answer', compute, timeout=0), 'new')
+
+    def test_concurrent_miss_computes_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_compute('slow', compute, timeout=60)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_empty_search_results_are_not_cached(self):
+        hits, misses = (metrics.cache_requests.value('search', result) for result in ('hit', 'miss'))
+        parser = mock.Mock()
+        parser.asearch = mock.AsyncMock(return_value=[])
+        with mock.patch('manga.views.get_parser', return_value=parser):
+            self.client.get(reverse('manga:api_search'), {'q': 'test', 'source': 'mangalib'})
+            parser.asearch.return_value = [SearchHit(title='Тест', slug='test', source='mangalib')]
+            self.client.get(reverse('manga:api_search'), {'q': 'test', 'source': 'mangalib'})
+            response = self.client.get(reverse('manga:api_search'), {'q': 'TEST', 'source': 'mangalib'})
+        self.assertEqual(response.json()['results'][0]['slug'], 'test')
+        self.assertEqual(parser.asearch.await_count, 2)
+        self.assertEqual(metrics.cache_requests.value('search', 'hit'), hits + 1)
+        self.assertEqual(metrics.cache_requests.value('search', 'miss'), misses + 2)
+
+
+class FileCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, True)
+        self.cache = FileCache(path, {'OPTIONS': {'MAX_ENTRIES': 10 ** 9}})
+
+    def test_add_does_not_overwrite_live_key(self):
+        self.assertTrue(self.cache.add('lock', 1, 60))
+        self.assertFalse(self.cache.add('lock', 2, 60))
+        self.assertEqual(self.cache.get('lock'), 1)
+
+        self.cache.set('stale', 1, -1)
+        self.assertTrue(self.cache.add('stale', 2, 60))
+        self.assertEqual(self.cache.get('stale'), 2)
+
+    def test_concurrent_incr_loses_nothing(self):
+        self.cache.set('views', 0, None)
+
+        def work():
+            for _ in range(25):
+                self.cache.incr('views')
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('views'), 200)
+
+    def test_durable_keys_are_not_culled(self):
+        for i in range(400):
+            self.cache.set(f'key:{i}', i, None)
+        self.assertEqual(len(self.cache.get_many([f'key:{i}' for i in range(400)])), 400)
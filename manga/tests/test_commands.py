@@ -0,0 +1,153 @@
+import io
+import json
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import requests
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from manga.models import Chapter, ChapterEvent, Genre, Manga
+from manga.tests.fixtures import create_manga
+from parser.parsers import ChapterRef, MangaDetails, SearchHit
+
+
+class BenchmarkCommandTests(TestCase):
+
+    def test_regression_over_threshold_fails(self):
+        options = {'stages': 'mangalib_chapters,save_chapters', 'sizes': '10', 'repeat': 1, 'stdout': io.StringIO()}
+        with TemporaryDirectory() as tmp:
+            baseline = f'{tmp}/baseline.json'
+            call_command('benchmark', baseline=baseline, save=True, **options)
+            call_command('benchmark', baseline=baseline, threshold=100, **options)
+
+            with open(baseline) as f:
+                data = json.load(f)
+            data['save_chapters:10']['time'] /= 1000
+            with open(baseline, 'w') as f:
+                json.dump(data, f)
+
+            with self.assertRaises(CommandError):
+                call_command('benchmark', baseline=baseline, **options)
+
+
+class CatalogParser:
+    """Каталог из двух страниц; вторая падает, пока fail_second=True"""
+    source = 'mangalib'
+
+    def __init__(self):
+        self.fail_second = True
+        self.pages_requested = []
+        self.failing_chapters = set()
+
+    def get_catalog_page(self, cursor=None):
+        self.pages_requested.append(cursor)
+        if cursor is None:
+            return [SearchHit(title=f'A{i}', slug=f'a-{i}', source=self.source) for i in range(3)], 2
+        if self.fail_second:
+            raise requests.exceptions.ConnectionError('offline')
+        return [SearchHit(title='B', slug='b', source=self.source)], None
+
+    def get_manga_details(self, slug):
+        return MangaDetails(title=slug, slug=slug, source=self.source, genres=['Драма'])
+
+    def get_chapters(self, slug):
+        return [ChapterRef(1, 1, '', f'{slug}-1'), ChapterRef(2, 1, '', f'{slug}-2')]
+
+    def iter_chapters(self, slug):
+        if slug in self.failing_chapters:
+            raise requests.exceptions.ConnectionError('offline')
+        yield from self.get_chapters(slug)
+
+
+class ImportCatalogTests(TestCase):
+
+    def test_resumes_from_checkpoint_after_failure(self):
+        parser = CatalogParser()
+        options = {'source': 'mangalib', 'workers': 2, 'retries': 1, 'stdout': io.StringIO()}
+        with TemporaryDirectory() as tmp, \
+                mock.patch('manga.management.commands.import_catalog.get_parser', return_value=parser):
+            checkpoint = f'{tmp}/checkpoint.json'
+            with self.assertRaises(CommandError):
+                call_command('import_catalog', checkpoint=checkpoint, **options)
+
+            state = json.loads(open(checkpoint).read())
+            self.assertEqual((state['cursor'], state['imported']), (2, 3))
+            self.assertEqual(Chapter.objects.filter(manga__slug='a-0').count(), 2)
+
+            parser.fail_second = False
+            call_command('import_catalog', checkpoint=checkpoint, **options)
+
+        # Первая страница повторно не запрашивалась
+        self.assertEqual(parser.pages_requested, [None, 2, 2])
+        self.assertEqual(sorted(Manga.objects.values_list('slug', flat=True)), ['a-0', 'a-1', 'a-2', 'b'])
+        self.assertEqual(Manga.objects.get(slug='b').genres.get().name, 'Драма')
+        # Импорт каталога — не выход новых глав: ни событий, ни тайтлов в ленте
+        self.assertFalse(ChapterEvent.objects.exists())
+        self.assertFalse(Manga.objects.filter(last_chapter_added_at__isnull=False).exists())
+        self.assertEqual(Manga.objects.get(slug='a-0').latest_chapter.number, 2)
+
+    def test_chapter_errors_are_retried_with_retry_failed(self):
+        parser = CatalogParser()
+        parser.fail_second = False
+        parser.failing_chapters = {'a-1'}
+        options = {'source': 'mangalib', 'workers': 2, 'stdout': io.StringIO(), 'stderr': io.StringIO()}
+        with TemporaryDirectory() as tmp, \
+                mock.patch('manga.management.commands.import_catalog.get_parser', return_value=parser):
+            checkpoint = f'{tmp}/checkpoint.json'
+            call_command('import_catalog', checkpoint=checkpoint, **options)
+            self.assertEqual(json.loads(open(checkpoint).read())['failed'], ['a-1'])
+            self.assertFalse(Manga.objects.filter(slug='a-1').exists())
+
+            parser.failing_chapters = set()
+            call_command('import_catalog', checkpoint=checkpoint, retry_failed=True, **options)
+            self.assertEqual(json.loads(open(checkpoint).read())['failed'], [])
+
+        self.assertEqual(Chapter.objects.filter(manga__slug='a-1').count(), 2)
+
+    def test_senkuro_needs_catalog_query_hash(self):
+        with override_settings(SENKURO_CATALOG_QUERY_HASH=None), self.assertRaises(CommandError):
+            call_command('import_catalog', source='senkuro', stdout=io.StringIO())
+        with override_settings(SENKURO_CATALOG_QUERY_HASH='abc'), \
+                mock.patch('parser.parsers.senkuro.SenkuroParser.get_catalog_page', return_value=([], None)), \
+                TemporaryDirectory() as tmp:
+            call_command('import_catalog', source='senkuro', checkpoint=f'{tmp}/state.json', stdout=io.StringIO())
+
+
+class SnapshotTests(TestCase):
+
+    def test_dump_and_load_round_trip(self):
+        manga = Manga.objects.create(
+            title='Тест', slug='snap', source='mangalib', alternative_titles=['Snap'],
+            cover_url='https://example.com/c.jpg', original_url='https://mangalib.me/snap',
+        )
+        manga.genres.add(Genre.objects.create(name='Драма', slug='drama'))
+        for number in (1, 2):
+            Chapter.objects.create(manga=manga, number=number, url=f'ch-{number}',
+                                   pages=[f'https://example.com/{number}.jpg'])
+        manga.link_chapters()
+        created_at = Manga.objects.get().created_at
+
+        with TemporaryDirectory() as tmp:
+            path = f'{tmp}/catalog.jsonl.gz'
+            call_command('dump_catalog', path, stderr=io.StringIO())
+            Manga.objects.all().delete()
+            Genre.objects.all().delete()
+            call_command('load_catalog', path, batch_size=1, stdout=io.StringIO())
+
+        manga = Manga.objects.get(slug='snap')
+        self.assertEqual(manga.created_at, created_at)
+        self.assertEqual(manga.alternative_titles, ['Snap'])
+        self.assertEqual(manga.genres.get().name, 'Драма')
+        first, second = manga.chapters.order_by('number')
+        self.assertEqual(first.next_chapter_id, second.id)
+        self.assertEqual(second.pages, ['https://example.com/2.jpg'])
+
+    def test_load_refuses_non_empty_catalog(self):
+        create_manga()
+        with TemporaryDirectory() as tmp:
+            path = f'{tmp}/catalog.jsonl.gz'
+            call_command('dump_catalog', path, stderr=io.StringIO())
+            with self.assertRaisesMessage(CommandError, 'не пуст'):
+                call_command('load_catalog', path, stdout=io.StringIO())
@@ -0,0 +1,74 @@
+import threading
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase
+
+from manga import counters
+from manga.models import Manga
+from manga.tests.fixtures import create_manga
+
+
+class CountersTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manga = create_manga('test', source='senkuro')
+
+    def setUp(self):
+        caches['buffers'].clear()
+        self.addCleanup(caches['buffers'].clear)
+
+    def test_views_are_buffered_until_flush(self):
+        counters.incr(self.manga.id)
+        counters.incr(self.manga.id)
+        counters.incr(self.manga.id, 'bookmarks_count')
+        counters.incr(self.manga.id, 'bookmarks_count', -1)
+
+        self.manga.refresh_from_db()
+        self.assertEqual(self.manga.views_count, 0)
+
+        self.assertEqual(counters.flush(), 1)
+        self.manga.refresh_from_db()
+        self.assertEqual(self.manga.views_count, 2)
+        self.assertEqual(self.manga.bookmarks_count, 0)
+        self.assertEqual(counters.pending(self.manga.id), {'views_count': 0, 'bookmarks_count': 0})
+        self.assertEqual(counters.flush(), 0)
+        self.assertEqual(caches['buffers'].get(counters.INDEX_KEY), set())
+
+        # Первый просмотр после сброса возвращает тайтл в индекс
+        counters.incr(self.manga.id)
+        self.assertEqual(counters.flush(), 1)
+        self.manga.refresh_from_db()
+        self.assertEqual(self.manga.views_count, 3)
+
+    def test_repeated_views_take_no_lock(self):
+        counters.incr(self.manga.id)
+        with mock.patch('manga.counters.lock', side_effect=AssertionError):
+            counters.incr(self.manga.id)
+            counters.incr(self.manga.id)
+        self.assertEqual(counters.pending(self.manga.id)['views_count'], 3)
+
+    def test_drained_keys_expire(self):
+        counters.incr(self.manga.id)
+        with mock.patch.object(counters, 'DRAINED_TIMEOUT', -1):
+            counters.flush()
+        self.assertFalse(caches['buffers'].has_key(counters._key(self.manga.id, 'views_count')))
+
+    def test_concurrent_increments_are_all_flushed(self):
+        other = create_manga('other')
+
+        def work(manga_id):
+            for _ in range(10):
+                counters.incr(manga_id)
+
+        threads = [threading.Thread(target=work, args=(manga_id,)) for manga_id in [self.manga.id, other.id] * 4]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Чтение не сбрасывает буфер само — только flush_counters
+        self.assertEqual(Manga.objects.get(pk=other.pk).views_count, 0)
+
+        self.assertEqual(counters.flush(), 2)
+        self.assertEqual(sorted(Manga.objects.values_list('views_count', flat=True)), [40, 40])
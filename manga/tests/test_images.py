@@ -0,0 +1,183 @@
+import io
+import shutil
+import struct
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from PIL import Image
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from manga import images, ingest
+from manga.manifest import page_entries
+from manga.models import Chapter
+from manga.tests.fixtures import create_manga
+from parser.parsers.imagesize import image_size
+from parser.parsers.mangalib import MangaLibParser
+from parser.parsers.transport import build_response
+from users.models import Profile
+
+
+class PageProbeTests(TestCase):
+
+    def test_image_size_reads_headers(self):
+        png = b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + struct.pack('>II', 800, 12000)
+        jpeg = (b'\xff\xd8' + b'\xff\xe1' + struct.pack('>H', 6) + b'Exif'
+                + b'\xff\xc0' + struct.pack('>HBHH', 17, 8, 1600, 720) + b'\x03')
+        webp = b'RIFF\0\0\0\0WEBPVP8X' + b'\0' * 8 + (719).to_bytes(3, 'little') + (9999).to_bytes(3, 'little')
+        self.assertEqual(image_size(png), (800, 12000))
+        self.assertEqual(image_size(jpeg), (720, 1600))
+        self.assertEqual(image_size(webp), (720, 10000))
+        self.assertIsNone(image_size(b'<html>'))
+
+    def test_pages_are_probed_with_range_requests(self):
+        head = b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + struct.pack('>II', 800, 3000)
+        sent = []
+
+        def send(method, url, **kwargs):
+            sent.append(kwargs['headers']['Range'])
+            if url.endswith('broken.png'):
+                return build_response(url, 404, b'')
+            response = build_response(url, 206, head)
+            response.headers.update({'Content-Range': 'bytes 0-23/51234', 'ETag': '"abc"'})
+            return response
+
+        manga = create_manga()
+        chapter = Chapter.objects.create(manga=manga, number=1, url='t-1',
+                                         pages=['https://e.com/1.png', 'https://e.com/broken.png'],
+                                         pages_fetched_at=timezone.now())
+        with mock.patch('parser.parsers.base.get_transport') as transport:
+            transport.return_value.send.side_effect = send
+            self.assertEqual(ingest.probe_pages(chapter, MangaLibParser(), workers=2), 1)
+
+        self.assertEqual(sent, ['bytes=0-16383', 'bytes=0-16383'])
+        chapter.refresh_from_db()
+        self.assertEqual(chapter.page_meta, [[800, 3000, 51234, '"abc"'], None])
+
+        self.assertEqual(page_entries(chapter)[0]['height'], 3000)
+        response = self.client.get(reverse('manga:reader', kwargs={'slug': 't', 'volume': 1, 'number': '1'}))
+        self.assertContains(response, '"width":800,"height":3000')
+
+    def test_probe_command_measures_queued_chapters_first(self):
+        caches['buffers'].clear()
+        manga = create_manga(source='mangalib')
+        queued, other = (
+            Chapter.objects.create(manga=manga, number=number, url=f't-{number}', pages=['https://e.com/1.png'])
+            for number in (1, 2)
+        )
+        ingest.queue_probe(queued.pk)
+        with mock.patch('manga.ingest.probe_pages', return_value=1) as probe:
+            call_command('probe_pages', limit=1, stdout=io.StringIO())
+
+        self.assertEqual([call.args[0].pk for call in probe.call_args_list], [queued.pk])
+        self.assertEqual(ingest.take_probe_queue(), set())
+
+
+class ImageTranscodingTests(TestCase):
+
+    def setUp(self):
+        caches['tiered'].clear()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, True)
+        manga = create_manga(source='mangalib', cover_url='https://e.com/c.png')
+        Chapter.objects.create(manga=manga, number=1, url='t-1', pages=['https://e.com/1.png'],
+                               pages_fetched_at=timezone.now())
+
+    def _png(self, width=1600, height=2400):
+        out = io.BytesIO()
+        Image.effect_noise((width, height), 64).convert('RGB').save(out, 'PNG')
+        return out.getvalue()
+
+    def test_tier_from_save_data_and_profile(self):
+        request = RequestFactory().get('/', HTTP_SAVE_DATA='on')
+        request.user = User.objects.create_user('reader', password='x')
+        self.assertEqual(images.image_tier(request), 'saver')
+        Profile.objects.update_or_create(user=request.user, defaults={'image_quality': 'original'})
+        self.assertEqual(images.image_tier(request), 'original')
+
+        self.client.force_login(request.user)
+        self.client.post(reverse('users:set_image_quality'), {'image_quality': 'high'})
+        self.assertEqual(images.image_tier(request), 'high')
+
+    def test_page_is_transcoded_and_cached_on_disk(self):
+        png = self._png()
+        url = reverse('manga:page_image', kwargs={'slug': 't', 'volume': 1, 'number': '1', 'index': 0})
+        with override_settings(IMAGE_CACHE_DIR=self.cache_dir), \
+                mock.patch('parser.parsers.mangalib.MangaLibParser.fetch_image', return_value=png) as fetch:
+            response = self.client.get(url, {'q': 'saver', 'w': '600'}, HTTP_ACCEPT='image/webp,*/*')
+            body = b''.join(response.streaming_content)
+            again = self.client.get(url, {'q': 'saver', 'w': '600'}, HTTP_ACCEPT='image/webp,*/*')
+            b''.join(again.streaming_content)
+
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('Accept', response['Vary'])
+        self.assertLess(len(body), len(png))
+        self.assertEqual(Image.open(io.BytesIO(body)).size, (720, 1080))
+        self.assertEqual(fetch.call_count, 1)
+
+    def test_concurrent_first_requests_transcode_once(self):
+        png = self._png(800, 1200)
+
+        def fetch(url):
+            time.sleep(0.2)
+            return png
+
+        with override_settings(IMAGE_CACHE_DIR=self.cache_dir), \
+                mock.patch('parser.parsers.mangalib.MangaLibParser.fetch_image', side_effect=fetch) as fetched:
+            results = []
+            threads = [
+                threading.Thread(target=lambda: results.append(
+                    images.get_variant('https://e.com/1.png', 'mangalib', 'saver', 720, 'image/webp')
+                ))
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(fetched.call_count, 1)
+        self.assertEqual(len({variant.path for variant in results}), 1)
+
+    def test_decompression_bomb_falls_back_to_original(self):
+        png = self._png(800, 1200)
+        url = reverse('manga:page_image', kwargs={'slug': 't', 'volume': 1, 'number': '1', 'index': 0})
+        with override_settings(IMAGE_CACHE_DIR=self.cache_dir), \
+                mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000), \
+                mock.patch('parser.parsers.mangalib.MangaLibParser.fetch_image', return_value=png):
+            response = self.client.get(url, {'q': 'saver'}, HTTP_ACCEPT='image/webp')
+            self.assertIsNone(images.get_tile('https://e.com/1.png', 'mangalib', 'saver', 'image/webp', 0))
+        self.assertRedirects(response, 'https://e.com/1.png', fetch_redirect_response=False)
+
+    def test_without_tier_redirects_to_original(self):
+        response = self.client.get(reverse('manga:cover', args=['t']))
+        self.assertRedirects(response, 'https://e.com/c.png', fetch_redirect_response=False)
+
+    def test_tall_strip_is_served_in_tiles(self):
+        png = self._png(800, 5000)
+        Chapter.objects.filter(manga__slug='t').update(page_meta=[[800, 5000, len(png), None]])
+        with override_settings(PAGE_TILE_MIN_HEIGHT=4000, PAGE_TILE_HEIGHT=2000):
+            response = self.client.get(reverse('manga:reader', kwargs={'slug': 't', 'volume': 1, 'number': '1'}))
+            self.assertContains(response, '"tiles":[{"src":"/manga/t/v1/c1/p0/t0/?q=original","height":2000}')
+            self.assertContains(response, '{"src":"/manga/t/v1/c1/p0/t2/?q=original","height":1000}]')
+
+            kwargs = {'slug': 't', 'volume': 1, 'number': '1', 'index': 0}
+            with override_settings(IMAGE_CACHE_DIR=self.cache_dir), \
+                    mock.patch('parser.parsers.mangalib.MangaLibParser.fetch_image', return_value=png) as fetch:
+                sizes = []
+                for tile in (2, 0, 1):
+                    response = self.client.get(reverse('manga:page_tile', kwargs={**kwargs, 'tile': tile}),
+                                               {'q': 'saver'}, HTTP_ACCEPT='image/webp')
+                    sizes.append(Image.open(io.BytesIO(b''.join(response.streaming_content))).size)
+                missing = self.client.get(reverse('manga:page_tile', kwargs={**kwargs, 'tile': 3}), {'q': 'saver'},
+                                          HTTP_ACCEPT='image/webp')
+
+        self.assertEqual(sizes, [(720, 900), (720, 1800), (720, 1800)])
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(missing.status_code, 404)
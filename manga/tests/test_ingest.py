@@ -0,0 +1,143 @@
+import io
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from manga import ingest
+from manga.models import Chapter, ChapterEvent, Genre, Manga
+from manga.tests.fixtures import create_manga
+from manga.views import _chapter_list_key
+from parser.parsers import ChapterRef, MangaDetails, MangaLibParser
+from parser.parsers.transport import build_response
+
+
+class IngestTests(TestCase):
+
+    def setUp(self):
+        ingest.reset_genre_cache()
+        self.addCleanup(ingest.reset_genre_cache)
+
+    def _details(self, slug, genres):
+        return MangaDetails(title=slug, slug=slug, source='senkuro', genres=genres)
+
+    def test_save_manga_query_count_does_not_depend_on_genres(self):
+        Genre.objects.create(name='Драма', slug='drama')
+        ingest.save_manga('warmup', 'senkuro', self._details('warmup', []))
+
+        # SAVEPOINT, INSERT манги, bulk_create жанров, выборка их id, вставка связей, RELEASE
+        with self.assertNumQueries(6):
+            few = ingest.save_manga('few', 'senkuro', self._details('few', ['Драма', 'Экшен']))
+        with self.assertNumQueries(6):
+            many = ingest.save_manga('many', 'senkuro', self._details('many', [f'Жанр {i}' for i in range(10)]))
+        # Все жанры уже в кэше: только манга и связи
+        with self.assertNumQueries(4):
+            ingest.save_manga('known', 'senkuro', self._details('known', ['Драма']))
+
+        self.assertEqual(sorted(few.genres.values_list('name', flat=True)), ['Драма', 'Экшен'])
+        self.assertEqual(many.genres.count(), 10)
+
+    def test_stale_genre_cache_is_reloaded(self):
+        drama = Genre.objects.create(name='Драма', slug='drama')
+        # Кэш воркера, в котором жанр ещё не пересоздан после удаления
+        ingest._genre_ids = {'Драма': drama.pk + 100}
+        manga = ingest.save_manga('t', 'senkuro', self._details('t', ['Драма']))
+
+        self.assertEqual(list(manga.genres.all()), [drama])
+        self.assertEqual(ingest._genre_cache()['Драма'], drama.pk)
+        self.assertEqual(Genre.objects.filter(name='Драма').count(), 1)
+
+    def test_save_chapters_streams_in_batches(self):
+        manga = create_manga(chapters_hash='old')
+        Chapter.objects.create(manga=manga, number=2, url='old')
+        payload = b'{"data": [' + b','.join(
+            b'{"number": "%d", "volume": "1", "name": ""}' % n for n in (1, 2, 3, 3, 4, 5)
+        ) + b']}'
+        response = build_response('https://api.cdnlibs.org/', 200, payload, 'application/json')
+
+        depth = []
+
+        def stream(chapters):
+            # Глубина транзакций в момент, когда качается следующая глава
+            for chapter in chapters:
+                depth.append(len(connection.atomic_blocks))
+                yield chapter
+
+        with mock.patch('requests.request', return_value=response) as request:
+            # Пачки по 2, каждая своей транзакцией: SAVEPOINT/RELEASE, номера, главы,
+            # события, UPDATE манги; в конце ещё транзакция: count, UPDATE манги,
+            # соседи (SELECT + executemany)
+            with self.assertNumQueries(3 * 6 + 6):
+                ingest.save_chapters(manga, stream(MangaLibParser().iter_chapters('t')), batch_size=2)
+
+        self.assertEqual(set(depth), {len(connection.atomic_blocks)})
+        self.assertTrue(request.call_args.kwargs['stream'])
+        self.assertEqual(Chapter.objects.get(manga=manga, number=2).url, 'old')
+        self.assertEqual(manga.total_chapters, 5)
+        self.assertEqual(ChapterEvent.objects.filter(manga=manga).count(), 4)
+        self.assertEqual(manga.latest_chapter.number, 5)
+        numbers = dict(manga.chapters.values_list('number', 'id'))
+        self.assertEqual(Chapter.objects.get(pk=numbers[3]).next_chapter_id, numbers[4])
+
+
+class RefreshCatalogTests(TestCase):
+
+    def setUp(self):
+        ingest.reset_genre_cache()
+        self.addCleanup(ingest.reset_genre_cache)
+
+    def test_unchanged_source_writes_nothing(self):
+        parser = mock.Mock()
+        parser.get_manga_details.return_value = MangaDetails(title='A', slug='a', source='mangalib', genres=['Драма'])
+        chapters = [ChapterRef(1, 1, '', 'a-1'), ChapterRef(2, 1, '', 'a-2')]
+        parser.iter_chapters.side_effect = lambda slug: iter(chapters)
+        with self.captureOnCommitCallbacks(execute=True):
+            manga = ingest.save_manga('a', 'mangalib', parser.get_manga_details('a'))
+            ingest.save_chapters(manga, chapters[::-1])
+        updated_at = Manga.objects.get().updated_at
+
+        changed = []
+
+        def on_change(manga, part, **kwargs):
+            changed.append(part)
+
+        ingest.catalog_changed.connect(on_change)
+        self.addCleanup(ingest.catalog_changed.disconnect, on_change)
+
+        def refresh():
+            out = io.StringIO()
+            with mock.patch('manga.management.commands.refresh_catalog.get_parser', return_value=parser), \
+                    self.captureOnCommitCallbacks(execute=True):
+                call_command('refresh_catalog', stdout=out)
+            return out.getvalue()
+
+        self.assertIn('Записей в БД: 0, пропущено записей по хэшу: 4', refresh())
+        self.assertEqual(Manga.objects.get().updated_at, updated_at)
+        self.assertEqual(changed, [])
+
+        # Столько же записей делает обновление тех же данных без проверки хэша
+        Manga.objects.update(content_hash='', chapters_hash='')
+        self.assertIn('Записей в БД: 4,', refresh())
+        changed.clear()
+
+        parser.get_manga_details.return_value = MangaDetails(title='A', slug='a', source='mangalib', genres=['Экшен'])
+        chapters.append(ChapterRef(3, 1, '', 'a-3'))
+        output = refresh()
+
+        self.assertIn('Метаданные: обновлено 1', output)
+        self.assertIn('Главы: обновлено 1', output)
+        manga = Manga.objects.get()
+        self.assertEqual(manga.genres.get().name, 'Экшен')
+        self.assertEqual(manga.total_chapters, 3)
+        self.assertGreater(manga.updated_at, updated_at)
+        self.assertEqual(changed, ['metadata', 'chapters'])
+
+    def test_new_chapters_drop_cached_chapter_list(self):
+        manga = create_manga()
+        caches['tiered'].set(_chapter_list_key(manga.pk), ('v', '<html>', 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest.save_chapters(manga, [ChapterRef(1, 1, '', 't-1')])
+
+        self.assertIsNone(caches['tiered'].get(_chapter_list_key(manga.pk)))
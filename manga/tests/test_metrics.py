@@ -0,0 +1,106 @@
+import json
+import os
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from luanovel import metrics
+from luanovel.budget import track_usage
+from manga.models import Manga
+from manga.tests.fixtures import create_manga
+from parser.parsers.base import upstream_request
+
+
+class BudgetTests(TestCase):
+
+    def test_track_usage_counts_writes_and_upstream_calls(self):
+        with track_usage() as usage:
+            Manga.objects.filter(slug='missing').first()
+            create_manga('test')
+            upstream_request.send(
+                sender=None, source='senkuro', operation='search', duration=0.1, error=None, size=10
+            )
+
+        self.assertEqual(usage.queries, 2)
+        self.assertEqual(usage.writes, 1)
+        self.assertEqual(usage.upstream, 1)
+        self.assertEqual(usage.exceeded({'writes': 0}), {'writes': (1, 0)})
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+
+    def test_metrics_endpoint_reports_view_latency_and_upstream(self):
+        self.client.get(reverse('manga:home'))
+        upstream_request.send(
+            sender=None, source='mangalib', operation='search', duration=0.2, error=None, size=2048
+        )
+
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('luanovel_request_duration_seconds_count{view="manga:home",method="GET"}', body)
+        self.assertIn('luanovel_upstream_duration_seconds_bucket{source="mangalib",operation="search",le="0.25"}', body)
+        self.assertNotIn('view="metrics"', body)
+
+    def _snapshot(self, directory, name, value):
+        with open(os.path.join(directory, name), 'w') as f:
+            json.dump({'luanovel_responses_total': [[['manga:home', '200'], value]]}, f)
+
+    def _home_responses(self):
+        body = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').content.decode()
+        prefix = 'luanovel_responses_total{view="manga:home",status="200"} '
+        return sum(int(line[len(prefix):]) for line in body.splitlines() if line.startswith(prefix))
+
+    def test_metrics_sums_snapshots_of_all_workers(self):
+        with TemporaryDirectory() as tmp, override_settings(METRICS_DIR=tmp), \
+                mock.patch.object(metrics, '_started_pid', None):
+            own_file = os.path.join(tmp, f'{os.getpid()}.json')
+            self.client.get(reverse('manga:home'))
+            # Запрос сам снимок не пишет — это делает фоновый поток
+            self.assertFalse(os.path.exists(own_file))
+            own = metrics.responses.value('manga:home', '200')
+            metrics.sync()
+            self._snapshot(tmp, '1.json', 5)  # снимок другого живого воркера
+
+            self.assertEqual(self._home_responses(), own + 5)
+            self.assertTrue(os.path.exists(own_file))
+
+    def test_finished_workers_keep_their_counts(self):
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        with TemporaryDirectory() as tmp, override_settings(METRICS_DIR=tmp), \
+                mock.patch.object(metrics, '_started_pid', None):
+            own = metrics.responses.value('manga:home', '200')
+            metrics.sync()
+            self._snapshot(tmp, f'{process.pid}.json', 5)
+            self.assertEqual(self._home_responses(), own + 5)
+            self.assertFalse(os.path.exists(os.path.join(tmp, f'{process.pid}.json')))
+            self.assertEqual(self._home_responses(), own + 5)
+
+            # Наш pid раньше был у другого процесса: его снимок не перезаписывается
+            self._snapshot(tmp, f'{os.getpid()}.json', 7)
+            metrics._started_pid = None
+            self.assertEqual(self._home_responses(), own + 5 + 7)
+
+    def test_new_service_start_clears_directory(self):
+        with TemporaryDirectory() as tmp, override_settings(METRICS_DIR=tmp), \
+                mock.patch.object(metrics, '_started_pid', None):
+            with open(os.path.join(tmp, metrics.PARENT), 'w') as f:
+                f.write('0')
+            self._snapshot(tmp, '1.json', 5)
+            self._snapshot(tmp, metrics.ARCHIVE, 7)
+
+            self.assertEqual(self._home_responses(), metrics.responses.value('manga:home', '200'))
+
+    def test_metrics_endpoint_requires_token(self):
+        # За локальным прокси адрес у всех клиентов локальный — он ничего не разрешает
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='127.0.0.1').status_code, 404)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer None').status_code, 404)
@@ -0,0 +1,108 @@
+import asyncio
+import json
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from parser.parsers import MangaLibParser, PageRef, SearchHit, transport
+from parser.parsers.base import PROFILE_FULL, PROFILE_REFRESH_CHECK
+from parser.parsers.records import iter_json_array, json_script
+from parser.parsers.transport import RecordingTransport, ReplayTransport, build_response, set_transport
+
+
+class TransportTests(TestCase):
+
+    def test_recorded_response_is_replayed_without_network(self):
+        payload = b'{"data": [{"rus_name": "Test", "slug_url": "test", "cover": {}, "type": {}}]}'
+        self.addCleanup(set_transport, None)
+
+        with TemporaryDirectory() as fixtures:
+            live = build_response('https://api.cdnlibs.org/', 200, payload, 'application/json')
+            with mock.patch('requests.request', return_value=live) as request:
+                set_transport(RecordingTransport(fixtures))
+                recorded = MangaLibParser().search('test', limit=5)
+            request.assert_called_once()
+
+            with mock.patch('requests.request', side_effect=AssertionError('network')):
+                set_transport(ReplayTransport(fixtures))
+                replayed = MangaLibParser().search('test', limit=5)
+
+            replayed_async = asyncio.run(MangaLibParser().asearch('test', limit=5))
+
+        self.assertEqual(replayed, recorded)
+        self.assertEqual(replayed_async, recorded)
+        self.assertEqual(replayed[0].slug, 'test')
+
+    def test_async_recording_saves_each_fixture_once(self):
+        recording = RecordingTransport('unused')
+        live = build_response('https://e.com/', 200, b'{}', 'application/json')
+        with mock.patch('requests.request', return_value=live), \
+                mock.patch.object(recording.store, 'save') as save:
+            asyncio.run(recording.asend('GET', 'https://e.com/'))
+
+        save.assert_called_once()
+
+    def test_async_session_is_closed_with_its_loop(self):
+        async def session():
+            first = await transport._session()
+            self.assertIs(await transport._session(), first)
+            return first
+
+        first, second = asyncio.run(session()), asyncio.run(session())
+        self.assertIsNot(first, second)
+        self.assertTrue(first.closed and second.closed)
+
+
+class ParserProfileTests(TestCase):
+
+    def test_mangalib_profiles_trim_requested_fields(self):
+        parser = MangaLibParser()
+        self.assertNotIn('fields[]', parser._search_url('test', 10))
+        self.assertIn('fields[]=rate_avg', parser._search_url('test', 10, PROFILE_FULL))
+        ingest = parser._details_url('test')
+        self.assertIn('fields[]=genres', ingest)
+        self.assertNotIn('fields[]=teams', ingest)
+        self.assertTrue(parser._details_url('test', PROFILE_REFRESH_CHECK).endswith('?fields[]=chap_count'))
+
+    def test_check_for_updates_uses_refresh_profile(self):
+        payload = b'{"data": {"slug_url": "test", "items_count": {"uploaded": 42}}}'
+        response = build_response('https://api.cdnlibs.org/', 200, payload, 'application/json')
+        with mock.patch('requests.request', return_value=response) as request:
+            self.assertEqual(MangaLibParser().check_for_updates('test'), {'total_chapters': 42})
+        self.assertTrue(request.call_args.args[1].endswith('test?fields[]=chap_count'))
+
+
+class RecordsTests(TestCase):
+
+    def setUp(self):
+        caches['tiered'].clear()
+        self.addCleanup(caches['tiered'].clear)
+
+    def test_api_search_serializes_records(self):
+        parser = mock.Mock()
+        parser.asearch = mock.AsyncMock(return_value=[
+            SearchHit(title='<Тест>', slug='test', source='mangalib', year=2020),
+        ])
+        with mock.patch('manga.views.get_parser', return_value=parser):
+            response = self.client.get(reverse('manga:api_search'), {'q': 'test', 'source': 'mangalib'})
+
+        result = response.json()['results'][0]
+        self.assertEqual(result['title'], '<Тест>')
+        self.assertEqual(result['source'], 'mangalib')
+        self.assertEqual(result['year'], 2020)
+
+    def test_json_script_escapes_markup(self):
+        html = json_script([PageRef('https://example.com/</script>.jpg')], 'pages-json')
+        self.assertNotIn('</script>.jpg', html)
+        self.assertIn('\\u003C/script\\u003E', html)
+
+    def test_iter_json_array_handles_any_chunk_boundaries(self):
+        payload = {'meta': {'data': 'x'}, 'data': [{'name': f'Глава «{i}»', 'n': [i, {'a': ']'}]} for i in range(20)]}
+        raw = json.dumps(payload, ensure_ascii=False).encode()
+        for size in (1, 7, 64, len(raw)):
+            chunks = (raw[i:i + size] for i in range(0, len(raw), size))
+            self.assertEqual(list(iter_json_array(chunks, 'data')), payload['data'])
+        self.assertEqual(list(iter_json_array([b'{"other": []}'], 'data')), [])
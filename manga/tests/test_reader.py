@@ -0,0 +1,204 @@
+import asyncio
+import io
+import zipfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.asyncio import async_unsafe
+
+from luanovel import metrics
+from luanovel.testing import BudgetTestMixin
+from manga import ingest
+from manga.models import Chapter, ChapterEvent
+from manga.tests.fixtures import create_manga
+from parser.parsers import ChapterRef, PageRef
+from users import progress
+
+
+class StubParser:
+    """Парсер-заглушка без сетевых запросов"""
+
+    def __init__(self):
+        self.in_flight = self.max_in_flight = 0
+
+    def get_pages(self, **kwargs):
+        return [PageRef('https://example.com/1.jpg'), PageRef('https://example.com/2.jpg')]
+
+    async def aget_pages(self, **kwargs):
+        return self.get_pages(**kwargs)
+
+    async def afetch_image(self, url, timeout=10):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return url.encode()
+
+
+class ChapterReaderTests(BudgetTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manga = create_manga('test', chapters=(1, 2, 2.5, 3), source='senkuro',
+                                 original_url='https://senkuro.me/manga/test')
+        cls.manga.link_chapters()
+
+    def setUp(self):
+        caches['tiered'].clear()
+        self.addCleanup(caches['tiered'].clear)
+
+    def _reader_url(self, number):
+        return reverse('manga:reader', kwargs={'slug': 'test', 'volume': 1, 'number': number})
+
+    def test_link_chapters_orders_by_number(self):
+        chapters = list(self.manga.chapters.order_by('number'))
+        self.assertIsNone(chapters[0].prev_chapter_id)
+        self.assertEqual(chapters[1].prev_chapter_id, chapters[0].id)
+        self.assertEqual(chapters[2].next_chapter_id, chapters[3].id)
+        self.assertIsNone(chapters[3].next_chapter_id)
+        self.assertEqual(self.manga.link_chapters(), 0)
+
+    @mock.patch('manga.views.get_parser', return_value=StubParser())
+    def test_reader_resolves_neighbors_in_one_query(self, _):
+        # Глава с соседями одним SELECT + сохранение списка страниц в Chapter.pages
+        with self.assertNumQueries(2):
+            response = self.client.get(self._reader_url('2.5'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['prev_chapter'].number, 2)
+        self.assertEqual(response.context['next_chapter'].number, 3)
+        self.assertContains(response, '[{"url":"https://example.com/1.jpg","width":null')
+
+    def test_reader_caches_pages_in_chapter(self):
+        parser = StubParser()
+        parser.aget_pages = mock.AsyncMock(wraps=parser.aget_pages)
+        with mock.patch('manga.views.get_parser', return_value=parser):
+            self.client.get(self._reader_url('3'))
+            with self.assertNumQueries(1):
+                response = self.client.get(self._reader_url('3'))
+
+        parser.aget_pages.assert_awaited_once()
+        chapter = Chapter.objects.get(manga=self.manga, number=3)
+        self.assertEqual((chapter.pages_count, chapter.pages[1]), (2, 'https://example.com/2.jpg'))
+        self.assertEqual(response.context['pages'][0].url, 'https://example.com/1.jpg')
+
+    @mock.patch('manga.views.get_parser', return_value=StubParser())
+    def test_reader_within_budget(self, _):
+        with self.assertWithinBudget('manga:reader'):
+            self.client.get(self._reader_url('1'))
+
+    def test_reader_records_progress_for_logged_in_user(self):
+        user = User.objects.create_user('reader', password='pass')
+        self.client.force_login(user)
+        with mock.patch('manga.views.get_parser', return_value=StubParser()):
+            self.client.get(self._reader_url('2'))
+
+        response = self.client.get(reverse('manga:detail', args=['test']))
+        self.assertEqual(progress.get_pending(user.id, self.manga.id)[1], 2)
+        self.assertEqual(response.context['last_read_number'], 2)
+        self.assertEqual(response.context['chapters_count'], 4)
+        self.assertContains(response, "updateChapterIconsUI('%d', 2.0" % progress.get_pending(user.id, self.manga.id)[0])
+
+    def test_detail_reads_pending_progress_off_the_event_loop(self):
+        # Буфер на db/file-кэше — синхронный ввод-вывод, в цикле событий его звать нельзя
+        user = User.objects.create_user('reader', password='pass')
+        self.client.force_login(user)
+        progress.record(user.id, self.manga.id, self.manga.chapters.get(number=3).id, 3)
+        with mock.patch('manga.views.progress.get_pending', async_unsafe(progress.get_pending)):
+            response = self.client.get(reverse('manga:detail', args=['test']))
+        self.assertEqual(response.context['last_read_number'], 3)
+
+    def test_download_fetches_pages_concurrently(self):
+        parser = StubParser()
+        url = reverse('manga:download_chapter', kwargs={'slug': 'test', 'volume': 1, 'number': '1'})
+        with mock.patch('manga.views.get_parser', return_value=parser):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(response.content))
+        self.assertEqual(archive.read('page_002.jpg'), b'https://example.com/2.jpg')
+        self.assertEqual(parser.max_in_flight, 2)
+
+    def test_download_error_expires_cached_pages(self):
+        parser = StubParser()
+        parser.afetch_image = mock.AsyncMock(side_effect=[b'1', ConnectionError])
+        url = reverse('manga:download_chapter', kwargs={'slug': 'test', 'volume': 1, 'number': '1'})
+        with mock.patch('manga.views.get_parser', return_value=parser):
+            self.client.get(url)
+
+        chapter = Chapter.objects.get(manga=self.manga, number=1)
+        self.assertEqual(chapter.pages_count, 2)
+        self.assertTrue(chapter.pages_stale())
+
+
+class HomeFeedTests(TestCase):
+
+    def _manga(self, slug, numbers):
+        manga = create_manga(slug)
+        ingest.save_chapters(manga, [ChapterRef(number, 1, '', f'{slug}-{number}') for number in numbers])
+        return manga
+
+    def test_first_sync_is_not_a_release(self):
+        manga = self._manga('fresh', [1, 2])
+        manga.refresh_from_db()
+        self.assertIsNone(manga.last_chapter_added_at)
+        self.assertEqual(manga.latest_chapter.number, 2)
+        self.assertFalse(ChapterEvent.objects.exists())
+        self.assertEqual(list(self.client.get(reverse('manga:home')).context['updated_mangas']), [])
+
+    def test_feed_follows_new_chapters_not_saves(self):
+        older = self._manga('older', [1])
+        newer = self._manga('newer', [1])
+        ingest.save_chapters(older, [ChapterRef(2, 1, '', 'older-2')])
+        ingest.save_chapters(newer, [ChapterRef(2, 1, '', 'newer-2')])
+        older.source = 'mangalib'
+        older.save(update_fields=['source'])
+
+        with self.assertNumQueries(2):  # лента + популярное
+            response = self.client.get(reverse('manga:home'))
+            self.assertEqual([m.slug for m in response.context['updated_mangas']], ['newer', 'older'])
+        self.assertContains(response, 'Глава 2 ·')
+
+        # Досинхронизированная старая глава не сдвигает указатель на последнюю
+        ingest.save_chapters(older, [ChapterRef(0.5, 1, '', 'older-0.5'), ChapterRef(3, 1, '', 'older-3')])
+        older.refresh_from_db()
+        self.assertEqual(older.latest_chapter.number, 3)
+        self.assertEqual(ChapterEvent.objects.filter(manga=older).count(), 3)
+        ingest.save_chapters(older, [ChapterRef(0.25, 1, '', 'older-0.25')])
+        older.refresh_from_db()
+        self.assertEqual(older.latest_chapter.number, 3)
+        feed = self.client.get(reverse('manga:home')).context['updated_mangas']
+        self.assertEqual([m.slug for m in feed], ['older', 'newer'])
+        self.assertEqual(newer.chapter_events.count(), 1)
+
+
+class ChapterListCacheTests(TestCase):
+
+    def setUp(self):
+        caches['tiered'].clear()
+        self.addCleanup(caches['tiered'].clear)
+
+    def test_fragment_is_rendered_once_per_chapter_list_version(self):
+        manga = create_manga()
+        ingest.save_chapters(manga, [ChapterRef(number, 1, '', f't-{number}') for number in (1, 2)])
+        url = reverse('manga:detail', args=['t'])
+        self.client.get(url)
+        hits = metrics.cache_requests.value('chapter_list', 'hit')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertFalse([q for q in queries if 'manga_chapter' in q['sql'] and 'SELECT' in q['sql']])
+        self.assertEqual(metrics.cache_requests.value('chapter_list', 'hit'), hits + 1)
+        self.assertEqual(response.context['chapters_count'], 2)
+        self.assertContains(response, 'Глава 2</b>')
+
+        # Новые главы меняют версию фрагмента
+        ingest.save_chapters(manga, [ChapterRef(3, 1, '', 't-3')])
+        response = self.client.get(url)
+        self.assertEqual(response.context['chapters_count'], 3)
+        self.assertContains(response, 'Глава 3</b>')
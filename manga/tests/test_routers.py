@@ -0,0 +1,54 @@
+from django.contrib.sessions.models import Session
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from luanovel.middleware import ReplicaPinMiddleware
+from luanovel.routers import ReplicaRouter, pin_requests, unpinned_writes
+from manga.models import Chapter, Manga
+from users.models import Bookmark, ReadingProgress
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+class ReplicaRouterTests(SimpleTestCase):
+
+    def test_catalog_reads_use_replica_until_write(self):
+        router = ReplicaRouter()
+        with pin_requests():
+            self.assertEqual(router.db_for_read(Manga), 'replica_0')
+            self.assertEqual(router.db_for_read(Bookmark), 'default')
+            self.assertEqual(router.db_for_write(Chapter), 'default')
+            self.assertEqual(router.db_for_read(Manga), 'default')
+        self.assertFalse(router.allow_migrate('replica_0', 'manga'))
+
+    @override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1', 'replica_2'])
+    def test_non_catalog_writes_keep_one_replica(self):
+        router = ReplicaRouter()
+        with pin_requests():
+            replica = router.db_for_read(Manga)
+            router.db_for_write(Session)
+            router.db_for_write(ReadingProgress)
+            with unpinned_writes():
+                router.db_for_write(Manga)
+            self.assertEqual({router.db_for_read(Chapter) for _ in range(20)}, {replica})
+
+    def test_client_reads_primary_after_write(self):
+        router = ReplicaRouter()
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(Manga))
+            router.db_for_write(Bookmark)
+            if request.method == 'POST':
+                router.db_for_write(Chapter)
+            return HttpResponse()
+
+        middleware = ReplicaPinMiddleware(view)
+        factory = RequestFactory()
+        self.assertNotIn('db_primary', middleware(factory.get('/')).cookies)
+        response = middleware(factory.post('/'))
+        self.assertEqual(response.cookies['db_primary']['max-age'], 10)
+
+        request = factory.get('/')
+        request.COOKIES['db_primary'] = '1'
+        middleware(request)
+        self.assertEqual(seen, ['replica_0', 'replica_0', 'default'])
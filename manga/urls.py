@@ -5,9 +5,11 @@ app_name = 'manga'
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('sw.js', views.service_worker, name='service_worker'),
     
     path('search/', views.search, name='search'),
     path('api/search/', views.api_search, name='api_search'),
+    path('covers/<slug:slug>/', views.cover_image, name='cover'),
     
     path('manga/<str:source>/<slug:slug>/', views.manga_detail, name='detail_with_source'),
     path('manga/<slug:slug>/', views.manga_detail, name='detail'),
@@ -17,6 +19,11 @@ urlpatterns = [
     path('manga/<slug:slug>/v<int:volume>/c<str:number>/', 
          views.chapter_reader, name='reader'),
     
+    path('manga/<slug:slug>/v<int:volume>/c<str:number>/p<int:index>/',
+         views.page_image, name='page_image'),
+    path('manga/<slug:slug>/v<int:volume>/c<str:number>/p<int:index>/t<int:tile>/',
+         views.page_tile, name='page_tile'),
+
     path('manga/<str:source>/<slug:slug>/v<int:volume>/c<str:number>/download/', 
          views.download_chapter_zip, name='download_chapter_with_source'),
     path('manga/<slug:slug>/v<int:volume>/c<str:number>/download/', 
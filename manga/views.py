@@ -1,14 +1,26 @@
 # manga/views.py
-from django.shortcuts import render, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.dispatch import receiver
+from django.shortcuts import render, aget_object_or_404, get_object_or_404
+from django.template.defaultfilters import floatformat
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
 from django.http import Http404, HttpResponse, JsonResponse
-from manga.models import Manga, Chapter, Genre
-from parser.parsers import get_parser, PARSERS
-from django.utils.text import slugify
-from django.db import transaction
+from manga.models import Manga, Chapter
+from parser.parsers import get_parser, PARSERS, PageRef
+from parser.parsers.records import RecordJsonResponse, json_script
 from users.models import ReadingProgress, Bookmark
+from users import progress
+from manga import counters, images, ingest
+from manga.manifest import reader_pages
+from luanovel.cache import aget_or_compute
+import asyncio
+import hashlib
 import io
 import zipfile
-import requests
 import logging
 
 logger = logging.getLogger(__name__)
@@ -28,51 +40,163 @@ def get_source_from_url(url: str) -> str:
     return 'senkuro'
 
 
-def get_manga_source(slug: str) -> str:
+async def aget_manga_source(slug: str) -> str:
     """Определяет источник манги"""
 
-    manga = Manga.objects.filter(slug=slug).first()
+    manga = await Manga.objects.filter(slug=slug).afirst()
     if manga:
         if manga.source:
             return manga.source
-        
+
         if manga.original_url:
             detected = get_source_from_url(manga.original_url)
             manga.source = detected
-            manga.save(update_fields=['source'])
+            await manga.asave(update_fields=['source'])
             return detected
-    
+
     for source_key in ['senkuro', 'mangalib']:
         parser = get_parser(source_key)
         if parser:
             try:
-                details = parser.get_manga_details(slug)
-                if details:
+                # Только проверка существования — самый лёгкий профиль
+                if await parser.acheck_for_updates(slug):
                     return source_key
             except Exception:
                 continue
-    
+
     return 'senkuro'
 
 
+async def _aresolve_source(manga, slug: str) -> str:
+    """Источник сохранённой манги; определяется и запоминается при первом обращении"""
+    if manga.source:
+        return manga.source
+
+    if manga.original_url:
+        source = get_source_from_url(manga.original_url)
+    else:
+        source = await aget_manga_source(slug)
+    manga.source = source
+    await manga.asave(update_fields=['source'])
+    return source
+
+
+async def _auser(request):
+    """
+    Пользователь запроса для async-вьюх. Кладётся в request.user, чтобы
+    шаблоны (контекст-процессор auth) не лезли в сессию синхронно из event loop.
+    """
+    user = await request.auser()
+    request.user = user
+    return user
+
+
+def _pages_kwargs(source: str, slug: str, volume, number, chapter) -> dict:
+    """Аргументы parser.get_pages для источника"""
+    if source == 'senkuro':
+        return {'chapter_slug': chapter.url}
+    if source == 'mangalib':
+        return {
+            'manga_slug': slug,
+            'volume': volume,
+            'number': str(number)
+        }
+    return {
+        'manga_slug': slug,
+        'volume': volume,
+        'number': str(number),
+        'chapter_slug': chapter.url
+    }
+
+
+async def _aload_pages(parser, source, slug, volume, number, chapter) -> list:
+    """
+    Страницы главы: из кэша Chapter.pages, а если он устарел (Chapter.pages_stale) —
+    у источника (и сохраняются в главу). Если источник недоступен, отдаётся
+    устаревший кэш: он скорее всего ещё рабочий.
+    """
+    if not chapter.pages_stale():
+        return [PageRef(url) for url in chapter.pages]
+
+    try:
+        pages = await parser.aget_pages(**_pages_kwargs(source, slug, volume, number, chapter))
+    except Exception as e:
+        if not chapter.pages:
+            raise
+        logger.warning(f"Не удалось обновить страницы главы {chapter.pk}, отдаём сохранённые: {e}")
+        return [PageRef(url) for url in chapter.pages]
+    if not pages:
+        return [PageRef(url) for url in chapter.pages]
+
+    urls = [page.url for page in pages]
+    fields = {}
+    if urls != chapter.pages:
+        # Размеры прежних страниц к новому списку не относятся.
+        # page_meta пишется только здесь: у главы из .only() поле может быть отложено
+        chapter.page_meta = fields['page_meta'] = []
+    chapter.pages = urls
+    chapter.pages_count = len(pages)
+    chapter.pages_fetched_at = timezone.now()
+    await Chapter.objects.filter(pk=chapter.pk).aupdate(
+        pages=chapter.pages, pages_count=chapter.pages_count,
+        pages_fetched_at=chapter.pages_fetched_at, **fields,
+    )
+    return pages
+
+
+async def _aexpire_pages(chapter):
+    """Сбрасывает кэш страниц главы после ошибки загрузки: при следующем открытии — заново у источника"""
+    chapter.pages_fetched_at = None
+    await Chapter.objects.filter(pk=chapter.pk).aupdate(pages_fetched_at=None)
+
+
+def _count_read(user, manga, chapter):
+    """Просмотр и прогресс чтения (буферы могут сброситься в БД — вызывать через sync_to_async)"""
+    counters.incr(manga.id, 'views_count')
+    if user.is_authenticated:
+        progress.record(user.id, manga.id, chapter.id, chapter.number)
+
+
 def home(request):
     """Главная страница"""
-    updated_mangas = Manga.objects.all().order_by('-updated_at')[:20]
+    # Лента по новым главам: одна выборка по индексу вместе с последней главой
+    updated_mangas = Manga.objects.filter(last_chapter_added_at__isnull=False)\
+        .select_related('latest_chapter')\
+        .only('slug', 'title', 'cover_url', 'last_chapter_added_at',
+              'latest_chapter__number', 'latest_chapter__volume')\
+        .order_by('-last_chapter_added_at')[:20]
+    popular_mangas = Manga.objects.filter(views_count__gt=0)\
+        .order_by('-views_count', '-bookmarks_count')[:20]
     
     user_history = []
     if request.user.is_authenticated:
+        # История должна видеть ещё не сброшенный прогресс пользователя
+        if progress.has_pending(request.user.id):
+            progress.flush(user_id=request.user.id)
         user_history = ReadingProgress.objects.filter(user=request.user)\
             .select_related('manga')\
             .order_by('-updated_at')[:10]
     
     return render(request, 'manga/home.html', {
         'updated_mangas': updated_mangas,
+        'popular_mangas': popular_mangas,
         'user_history': user_history,
+        'image_tier': images.image_tier(request),
     })
 
 
-def search(request):
-    """Поиск по всем сайтам"""
+async def _acached_search(source, parser, query, limit=10):
+    """Результаты поиска источника через кэш; пустой ответ (часто — сбой источника) не кэшируется"""
+    key = f"search:{source}:{limit}:{hashlib.md5(query.lower().encode()).hexdigest()}"
+    return await aget_or_compute(
+        key, lambda: parser.asearch(query, limit=limit),
+        timeout=settings.SEARCH_CACHE_TIMEOUT, should_cache=bool, metric='search',
+    )
+
+
+async def search(request):
+    """Поиск по всем сайтам (источники опрашиваются параллельно)"""
+    await _auser(request)
     query = request.GET.get('q', '').strip()
     source = request.GET.get('source', 'all')
     
@@ -83,33 +207,32 @@ def search(request):
             'sources': list(PARSERS.keys())
         })
     
-    search_results = []
-    
     if source != 'all' and source in PARSERS:
         parsers_to_search = {source: PARSERS[source]}
     else:
         parsers_to_search = PARSERS
     
-    for source_key, parser_class in parsers_to_search.items():
-        parser = parser_class()
+    async def search_source(source_key, parser_class):
         try:
-            mangas = parser.search(query, limit=10)
-            for manga in mangas:
-                manga['source'] = source_key
-            
-            search_results.append({
+            mangas = await _acached_search(source_key, parser_class(), query)
+            return {
                 'source_key': source_key,
                 'source_name': source_key.capitalize(),
                 'mangas': mangas
-            })
+            }
         except Exception as e:
             logger.error(f"Search error in {source_key}: {e}")
-            search_results.append({
+            return {
                 'source_key': source_key,
                 'source_name': source_key.capitalize(),
                 'mangas': [],
                 'error': str(e)
-            })
+            }
+    
+    search_results = await asyncio.gather(*(
+        search_source(source_key, parser_class)
+        for source_key, parser_class in parsers_to_search.items()
+    ))
     
     return render(request, 'manga/search.html', {
         'query': query,
@@ -119,7 +242,7 @@ def search(request):
     })
 
 
-def api_search(request):
+async def api_search(request):
     """API для live поиска"""
     query = request.GET.get('q', '').strip()
     source = request.GET.get('source', 'senkuro')
@@ -131,10 +254,8 @@ def api_search(request):
     
     if parser:
         try:
-            results = parser.search(query, limit=10)
-            for result in results:
-                result['source'] = source
-            return JsonResponse({'results': results})
+            results = await _acached_search(source, parser, query)
+            return RecordJsonResponse({'results': results})
         except Exception as e:
             logger.error(f"API search error in {source}: {e}")
             return JsonResponse({'results': [], 'error': str(e)})
@@ -142,72 +263,67 @@ def api_search(request):
     return JsonResponse({'results': []})
 
 
-def manga_detail(request, slug, source=None):
+async def manga_detail(request, slug, source=None):
     """Страница деталей манги"""
-    manga = Manga.objects.filter(slug=slug).first()
+    user = await _auser(request)
+    manga = await Manga.objects.filter(slug=slug).afirst()
     
     current_status = None
     last_read_chapter_id = None
+    last_read_number = 0
 
     if manga:
-
         if not source:
-            if manga.source:
-                source = manga.source
-            elif manga.original_url:
-                source = get_source_from_url(manga.original_url)
-                manga.source = source
-                manga.save(update_fields=['source'])
-            else:
-                source = get_manga_source(slug)
-                manga.source = source
-                manga.save(update_fields=['source'])
-
+            source = await _aresolve_source(manga, slug)
         elif manga.source != source:
             manga.source = source
-            manga.save(update_fields=['source'])
+            await manga.asave(update_fields=['source'])
     else:
-
         if not source:
-            source = get_manga_source(slug)
+            source = await aget_manga_source(slug)
         
-        manga = _fetch_and_save_manga(slug, source)
+        manga = await _afetch_and_save_manga(slug, source)
     
     if not manga:
         raise Http404("Манга не найдена")
     
+    await sync_to_async(counters.incr)(manga.id, 'views_count')
 
     if not source:
         source = manga.source if manga.source else 'senkuro'
 
-
-    if request.user.is_authenticated:
-        bookmark = Bookmark.objects.filter(user=request.user, manga=manga).first()
+    if user.is_authenticated:
+        bookmark = await Bookmark.objects.filter(user=user, manga=manga).afirst()
         if bookmark:
             current_status = bookmark.status
         
-        progress = ReadingProgress.objects.filter(
-            user=request.user, 
-            manga=manga
-        ).select_related('last_chapter').first()
-        
-        if progress and progress.last_chapter:
-            last_read_chapter_id = progress.last_chapter.id
-            last_read_number = progress.last_chapter.number
+        pending = await sync_to_async(progress.get_pending)(user.id, manga.id)
+        if pending:
+            last_read_chapter_id, last_read_number = pending
         else:
-            last_read_number = 0
-    else:
-        last_read_number = 0
-        
-    chapters = manga.chapters.all().order_by('number')
+            reading = await ReadingProgress.objects.filter(
+                user=user, 
+                manga=manga
+            ).select_related('last_chapter').afirst()
+            
+            if reading and reading.last_chapter:
+                last_read_chapter_id = reading.last_chapter.id
+                last_read_number = reading.last_chapter.number
+    
+    chapters_html, chapters_count = await _achapter_list(manga)
     
-    if not chapters.exists():
-        _fetch_and_save_chapters(manga, slug, source)
-        chapters = manga.chapters.all().order_by('number')
+    if not chapters_count:
+        await _afetch_and_save_chapters(manga, slug, source)
+        chapters_html, chapters_count = await _achapter_list(manga)
+    
+    genres = [genre async for genre in manga.genres.all()]
     
     return render(request, 'manga/detail.html', {
         'manga': manga,
-        'chapters': chapters,
+        'genres': genres,
+        'chapters_html': chapters_html,
+        'chapters_count': chapters_count,
+        'image_tier': await sync_to_async(images.image_tier)(request, user),
         'current_status': current_status,
         'last_read_chapter_id': last_read_chapter_id,
         'last_read_number': last_read_number,
@@ -215,15 +331,73 @@ def manga_detail(request, slug, source=None):
     })
 
 
-def chapter_reader(request, slug, volume, number, source=None):
+def _chapters_version(manga) -> str:
+    """Версия списка глав по полям манги, которые ingest меняет вместе с главами"""
+    parts = (manga.slug, manga.chapters_hash, manga.total_chapters, manga.last_chapter_added_at)
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def _chapter_list_key(manga_id) -> str:
+    return f"chapter_list:{manga_id}"
+
+
+@receiver(ingest.catalog_changed)
+def _catalog_changed(sender, manga, part, **kwargs):
+    """Новые главы: фрагмент списка глав удаляется из общего кэша сразу, а не по сроку"""
+    if part == 'chapters':
+        caches['tiered'].delete(_chapter_list_key(manga.pk))
+
+
+async def _achapter_list(manga):
+    """
+    Отрендеренный список глав и их число. Фрагмент одинаков для всех
+    посетителей: он хранится в общем кэше, и при попадании главы из БД не
+    читаются вовсе. Удаляется по ingest.catalog_changed; версия списка глав
+    внутри значения страхует от изменений в обход ingest и от локальной
+    копии другого воркера, ещё не заметившей удаления.
+    """
+    version = _chapters_version(manga)
+
+    async def render_list():
+        # Шаблон рендерится в event loop — главы достаём заранее
+        chapters = [chapter async for chapter in manga.chapters.order_by('number').defer('pages')]
+        html = render_to_string('manga/chapter_list.html', {'manga': manga, 'chapters': chapters})
+        return version, html, len(chapters)
+
+    def cached():
+        return aget_or_compute(
+            _chapter_list_key(manga.pk), render_list,
+            timeout=settings.CHAPTER_LIST_CACHE_TIMEOUT, should_cache=lambda result: result[2] > 0,
+            metric='chapter_list',
+        )
+
+    cached_version, html, count = await cached()
+    if cached_version != version:
+        await caches['tiered'].adelete(_chapter_list_key(manga.pk))
+        cached_version, html, count = await cached()
+    return html, count
+
+
+def _manifest_url(slug, chapter):
+    if chapter is None:
+        return None
+    return reverse('api:chapter-manifest', kwargs={
+        'version': 'v1', 'slug': slug, 'number': floatformat(chapter.number, -1),
+    })
+
+
+async def chapter_reader(request, slug, volume, number, source=None):
     """Читалка главы"""
+    user = await _auser(request)
     try:
         num_float = float(number)
     except ValueError:
         raise Http404("Неверный формат номера главы")
 
-    chapter = get_object_or_404(
-        Chapter.objects.select_related('manga'), 
+    # Текущая глава и соседи одним запросом (ссылки проставляются при синхронизации)
+    chapter = await aget_object_or_404(
+        Chapter.objects.select_related('manga', 'prev_chapter', 'next_chapter')
+        .defer('prev_chapter__pages', 'next_chapter__pages', 'prev_chapter__page_meta', 'next_chapter__page_meta'),
         manga__slug=slug, 
         volume=volume, 
         number=num_float
@@ -231,80 +405,82 @@ def chapter_reader(request, slug, volume, number, source=None):
     
     manga = chapter.manga
     
-
     if not source:
-        if manga.source:
-            source = manga.source
-        elif manga.original_url:
-            source = get_source_from_url(manga.original_url)
-            manga.source = source
-            manga.save(update_fields=['source'])
-        else:
-            source = get_manga_source(slug)
-            manga.source = source
-            manga.save(update_fields=['source'])
+        source = await _aresolve_source(manga, slug)
     
     parser = get_parser(source)
     if not parser:
         raise Http404(f"Парсер '{source}' не найден")
     
-
-    if source == 'senkuro':
-        parser_kwargs = {'chapter_slug': chapter.url}
-    elif source == 'mangalib':
-        parser_kwargs = {
-            'manga_slug': slug,
-            'volume': volume,
-            'number': str(number)
-        }
-    else:
-        parser_kwargs = {
-            'manga_slug': slug,
-            'volume': volume,
-            'number': str(number),
-            'chapter_slug': chapter.url
-        }
-    
     try:
-        pages = parser.get_pages(**parser_kwargs)
+        pages = await _aload_pages(parser, source, slug, volume, number, chapter)
     except Exception as e:
         logger.error(f"Error loading pages: {e}")
         pages = []
     
+    await sync_to_async(_count_read)(user, manga, chapter)
 
-    if request.user.is_authenticated:
-        ReadingProgress.objects.update_or_create(
-            user=request.user,
-            manga=manga,
-            defaults={'last_chapter': chapter}
-        )
-    
+    tier = await sync_to_async(images.image_tier)(request, user)
+    entries = reader_pages(chapter, slug, tier) if chapter.pages else [{'url': page.url} for page in pages]
 
-    prev_chapter = Chapter.objects.filter(
-        manga=manga, 
-        number__lt=chapter.number
-    ).order_by('-number').first()
-    
-    next_chapter = Chapter.objects.filter(
-        manga=manga, 
-        number__gt=chapter.number
-    ).order_by('number').first()
-    
     return render(request, 'manga/reader.html', {
         'chapter': chapter,
         'manga': manga,
         'pages': pages,
-        'prev_chapter': prev_chapter,
-        'next_chapter': next_chapter,
+        'pages_json': json_script(entries, 'pages-json'),
+        'prev_chapter': chapter.prev_chapter,
+        'next_chapter': chapter.next_chapter,
+        'next_manifest_url': _manifest_url(slug, chapter.next_chapter),
+        'precache_chapters': settings.OFFLINE_PRECACHE_CHAPTERS,
         'source': source,
     })
 
 
-def download_chapter_zip(request, slug, volume, number, source=None):
-    """Скачивает все страницы главы и отдаёт ZIP-архив"""
+def _page(slug, volume, number, index):
+    """(адрес страницы на CDN источника, источник) по адресу читалки"""
+    try:
+        num_float = float(number)
+    except ValueError:
+        raise Http404("Неверный формат номера главы")
+    chapter = get_object_or_404(
+        Chapter.objects.select_related('manga').only('pages', 'manga__source'),
+        manga__slug=slug, volume=volume, number=num_float,
+    )
+    if index >= len(chapter.pages):
+        raise Http404("Страница не найдена")
+    return chapter.pages[index], chapter.manga.source
+
+
+def page_image(request, slug, volume, number, index):
+    """Страница главы в облегчённом варианте (manga/images.py)"""
+    return images.serve(request, *_page(slug, volume, number, index))
+
+
+def page_tile(request, slug, volume, number, index, tile):
+    """Кусок длинной страницы главы (manga/images.py)"""
+    return images.serve_tile(request, *_page(slug, volume, number, index), tile)
+
+
+def cover_image(request, slug):
+    """Обложка тайтла в облегчённом варианте (manga/images.py)"""
+    manga = get_object_or_404(Manga.objects.only('cover_url', 'source'), slug=slug)
+    return images.serve(request, manga.cover_url, manga.source)
+
+
+def service_worker(request):
+    """Service worker читалки (шаблон manga/sw.js); с корня сайта — чтобы его область покрывала все страницы"""
+    script = render_to_string('manga/sw.js', {'max_chapters': settings.OFFLINE_MAX_CHAPTERS})
+    response = HttpResponse(script, content_type='application/javascript')
+    # Браузер сверяет воркер при каждой навигации; старую версию держать нельзя
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+async def download_chapter_zip(request, slug, volume, number, source=None):
+    """Скачивает все страницы главы (параллельно, с ограничением) и отдаёт ZIP-архив"""
     
     if not source:
-        source = get_manga_source(slug)
+        source = await aget_manga_source(slug)
     
     parser = get_parser(source)
     if not parser:
@@ -315,45 +491,40 @@ def download_chapter_zip(request, slug, volume, number, source=None):
     except ValueError:
         return HttpResponse("Неверный формат номера главы", status=400)
     
-    chapter = get_object_or_404(
+    chapter = await aget_object_or_404(
         Chapter, 
         manga__slug=slug, 
         volume=volume, 
         number=num_float
     )
     
-    if source == 'senkuro':
-        parser_kwargs = {'chapter_slug': chapter.url}
-    elif source == 'mangalib':
-        parser_kwargs = {
-            'manga_slug': slug,
-            'volume': volume,
-            'number': str(number)
-        }
-    else:
-        parser_kwargs = {
-            'manga_slug': slug,
-            'volume': volume,
-            'number': str(number),
-            'chapter_slug': chapter.url
-        }
-    
-    pages = parser.get_pages(**parser_kwargs)
+    pages = await _aload_pages(parser, source, slug, volume, number, chapter)
     
     if not pages:
         return HttpResponse("Не удалось получить страницы главы", status=404)
 
-    buffer = io.BytesIO()
-    with zipfile.ZipFile(buffer, 'w') as zip_file:
-        for i, page_url in enumerate(pages, 1):
+    semaphore = asyncio.Semaphore(getattr(settings, 'DOWNLOAD_CONCURRENCY', 6))
+
+    async def fetch(page):
+        async with semaphore:
             try:
-                response = requests.get(page_url, timeout=10)
-                if response.status_code == 200:
-                    ext = page_url.split('.')[-1].split('?')[0] or 'jpg'
-                    filename = f"page_{i:03d}.{ext}"
-                    zip_file.writestr(filename, response.content)
+                return await parser.afetch_image(page.url)
             except Exception as e:
-                logger.error(f"Error downloading page {page_url}: {e}")
+                logger.error(f"Error downloading page {page.url}: {e}")
+                return None
+
+    contents = await asyncio.gather(*(fetch(page) for page in pages))
+    if None in contents:
+        await _aexpire_pages(chapter)
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zip_file:
+        for i, (page, content) in enumerate(zip(pages, contents), 1):
+            if content is None:
+                continue
+            ext = page.url.split('.')[-1].split('?')[0] or 'jpg'
+            filename = f"page_{i:03d}.{ext}"
+            zip_file.writestr(filename, content)
 
     buffer.seek(0)
     response = HttpResponse(buffer.getvalue(), content_type='application/zip')
@@ -361,7 +532,7 @@ def download_chapter_zip(request, slug, volume, number, source=None):
     return response
 
 
-def _fetch_and_save_manga(slug: str, source: str = 'senkuro'):
+async def _afetch_and_save_manga(slug: str, source: str = 'senkuro'):
     """Парсит мангу и сохраняет в БД"""
     parser = get_parser(source)
     
@@ -369,46 +540,19 @@ def _fetch_and_save_manga(slug: str, source: str = 'senkuro'):
         return None
     
     try:
-        details = parser.get_manga_details(slug)
+        details = await parser.aget_manga_details(slug)
         
         if not details:
             return None
         
-        with transaction.atomic():
-            manga_data = {
-                'title': details['title'],
-                'slug': slug,
-                'description': details.get('description', ''),
-                'cover_url': details.get('cover_url', ''),
-                'original_url': details.get('original_url', ''),
-                'author': details.get('author', ''),
-                'artist': details.get('artist', ''),
-                'year': details.get('year'),
-                'total_chapters': details.get('total_chapters', 0),
-                'source': source,
-            }
-            
-            manga = Manga.objects.create(**manga_data)
-            
-            if details.get('genres'):
-                for genre_name in details['genres']:
-                    genre, _ = Genre.objects.get_or_create(
-                        name=genre_name,
-                        defaults={
-                            'slug': slugify(genre_name, allow_unicode=True) 
-                                   or f"genre-{genre_name[:10]}"
-                        }
-                    )
-                    manga.genres.add(genre)
-        
-        return manga
+        return await sync_to_async(ingest.save_manga)(slug, source, details)
         
     except Exception as e:
         logger.error(f"Error fetching manga {slug}: {e}")
         return None
 
 
-def _fetch_and_save_chapters(manga, slug: str, source: str = 'senkuro'):
+async def _afetch_and_save_chapters(manga, slug: str, source: str = 'senkuro'):
     """Загружает главы с сайта и сохраняет в БД"""
     parser = get_parser(source)
     
@@ -416,28 +560,9 @@ def _fetch_and_save_chapters(manga, slug: str, source: str = 'senkuro'):
         return
     
     try:
-        chapters_data = parser.get_chapters(slug)
-        
-        if not chapters_data:
-            return
-        
-        with transaction.atomic():
-            created_count = 0
-            for chapter_data in chapters_data:
-                chapter, created = Chapter.objects.get_or_create(
-                    manga=manga,
-                    number=chapter_data['number'],
-                    defaults={
-                        'title': chapter_data.get('title') or '', 
-                        'url': chapter_data.get('url') or '',
-                        'volume': chapter_data.get('volume', 1),
-                    }
-                )
-                if created:
-                    created_count += 1
-            
-            manga.total_chapters = manga.chapters.count()
-            manga.save(update_fields=['total_chapters'])
+        # Главы разбираются потоково и сразу пишутся пачками; HTTP и запись
+        # идут в потоке синхронной части запроса
+        await sync_to_async(ingest.save_chapters)(manga, parser.iter_chapters(slug))
         
     except Exception as e:
-        logger.error(f"Error fetching chapters for {slug}: {e}")
\ No newline at end of file
+        logger.error(f"Error fetching chapters for {slug}: {e}")
@@ -3,6 +3,7 @@
 from .base import BaseParser
 from .mangalib import MangaLibParser
 from .senkuro import SenkuroParser
+from .records import SearchHit, MangaDetails, ChapterRef, PageRef, ImageInfo
 
 PARSERS = {
     'mangalib': MangaLibParser,
@@ -16,4 +17,7 @@ def get_parser(source_key: str) -> BaseParser:
         return parser_class()
     return None
 
-__all__ = ['BaseParser', 'MangaLibParser', 'PARSERS', 'get_parser']
\ No newline at end of file
+__all__ = [
+    'BaseParser', 'MangaLibParser', 'PARSERS', 'get_parser',
+    'SearchHit', 'MangaDetails', 'ChapterRef', 'PageRef', 'ImageInfo',
+]
\ No newline at end of file
@@ -1,24 +1,208 @@
 #base.py
+import asyncio
+import time
 from abc import ABC, abstractmethod
 
+import requests
+from django.dispatch import Signal
+
+from .imagesize import image_size
+from .records import ImageInfo, MangaDetails
+from .transport import get_transport
+
+# Отправляется после каждого HTTP-запроса парсера к внешнему API.
+# Аргументы: source, operation, duration (сек), error (исключение или None), size (байт)
+upstream_request = Signal()
+
+# Профили полей: запрашивать у API только то, что нужно вызывающему коду
+PROFILE_SEARCH_CARD = 'search-card'      # карточка поиска: название, обложка, тип
+PROFILE_DETAIL_INGEST = 'detail-ingest'  # всё, что сохраняется в Manga/Genre
+PROFILE_REFRESH_CHECK = 'refresh-check'  # только признаки изменений (число глав)
+PROFILE_FULL = 'full'                    # прежний полный набор (отладка, замеры)
+
+PROFILES = (PROFILE_SEARCH_CARD, PROFILE_DETAIL_INGEST, PROFILE_REFRESH_CHECK, PROFILE_FULL)
+
+
 class BaseParser(ABC):
     """Базовый класс для всех парсеров"""
+
+    source = None
     
     @abstractmethod
-    def search(self, query: str, limit: int = 20) -> list:
-        """Поиск манги по запросу"""
+    def search(self, query: str, limit: int = 20, profile: str = PROFILE_SEARCH_CARD) -> list:
+        """Поиск манги по запросу (список records.SearchHit)"""
         pass
     
     @abstractmethod
-    def get_manga_details(self, slug: str) -> dict:
+    def get_manga_details(self, slug: str, profile: str = PROFILE_DETAIL_INGEST) -> MangaDetails:
         """Получить детали манги"""
         pass
     
     @abstractmethod
     def get_chapters(self, slug: str) -> list:
-        """Получить список глав"""
+        """Получить список глав (records.ChapterRef)"""
         pass
+
+    def iter_chapters(self, slug: str):
+        """
+        Главы по мере разбора ответа (для записи пачками без списка всех глав).
+        В отличие от get_chapters ошибки не глотаются.
+        """
+        yield from self.get_chapters(slug)
     @abstractmethod
     def get_pages(self, **kwargs) -> list:
-        """Получить список страниц. Принимает аргументы через kwargs для гибкости."""
-        pass
\ No newline at end of file
+        """Получить список страниц (records.PageRef). Принимает аргументы через kwargs для гибкости."""
+        pass
+
+    def get_catalog_page(self, cursor=None):
+        """
+        Страница каталога источника (для import_catalog).
+
+        Args:
+            cursor: Курсор из предыдущего вызова (None — первая страница)
+
+        Returns:
+            tuple: (список records.SearchHit, курсор следующей страницы или None)
+        """
+        raise NotImplementedError(f"{self.source}: обход каталога не поддерживается")
+
+    @classmethod
+    def supports_catalog(cls) -> bool:
+        """Можно ли обойти каталог источника (get_catalog_page) при текущих настройках"""
+        return cls.get_catalog_page is not BaseParser.get_catalog_page
+
+    def check_for_updates(self, slug: str):
+        """
+        Дешёвая проверка изменений (профиль refresh-check).
+
+        Returns:
+            dict: {'total_chapters': int} или None, если манга не найдена
+        """
+        return self._updates(self.get_manga_details(slug, profile=PROFILE_REFRESH_CHECK))
+
+    @staticmethod
+    def _updates(details):
+        if not details:
+            return None
+        return {'total_chapters': details.total_chapters or 0}
+
+    # Асинхронный API для async-вьюх. По умолчанию синхронный метод выполняется
+    # в потоке; парсеры переопределяют их поверх _arequest.
+
+    async def asearch(self, query: str, limit: int = 20, profile: str = PROFILE_SEARCH_CARD) -> list:
+        return await asyncio.to_thread(self.search, query, limit, profile)
+
+    async def aget_manga_details(self, slug: str, profile: str = PROFILE_DETAIL_INGEST) -> MangaDetails:
+        return await asyncio.to_thread(self.get_manga_details, slug, profile)
+
+    async def acheck_for_updates(self, slug: str):
+        return self._updates(await self.aget_manga_details(slug, profile=PROFILE_REFRESH_CHECK))
+
+    async def aget_chapters(self, slug: str) -> list:
+        return await asyncio.to_thread(self.get_chapters, slug)
+
+    async def aget_pages(self, **kwargs) -> list:
+        return await asyncio.to_thread(self.get_pages, **kwargs)
+
+    def fetch_image(self, url: str, timeout: int = 10) -> bytes:
+        """Скачивает изображение страницы"""
+        return self._request('GET', url, operation='image', timeout=timeout).content
+
+    async def afetch_image(self, url: str, timeout: int = 10) -> bytes:
+        response = await self._arequest('GET', url, operation='image', timeout=timeout)
+        return response.content
+
+    def probe_image(self, url: str, head_bytes: int = 16384, timeout: int = 10) -> ImageInfo:
+        """
+        Размеры и объём страницы по первым байтам файла: Range-запрос, тело целиком
+        не качается. Если размеров в них нет (JPEG с большим EXIF) — ещё одна
+        попытка с диапазоном в 8 раз больше.
+        """
+        info = ImageInfo()
+        for limit in (head_bytes, head_bytes * 8):
+            response = self._request(
+                'GET', url, operation='image-probe', timeout=timeout, stream=True,
+                headers={'Range': f'bytes=0-{limit - 1}'},
+            )
+            try:
+                head = b''
+                # Сервер без поддержки Range отдаёт файл целиком: читаем только начало
+                for chunk in response.iter_content(chunk_size=limit):
+                    head += chunk
+                    if len(head) >= limit:
+                        break
+            finally:
+                response.close()
+
+            total = response.headers.get('Content-Range', '').rpartition('/')[2]
+            if total.isdigit():
+                info.size = int(total)
+            elif response.status_code == 200 and response.headers.get('Content-Length', '').isdigit():
+                info.size = int(response.headers['Content-Length'])
+            info.etag = response.headers.get('ETag') or None
+
+            size = image_size(head)
+            if size is not None:
+                info.width, info.height = size
+                break
+            if len(head) < limit or (info.size is not None and info.size <= len(head)):
+                break  # файл прочитан целиком — больше данных нет
+        return info
+
+    def _request(self, method: str, url: str, operation: str = '', **kwargs) -> requests.Response:
+        """
+        HTTP-запрос к внешнему API. Все сетевые вызовы парсеров идут через него,
+        чтобы их можно было считать и замерять (сигнал upstream_request),
+        записывать и воспроизводить (transport.py).
+
+        Raises:
+            requests.exceptions.RequestException: При ошибке запроса или HTTP-статусе >= 400
+        """
+        started = time.perf_counter()
+        response = None
+        error = None
+        try:
+            response = get_transport().send(
+                method, url, source=self.source, operation=operation, **kwargs
+            )
+            response.raise_for_status()
+            return response
+        except requests.exceptions.RequestException as e:
+            error = e
+            raise
+        finally:
+            self._report(operation, started, error, response, streamed=kwargs.get('stream', False))
+
+    async def _arequest(self, method: str, url: str, operation: str = '', **kwargs) -> requests.Response:
+        """Асинхронный вариант _request (transport.asend)"""
+        started = time.perf_counter()
+        response = None
+        error = None
+        try:
+            response = await get_transport().asend(
+                method, url, source=self.source, operation=operation, **kwargs
+            )
+            response.raise_for_status()
+            return response
+        except requests.exceptions.RequestException as e:
+            error = e
+            raise
+        finally:
+            self._report(operation, started, error, response)
+
+    def _report(self, operation, started, error, response, streamed=False):
+        if response is None:
+            size = 0
+        elif streamed:
+            # Тело ещё не прочитано: размер по заголовку
+            size = int(response.headers.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        upstream_request.send(
+            sender=self.__class__,
+            source=self.source,
+            operation=operation,
+            duration=time.perf_counter() - started,
+            error=error,
+            size=size,
+        )
@@ -0,0 +1,71 @@
+#imagesize.py
+"""
+Размеры картинки по первым байтам файла (без Pillow и без загрузки целиком):
+JPEG, PNG, GIF, WebP и AVIF. Для JPEG размеры лежат в маркере SOF после
+EXIF и прочих сегментов — обычно в первых килобайтах, но не всегда.
+"""
+import struct
+
+# Маркеры SOF (кроме DHT/JPG/DAC, у которых те же номера рядом)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg(head: bytes):
+    offset = 2
+    while offset + 9 <= len(head):
+        if head[offset] != 0xFF:
+            return None
+        marker = head[offset + 1]
+        if marker == 0xFF:  # заполнитель
+            offset += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # маркеры без длины
+            offset += 2
+            continue
+        length = struct.unpack('>H', head[offset + 2:offset + 4])[0]
+        if marker in _JPEG_SOF:
+            height, width = struct.unpack('>HH', head[offset + 5:offset + 9])
+            return width, height
+        offset += 2 + length
+    return None
+
+
+def _webp(head: bytes):
+    chunk = head[12:16]
+    if chunk == b'VP8 ' and len(head) >= 30:
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and len(head) >= 25:
+        bits = int.from_bytes(head[21:25], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X' and len(head) >= 30:
+        return int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1
+    return None
+
+
+def _avif(head: bytes):
+    # Свойство ispe (image spatial extents) основного изображения в meta/iprp
+    offset = head.find(b'ispe')
+    if offset < 0 or offset + 16 > len(head):
+        return None
+    width, height = struct.unpack('>II', head[offset + 8:offset + 16])
+    return width, height
+
+
+def image_size(head: bytes):
+    """
+    Returns:
+        tuple | None: (ширина, высота) или None, если формат не распознан
+            или размеров нет в переданных байтах
+    """
+    if head.startswith(b'\xff\xd8'):
+        return _jpeg(head)
+    if head.startswith(b'\x89PNG\r\n\x1a\n') and len(head) >= 24:
+        return struct.unpack('>II', head[16:24])
+    if head[:6] in (b'GIF87a', b'GIF89a') and len(head) >= 10:
+        return struct.unpack('<HH', head[6:10])
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return _webp(head)
+    if head[4:12] in (b'ftypavif', b'ftypavis'):
+        return _avif(head)
+    return None
@@ -1,11 +1,38 @@
-# mangalib.py - Синхронная версия для стабильности на Render.com
+# mangalib.py - Синхронная версия для стабильности на Render.com (+ async-методы для ASGI)
 
 import requests
-from typing import List, Dict, Optional
-from .base import BaseParser
+from typing import List, Optional
+from .base import (
+    BaseParser, PROFILE_SEARCH_CARD, PROFILE_DETAIL_INGEST, PROFILE_REFRESH_CHECK, PROFILE_FULL,
+)
+from .records import SearchHit, MangaDetails, ChapterRef, PageRef, iter_json_array, loads
+
+# fields[] по профилям. Название, slug_url, обложку и тип API отдаёт всегда;
+# chap_count — это items_count (число загруженных глав)
+SEARCH_FIELDS = {
+    PROFILE_SEARCH_CARD: [],
+    PROFILE_FULL: ['rate_avg', 'rate', 'releaseDate'],
+}
+DETAIL_FIELDS = {
+    PROFILE_DETAIL_INGEST: ['summary', 'releaseDate', 'genres', 'authors', 'artists', 'chap_count'],
+    PROFILE_REFRESH_CHECK: ['chap_count'],
+    PROFILE_FULL: [
+        'background', 'eng_name', 'otherNames', 'summary', 'releaseDate', 'type_id', 'caution',
+        'views', 'close_view', 'rate_avg', 'rate', 'genres', 'tags', 'teams', 'user', 'franchise',
+        'authors', 'publisher', 'userRating', 'moderated', 'metadata', 'metadata.count',
+        'metadata.close_comments', 'manga_status_id', 'chap_count', 'status_id', 'artists', 'format',
+    ],
+}
+
+
+def _fields_query(fields: list) -> str:
+    return ''.join(f"&fields[]={field}" for field in fields)
 
 
 class MangaLibParser(BaseParser):
+    source = 'mangalib'
+    STREAM_CHUNK_SIZE = 64 * 1024  # iter_chapters читает ответ кусками
+
     def __init__(self):
         self.api_url = "https://api.cdnlibs.org/api/manga/"
         self.headers = {
@@ -19,112 +46,164 @@ class MangaLibParser(BaseParser):
         }
         self.timeout = 15  # Увеличенный таймаут для стабильности
     
-    def _fetch(self, url: str) -> dict:
+    def _fetch(self, url: str, operation: str = '') -> dict:
         """Синхронный запрос к API"""
         try:
-            response = requests.get(url, headers=self.headers, timeout=self.timeout)
-            response.raise_for_status()
-            return response.json()
+            response = self._request('GET', url, operation=operation, headers=self.headers, timeout=self.timeout)
+            return loads(response.content)
+        except requests.exceptions.RequestException as e:
+            print(f"MangaLib API error: {e}")
+            raise
+
+    async def _afetch(self, url: str, operation: str = '') -> dict:
+        """Асинхронный запрос к API"""
+        try:
+            response = await self._arequest('GET', url, operation=operation, headers=self.headers, timeout=self.timeout)
+            return loads(response.content)
         except requests.exceptions.RequestException as e:
             print(f"MangaLib API error: {e}")
             raise
 
     # --- ПОИСК ---
-    def search(self, query: str, limit: int = 20) -> List[Dict]:
+    def search(self, query: str, limit: int = 20, profile: str = PROFILE_SEARCH_CARD) -> List[SearchHit]:
         """Поиск манги по запросу"""
-        params = f"q={query}&site_id[]=1&limit={limit}&fields[]=rate_avg&fields[]=rate&fields[]=releaseDate"
-        url = f"{self.api_url}?{params}"
-        
         try:
-            data = self._fetch(url)
+            data = self._fetch(self._search_url(query, limit, profile), operation='search')
+            return self._parse_search_results(data)
+        except Exception as e:
+            print(f"MangaLib search error: {e}")
+            return []
+
+    async def asearch(self, query: str, limit: int = 20, profile: str = PROFILE_SEARCH_CARD) -> List[SearchHit]:
+        try:
+            data = await self._afetch(self._search_url(query, limit, profile), operation='search')
             return self._parse_search_results(data)
         except Exception as e:
             print(f"MangaLib search error: {e}")
             return []
 
-    def _parse_search_results(self, data: dict) -> List[Dict]:
+    def _search_url(self, query: str, limit: int, profile: str = PROFILE_SEARCH_CARD) -> str:
+        fields = SEARCH_FIELDS.get(profile, SEARCH_FIELDS[PROFILE_FULL])
+        return f"{self.api_url}?q={query}&site_id[]=1&limit={limit}{_fields_query(fields)}"
+
+    def _parse_search_results(self, data: dict) -> List[SearchHit]:
         """Парсинг результатов поиска"""
         results = []
         if 'data' not in data: 
             return results
         
         for item in data['data']:
-            results.append({
-                'title': item.get('rus_name') or item.get('name'),
-                'slug': item.get('slug_url'),
-                'cover_url': item.get('cover', {}).get('default', ''),
-                'description': item.get('summary', ''),
-                'source': 'mangalib',
-                'content_type': self._get_content_type(item.get('type', {}).get('label')),
-                'year': item.get('releaseDate'),
-                'rating': item.get('rate_avg'),
-                'original_url': f"https://mangalib.org/{item.get('slug_url')}"
-            })
+            results.append(SearchHit(
+                title=item.get('rus_name') or item.get('name'),
+                slug=item.get('slug_url'),
+                cover_url=item.get('cover', {}).get('default', ''),
+                description=item.get('summary', ''),
+                source='mangalib',
+                content_type=self._get_content_type(item.get('type', {}).get('label')),
+                year=item.get('releaseDate'),
+                rating=item.get('rate_avg'),
+                original_url=f"https://mangalib.org/{item.get('slug_url')}",
+            ))
         return results
 
+    # --- КАТАЛОГ ---
+    def get_catalog_page(self, cursor=None):
+        """Страница каталога; курсор — номер страницы"""
+        page = cursor or 1
+        data = self._fetch(f"{self.api_url}?site_id[]=1&page={page}", operation='catalog')
+        next_cursor = page + 1 if data.get('meta', {}).get('has_next_page') else None
+        return self._parse_search_results(data), next_cursor
+
     # --- ДЕТАЛИ ---
-    def get_manga_details(self, slug: str) -> Optional[Dict]:
+    def get_manga_details(self, slug: str, profile: str = PROFILE_DETAIL_INGEST) -> Optional[MangaDetails]:
         """Получить детальную информацию о манге"""
-        params = "?fields[]=background&fields[]=eng_name&fields[]=otherNames&fields[]=summary&fields[]=releaseDate&fields[]=type_id&fields[]=caution&fields[]=views&fields[]=close_view&fields[]=rate_avg&fields[]=rate&fields[]=genres&fields[]=tags&fields[]=teams&fields[]=user&fields[]=franchise&fields[]=authors&fields[]=publisher&fields[]=userRating&fields[]=moderated&fields[]=metadata&fields[]=metadata.count&fields[]=metadata.close_comments&fields[]=manga_status_id&fields[]=chap_count&fields[]=status_id&fields[]=artists&fields[]=format"
-        url = f"{self.api_url}{slug}{params}"
-        
         try:
-            data = self._fetch(url)
+            data = self._fetch(self._details_url(slug, profile), operation='details')
+            return self._parse_manga_details(data)
+        except Exception as e:
+            print(f"MangaLib details error for {slug}: {e}")
+            return None
+
+    async def aget_manga_details(self, slug: str, profile: str = PROFILE_DETAIL_INGEST) -> Optional[MangaDetails]:
+        try:
+            data = await self._afetch(self._details_url(slug, profile), operation='details')
             return self._parse_manga_details(data)
         except Exception as e:
             print(f"MangaLib details error for {slug}: {e}")
             return None
 
-    def _parse_manga_details(self, data: dict) -> Dict:
+    def _details_url(self, slug: str, profile: str = PROFILE_DETAIL_INGEST) -> str:
+        fields = DETAIL_FIELDS.get(profile, DETAIL_FIELDS[PROFILE_FULL])
+        return f"{self.api_url}{slug}?{_fields_query(fields).lstrip('&')}"
+
+    def _parse_manga_details(self, data: dict) -> MangaDetails:
         """Парсинг деталей манги"""
         manga_data = data.get('data', {})
-        return {
-            'title': manga_data.get('rus_name') or manga_data.get('name'),
-            'slug': manga_data.get('slug_url'),
-            'cover_url': manga_data.get('cover', {}).get('default', ''),
-            'description': manga_data.get('summary') or manga_data.get('description') or 'Описание отсутствует',
-            'source': 'mangalib',
-            'content_type': self._get_content_type(manga_data.get('type', {}).get('label')),
-            'author': ', '.join([a['name'] for a in manga_data.get('authors', [])]),
-            'artist': ', '.join([a['name'] for a in manga_data.get('artists', [])]),
-            'year': manga_data.get('releaseDate'),
-            'status': manga_data.get('status', {}).get('label'),
-            'genres': [g['name'] for g in manga_data.get('genres', [])],
-            'rating': manga_data.get('rating', {}).get('average'),
-            'views': manga_data.get('views', {}).get('total', 0),
-            'total_chapters': manga_data.get('items_count', {}).get('uploaded', 0),
-            'original_url': f"https://mangalib.org/{manga_data.get('slug_url')}"
-        }
+        return MangaDetails(
+            title=manga_data.get('rus_name') or manga_data.get('name'),
+            slug=manga_data.get('slug_url'),
+            cover_url=manga_data.get('cover', {}).get('default', ''),
+            description=manga_data.get('summary') or manga_data.get('description') or 'Описание отсутствует',
+            source='mangalib',
+            content_type=self._get_content_type(manga_data.get('type', {}).get('label')),
+            author=', '.join([a['name'] for a in manga_data.get('authors', [])]),
+            artist=', '.join([a['name'] for a in manga_data.get('artists', [])]),
+            year=manga_data.get('releaseDate'),
+            status=manga_data.get('status', {}).get('label'),
+            genres=[g['name'] for g in manga_data.get('genres', [])],
+            rating=manga_data.get('rating', {}).get('average'),
+            views=manga_data.get('views', {}).get('total', 0),
+            total_chapters=manga_data.get('items_count', {}).get('uploaded', 0),
+            original_url=f"https://mangalib.org/{manga_data.get('slug_url')}",
+        )
 
     # --- ГЛАВЫ ---
-    def get_chapters(self, slug: str) -> List[Dict]:
+    def get_chapters(self, slug: str) -> List[ChapterRef]:
         """Получить список глав манги"""
-        url = f"{self.api_url}{slug}/chapters"
-        
         try:
-            data = self._fetch(url)
+            data = self._fetch(f"{self.api_url}{slug}/chapters", operation='chapters')
             return self._parse_chapters(data, slug)
         except Exception as e:
             print(f"MangaLib chapters error for {slug}: {e}")
             return []
 
-    def _parse_chapters(self, data: dict, slug: str) -> List[Dict]:
+    def iter_chapters(self, slug: str):
+        """Главы по мере чтения ответа: ни JSON целиком, ни список глав в памяти не держатся"""
+        response = self._request(
+            'GET', f"{self.api_url}{slug}/chapters", operation='chapters',
+            headers=self.headers, timeout=self.timeout, stream=True,
+        )
+        with response:
+            for chapter in iter_json_array(response.iter_content(self.STREAM_CHUNK_SIZE), 'data'):
+                yield self._chapter_ref(chapter, slug)
+
+    async def aget_chapters(self, slug: str) -> List[ChapterRef]:
+        try:
+            data = await self._afetch(f"{self.api_url}{slug}/chapters", operation='chapters')
+            return self._parse_chapters(data, slug)
+        except Exception as e:
+            print(f"MangaLib chapters error for {slug}: {e}")
+            return []
+
+    @staticmethod
+    def _chapter_ref(chapter: dict, slug: str) -> ChapterRef:
+        # Позиционные аргументы (number, volume, title, url): глав тысячи, kwargs заметно медленнее
+        return ChapterRef(
+            chapter.get('number'),
+            chapter.get('volume', 0),
+            chapter.get('name', ''),
+            f"https://mangalib.org/{slug}/v{chapter.get('volume')}/c{chapter.get('number')}",
+        )
+
+    def _parse_chapters(self, data: dict, slug: str) -> List[ChapterRef]:
         """Парсинг списка глав"""
-        chapters = []
         if 'data' not in data: 
-            return chapters
-        
-        for chapter in data['data']:
-            chapters.append({
-                'number': chapter.get('number'),
-                'volume': chapter.get('volume', 0),
-                'title': chapter.get('name', ''),
-                'url': f"https://mangalib.org/{slug}/v{chapter.get('volume')}/c{chapter.get('number')}",
-            })
-        return chapters
+            return []
+        chapter_ref = self._chapter_ref
+        return [chapter_ref(chapter, slug) for chapter in data['data']]
 
     # --- СТРАНИЦЫ ---
-    def get_pages(self, **kwargs) -> List[str]:
+    def get_pages(self, **kwargs) -> List[PageRef]:
         """
         Получить список URL всех страниц главы
         
@@ -134,43 +213,59 @@ class MangaLibParser(BaseParser):
             number (str/float): Номер главы
         
         Returns:
-            List[str]: Список URL изображений страниц
+            List[PageRef]: Страницы главы
         """
+        url = self._pages_url(**kwargs)
+        if not url:
+            return []
+
+        try:
+            return self._parse_pages(self._fetch(url, operation='pages'), url)
+        except Exception as e:
+            print(f"MangaLib pages error: {e}")
+            return []
+
+    async def aget_pages(self, **kwargs) -> List[PageRef]:
+        url = self._pages_url(**kwargs)
+        if not url:
+            return []
+
+        try:
+            return self._parse_pages(await self._afetch(url, operation='pages'), url)
+        except Exception as e:
+            print(f"MangaLib pages error: {e}")
+            return []
+
+    def _pages_url(self, **kwargs) -> Optional[str]:
         slug = kwargs.get('manga_slug')
         volume = kwargs.get('volume')
         number = kwargs.get('number')
         
         if not all([slug, volume is not None, number is not None]):
             print(f"MangaLib get_pages: недостаточно параметров - slug={slug}, volume={volume}, number={number}")
-            return []
-        
+            return None
+
+        # Нормализация номера главы
         try:
-            # Нормализация номера главы
-            try:
-                n = float(number)
-                clean_number = str(int(n)) if n == int(n) else str(n)
-            except (ValueError, TypeError):
-                clean_number = str(number)
-            
-            url = f"{self.api_url}{slug}/chapter?number={clean_number}&volume={volume}"
-            
-            data = self._fetch(url)
-            
-            # Извлечение страниц
-            raw_pages = data.get('data', {}).get('pages', []) if isinstance(data.get('data'), dict) else []
-            
-            clean_urls = []
-            for p in raw_pages:
-                img_path = p.get('url')
-                if img_path:
-                    clean_urls.append(f"https://img2.imglib.info{img_path}")
-            
-            print(f"MangaLib: загружено {len(clean_urls)} страниц для {slug} v{volume} c{clean_number}")
-            return clean_urls
-            
-        except Exception as e:
-            print(f"MangaLib pages error: {e}")
-            return []
+            n = float(number)
+            clean_number = str(int(n)) if n == int(n) else str(n)
+        except (ValueError, TypeError):
+            clean_number = str(number)
+
+        return f"{self.api_url}{slug}/chapter?number={clean_number}&volume={volume}"
+
+    def _parse_pages(self, data: dict, url: str = '') -> List[PageRef]:
+        """Извлечение страниц из ответа /chapter"""
+        raw_pages = data.get('data', {}).get('pages', []) if isinstance(data.get('data'), dict) else []
+        
+        pages = []
+        for p in raw_pages:
+            img_path = p.get('url')
+            if img_path:
+                pages.append(PageRef(f"https://img2.imglib.info{img_path}"))
+        
+        print(f"MangaLib: загружено {len(pages)} страниц ({url})")
+        return pages
 
     def _get_content_type(self, type_label: str) -> str:
         """Преобразование типа контента"""
@@ -0,0 +1,178 @@
+# records.py
+"""
+Результаты парсеров: компактные записи со __slots__ вместо вложенных dict
+и быстрый JSON (orjson, если установлен; иначе стандартный json).
+
+orjson сериализует dataclass напрямую, без промежуточных dict, поэтому
+JSON-ответы с записями собираются через dumps()/RecordJsonResponse,
+а в шаблоны попадают через json_script().
+"""
+import codecs
+import datetime
+import json
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
+
+from django.http import HttpResponse
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+@dataclass(slots=True)
+class SearchHit:
+    """Карточка в результатах поиска"""
+    title: str
+    slug: str
+    source: str
+    cover_url: str = ''
+    original_url: str = ''
+    description: str = ''
+    author: str = ''
+    content_type: str = 'Manga'
+    year: Union[int, str, None] = None
+    rating: Union[float, str, None] = None
+
+
+@dataclass(slots=True)
+class MangaDetails:
+    """Данные манги для сохранения в Manga/Genre"""
+    title: str
+    slug: str
+    source: str
+    description: str = ''
+    cover_url: str = ''
+    original_url: str = ''
+    author: str = ''
+    artist: str = ''
+    year: Union[int, str, None] = None
+    genres: List[str] = field(default_factory=list)
+    total_chapters: int = 0
+    content_type: str = 'Manga'
+    status: Optional[str] = None
+    rating: Union[float, str, None] = None
+    views: int = 0
+
+
+@dataclass(slots=True)
+class ChapterRef:
+    """Глава в списке глав источника; url — то, что нужно get_pages (slug или ссылка)"""
+    number: Union[float, str]
+    volume: Union[int, str] = 1
+    title: str = ''
+    url: str = ''
+
+
+@dataclass(slots=True)
+class PageRef:
+    """Страница главы"""
+    url: str
+
+
+@dataclass(slots=True)
+class ImageInfo:
+    """Размеры и объём картинки по её заголовку (BaseParser.probe_image); неизвестное — None"""
+    width: Optional[int] = None
+    height: Optional[int] = None
+    size: Optional[int] = None
+    etag: Optional[str] = None
+
+
+RECORD_TYPES = (SearchHit, MangaDetails, ChapterRef, PageRef, ImageInfo)
+
+
+def loads(content: Union[bytes, str]):
+    """Разбор JSON ответа API"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_json_array(chunks, key: str):
+    """
+    Потоковый разбор массива {"key": [...]} из итератора чанков байтов
+    (response.iter_content): элементы отдаются по одному по мере чтения,
+    в памяти только текущий чанк и разбираемый элемент.
+
+    Ключ ищется по первому вхождению — массив должен идти раньше вложенных
+    объектов с тем же ключом. Элементы — объекты или массивы.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.iterdecode(chunks, 'utf-8')
+    marker = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+
+    buffer = ''
+    for chunk in text:
+        buffer += chunk
+        found = marker.search(buffer)
+        if found:
+            buffer = buffer[found.end():]
+            break
+        # Хвост может содержать начало маркера
+        buffer = buffer[-(len(key) + 64):]
+    else:
+        return
+
+    pos = 0
+    exhausted = False
+    while True:
+        pos = _SEPARATORS.match(buffer, pos).end()
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if exhausted:
+                raise
+            chunk = next(text, None)
+            if chunk is None:
+                exhausted = True
+            else:
+                buffer = buffer[pos:] + chunk
+                pos = 0
+            continue
+        yield item
+        pos = end
+
+
+def _default(obj):
+    if isinstance(obj, RECORD_TYPES):
+        return {name: getattr(obj, name) for name in obj.__slots__}
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()  # как orjson
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data) -> bytes:
+    """JSON (UTF-8) с записями парсеров"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, default=_default, ensure_ascii=False).encode()
+
+
+# Как в django.utils.html.json_script: JSON не должен закрыть <script>
+_SCRIPT_ESCAPES = {ord('>'): '\\u003E', ord('<'): '\\u003C', ord('&'): '\\u0026'}
+
+
+def json_script(data, element_id: str):
+    """Аналог фильтра json_script для данных с записями парсеров"""
+    payload = dumps(data).decode().translate(_SCRIPT_ESCAPES)
+    return format_html(
+        '<script id="{}" type="application/json">{}</script>', element_id, mark_safe(payload)
+    )
+
+
+class RecordJsonResponse(HttpResponse):
+    """JsonResponse для данных с записями парсеров"""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
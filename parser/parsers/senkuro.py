@@ -1,11 +1,21 @@
-# senkuro.py - Синхронная версия с улучшенной обработкой ошибок
+# senkuro.py - Синхронная версия с улучшенной обработкой ошибок (+ async-методы для ASGI)
 
 import requests
-from typing import List, Dict, Optional
-from .base import BaseParser
+from django.conf import settings
+from typing import List, Optional
+from .base import BaseParser, PROFILE_SEARCH_CARD, PROFILE_DETAIL_INGEST
+from .records import SearchHit, MangaDetails, ChapterRef, PageRef, loads
+
+PROXY_URL = "http://89.208.85.78:443"
 
 
 class SenkuroParser(BaseParser):
+    """
+    GraphQL API Senkuro принимает только persisted queries: набор полей
+    задаёт сервер по sha256Hash, поэтому профили полей здесь ни на что не влияют.
+    """
+    source = 'senkuro'
+
     def __init__(self):
         self.api_url = 'https://api.senkuro.me/graphql'
         self.headers = {
@@ -13,6 +23,10 @@ class SenkuroParser(BaseParser):
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/144.0.0.0 Safari/537.36",
         }
         self.timeout = 15  # Увеличенный таймаут
+        self.proxies = {
+            "http": PROXY_URL,
+            "https": PROXY_URL,
+        }
 
     def _post_request(self, payload: dict) -> dict:
         """
@@ -27,207 +41,293 @@ class SenkuroParser(BaseParser):
         Raises:
             requests.exceptions.RequestException: При ошибке запроса
         """
-        proxy_url = "http://89.208.85.78:443"
-        proxies = {
-            "http": proxy_url,
-            "https": proxy_url,
-        }
         try:
-            response = requests.post(
+            response = self._request(
+                'POST',
                 self.api_url, 
+                operation=payload.get('operationName', ''),
                 json=payload, 
                 headers=self.headers, 
-                proxies=proxies,
+                proxies=self.proxies,
                 timeout=self.timeout
             )
-            response.raise_for_status()
-            return response.json()
+            return loads(response.content)
         except requests.exceptions.RequestException as e:
             print(f"Senkuro API error: {e}")
             raise
 
-    # --- ПОИСК ---
-    def search(self, query: str, limit: int = 20) -> List[Dict]:
-        """Поиск манги по запросу"""
-        payload = {
-            "operationName": "search",
-            "variables": {"query": query, "type": "MANGA"},
+    async def _apost_request(self, payload: dict) -> dict:
+        """Асинхронный вариант _post_request"""
+        try:
+            response = await self._arequest(
+                'POST',
+                self.api_url,
+                operation=payload.get('operationName', ''),
+                json=payload,
+                headers=self.headers,
+                proxies=self.proxies,
+                timeout=self.timeout
+            )
+            return loads(response.content)
+        except requests.exceptions.RequestException as e:
+            print(f"Senkuro API error: {e}")
+            raise
+
+    @staticmethod
+    def _payload(operation: str, variables: dict, sha256: str) -> dict:
+        """Payload persisted-запроса GraphQL"""
+        return {
+            "operationName": operation,
+            "variables": variables,
             "extensions": {
                 "persistedQuery": {
                     "version": 1,
-                    "sha256Hash": "e64937b4fc9c921c2141f2995473161bed921c75855c5de934752392175936bc"
+                    "sha256Hash": sha256
                 }
             }
         }
-        
+
+    # --- ПОИСК ---
+    def search(self, query: str, limit: int = 20, profile: str = PROFILE_SEARCH_CARD) -> List[SearchHit]:
+        """Поиск манги по запросу"""
         try:
-            data = self._post_request(payload)
-            edges = data.get('data', {}).get('search', {}).get('edges', [])
-            
-            results = []
-            for edge in edges[:limit]:
-                node = edge.get('node', {})
-                results.append({
-                    'title': self._get_title(node.get('titles', [])),
-                    'slug': node.get('slug', ''),
-                    'cover_url': self._get_cover_url(node.get('cover')),
-                    'description': node.get('description', ''),
-                    'author': self._get_author(node),
-                    'year': node.get('releaseYear'),
-                    'source': 'senkuro',
-                })
-            
-            return results
+            data = self._post_request(self._search_payload(query))
+            return self._parse_search_results(data, limit)
             
         except Exception as e:
             print(f"Senkuro search error: {e}")
             return []
 
+    async def asearch(self, query: str, limit: int = 20, profile: str = PROFILE_SEARCH_CARD) -> List[SearchHit]:
+        try:
+            data = await self._apost_request(self._search_payload(query))
+            return self._parse_search_results(data, limit)
+        except Exception as e:
+            print(f"Senkuro search error: {e}")
+            return []
+
+    def _search_payload(self, query: str) -> dict:
+        return self._payload(
+            "search",
+            {"query": query, "type": "MANGA"},
+            "e64937b4fc9c921c2141f2995473161bed921c75855c5de934752392175936bc",
+        )
+
+    def _parse_search_results(self, data: dict, limit: int = 20) -> List[SearchHit]:
+        """Парсинг результатов поиска"""
+        edges = data.get('data', {}).get('search', {}).get('edges', [])
+        return self._parse_manga_edges(edges[:limit])
+
+    def _parse_manga_edges(self, edges: list) -> List[SearchHit]:
+        results = []
+        for edge in edges:
+            node = edge.get('node', {})
+            results.append(SearchHit(
+                title=self._get_title(node.get('titles', [])),
+                slug=node.get('slug', ''),
+                cover_url=self._get_cover_url(node.get('cover')),
+                description=node.get('description', ''),
+                author=self._get_author(node),
+                year=node.get('releaseYear'),
+                source='senkuro',
+            ))
+        
+        return results
+
+    # --- КАТАЛОГ ---
+    @classmethod
+    def supports_catalog(cls) -> bool:
+        # Запрос каталога сервер принимает только по хэшу, а своего у нас нет
+        return bool(getattr(settings, 'SENKURO_CATALOG_QUERY_HASH', None))
+
+    def get_catalog_page(self, cursor=None):
+        """
+        Страница каталога; курсор — endCursor GraphQL.
+
+        Хэш persisted-запроса каталога берётся из settings.SENKURO_CATALOG_QUERY_HASH
+        (снимается из запросов сайта), имя операции — SENKURO_CATALOG_OPERATION.
+        """
+        sha256 = getattr(settings, 'SENKURO_CATALOG_QUERY_HASH', None)
+        if not sha256:
+            raise NotImplementedError("senkuro: не задан SENKURO_CATALOG_QUERY_HASH")
+
+        operation = getattr(settings, 'SENKURO_CATALOG_OPERATION', 'fetchMangas')
+        data = self._post_request(self._payload(operation, {"after": cursor}, sha256))
+        connection = next(iter(data.get('data', {}).values()), None) or {}
+        page_info = connection.get('pageInfo', {})
+        next_cursor = page_info.get('endCursor') if page_info.get('hasNextPage') else None
+        return self._parse_manga_edges(connection.get('edges', [])), next_cursor
+
     # --- ДЕТАЛИ ---
-    def get_manga_details(self, slug: str) -> Optional[Dict]:
+    def get_manga_details(self, slug: str, profile: str = PROFILE_DETAIL_INGEST) -> Optional[MangaDetails]:
         """Получить детальную информацию о манге"""
-        payload = {
-            "operationName": "fetchManga",
-            "variables": {"slug": slug},
-            "extensions": {
-                "persistedQuery": {
-                    "version": 1,
-                    "sha256Hash": "6d8b28abb9a9ee3199f6553d8f0a61c005da8f5c56a88ebcf3778eff28d45bd5"
-                }
-            }
-        }
-        
         try:
-            data = self._post_request(payload)
-            manga = data.get('data', {}).get('manga', {})
-            
-            if not manga:
-                print(f"Senkuro: манга {slug} не найдена")
-                return None
-            
-            # Извлечение основной информации
-            title = self._get_title(manga.get('titles', []))
-            cover_url = self._get_cover_url(manga.get('cover'))
-            description = self._get_description(manga.get('localizations', []))
-            
-            # Жанры
-            genres = [
-                tag.get('name', '') 
-                for tag in manga.get('tags', []) 
-                if tag.get('category') == 'GENRE'
-            ]
-            
-            # Автор и художник
-            author = ''
-            artist = ''
-            for staff in manga.get('mainStaff', []):
-                roles = staff.get('roles', [])
-                person_name = staff.get('person', {}).get('name', '')
-                
-                if 'STORY' in roles or 'STORY_AND_ART' in roles:
-                    author = person_name
-                if 'ART' in roles or 'STORY_AND_ART' in roles:
-                    artist = person_name
-            
-            # Количество глав
-            branches = manga.get('branches', [])
-            total_chapters = branches[0].get('chapters', 0) if branches else 0
-            
-            return {
-                'title': title,
-                'slug': slug,
-                'description': description,
-                'cover_url': cover_url,
-                'original_url': f'https://senkuro.me/manga/{slug}',
-                'author': author,
-                'artist': artist,
-                'year': manga.get('releaseYear'),
-                'genres': genres,
-                'total_chapters': total_chapters,
-                'source': 'senkuro',
-            }
-            
+            data = self._post_request(self._manga_payload(slug))
+            return self._parse_manga_details(data, slug)
         except Exception as e:
             print(f"Senkuro details error for {slug}: {e}")
             return None
 
+    async def aget_manga_details(self, slug: str, profile: str = PROFILE_DETAIL_INGEST) -> Optional[MangaDetails]:
+        try:
+            data = await self._apost_request(self._manga_payload(slug))
+            return self._parse_manga_details(data, slug)
+        except Exception as e:
+            print(f"Senkuro details error for {slug}: {e}")
+            return None
+
+    def _manga_payload(self, slug: str) -> dict:
+        return self._payload(
+            "fetchManga",
+            {"slug": slug},
+            "6d8b28abb9a9ee3199f6553d8f0a61c005da8f5c56a88ebcf3778eff28d45bd5",
+        )
+
+    def _parse_manga_details(self, data: dict, slug: str) -> Optional[MangaDetails]:
+        """Парсинг ответа fetchManga"""
+        manga = data.get('data', {}).get('manga', {})
+        
+        if not manga:
+            print(f"Senkuro: манга {slug} не найдена")
+            return None
+        
+        # Извлечение основной информации
+        title = self._get_title(manga.get('titles', []))
+        cover_url = self._get_cover_url(manga.get('cover'))
+        description = self._get_description(manga.get('localizations', []))
+        
+        # Жанры
+        genres = [
+            tag.get('name', '') 
+            for tag in manga.get('tags', []) 
+            if tag.get('category') == 'GENRE'
+        ]
+        
+        # Автор и художник
+        author = ''
+        artist = ''
+        for staff in manga.get('mainStaff', []):
+            roles = staff.get('roles', [])
+            person_name = staff.get('person', {}).get('name', '')
+            
+            if 'STORY' in roles or 'STORY_AND_ART' in roles:
+                author = person_name
+            if 'ART' in roles or 'STORY_AND_ART' in roles:
+                artist = person_name
+        
+        # Количество глав
+        branches = manga.get('branches', [])
+        total_chapters = branches[0].get('chapters', 0) if branches else 0
+        
+        return MangaDetails(
+            title=title,
+            slug=slug,
+            description=description,
+            cover_url=cover_url,
+            original_url=f'https://senkuro.me/manga/{slug}',
+            author=author,
+            artist=artist,
+            year=manga.get('releaseYear'),
+            genres=genres,
+            total_chapters=total_chapters,
+            source='senkuro',
+        )
+
     # --- ГЛАВЫ ---
-    def get_chapters(self, slug: str) -> List[Dict]:
+    # Защита от бесконечного цикла пагинации
+    MAX_CHAPTER_PAGES = 100
+
+    def get_chapters(self, slug: str) -> List[ChapterRef]:
         """Получить список глав манги с пагинацией"""
-        # Сначала получаем branch_id
-        payload_manga = {
-            "operationName": "fetchManga",
-            "variables": {"slug": slug},
-            "extensions": {
-                "persistedQuery": {
-                    "version": 1,
-                    "sha256Hash": "6d8b28abb9a9ee3199f6553d8f0a61c005da8f5c56a88ebcf3778eff28d45bd5"
-                }
-            }
-        }
-        
         try:
-            res = self._post_request(payload_manga)
-            branches = res.get('data', {}).get('manga', {}).get('branches', [])
+            all_chapters = list(self.iter_chapters(slug))
+            print(f"Senkuro: загружено {len(all_chapters)} глав для {slug}")
+            return all_chapters
             
-            if not branches:
-                print(f"Senkuro: нет веток для {slug}")
+        except Exception as e:
+            print(f"Senkuro chapters error for {slug}: {e}")
+            return []
+
+    def iter_chapters(self, slug: str):
+        """Главы по страницам API по мере загрузки"""
+        # Сначала получаем branch_id
+        res = self._post_request(self._manga_payload(slug))
+        branch_id = self._get_branch_id(res, slug)
+        if not branch_id:
+            return
+
+        after = None
+        for _ in range(self.MAX_CHAPTER_PAGES):
+            data = self._post_request(self._chapters_payload(branch_id, after))
+            ch_data = data.get('data', {}).get('mangaChapters', {})
+            yield from self._parse_chapters(ch_data)
+
+            # Проверяем есть ли следующая страница
+            page_info = ch_data.get('pageInfo', {})
+            if not page_info.get('hasNextPage'):
+                break
+            after = page_info.get('endCursor')
+
+    async def aget_chapters(self, slug: str) -> List[ChapterRef]:
+        try:
+            res = await self._apost_request(self._manga_payload(slug))
+            branch_id = self._get_branch_id(res, slug)
+            if not branch_id:
                 return []
-            
-            branch_id = branches[0]['id']
-            
-            # Получаем главы с пагинацией
+
             all_chapters = []
             after = None
-            max_iterations = 100  # Защита от бесконечного цикла
-            iteration = 0
-            
-            while iteration < max_iterations:
-                payload = {
-                    "operationName": "fetchMangaChapters",
-                    "variables": {
-                        "after": after,
-                        "branchId": branch_id,
-                        "orderBy": {"direction": "ASC", "field": "NUMBER"}
-                    },
-                    "extensions": {
-                        "persistedQuery": {
-                            "version": 1,
-                            "sha256Hash": "8c854e121f05aa93b0c37889e732410df9ea207b4186c965c845a8d970bdcc12"
-                        }
-                    }
-                }
-                
-                data = self._post_request(payload)
+            for _ in range(self.MAX_CHAPTER_PAGES):
+                data = await self._apost_request(self._chapters_payload(branch_id, after))
                 ch_data = data.get('data', {}).get('mangaChapters', {})
-                
-                # Добавляем главы из текущей страницы
-                for edge in ch_data.get('edges', []):
-                    node = edge.get('node', {})
-                    all_chapters.append({
-                        'number': node.get('number', 0),
-                        'volume': node.get('volume', 1),
-                        'title': node.get('title', ''),
-                        'url': node.get('slug', ''),  # Slug главы для get_pages
-                    })
-                
-                # Проверяем есть ли следующая страница
+                all_chapters.extend(self._parse_chapters(ch_data))
+
                 page_info = ch_data.get('pageInfo', {})
                 if not page_info.get('hasNextPage'):
                     break
-                
                 after = page_info.get('endCursor')
-                iteration += 1
-            
+
             print(f"Senkuro: загружено {len(all_chapters)} глав для {slug}")
             return all_chapters
-            
+
         except Exception as e:
             print(f"Senkuro chapters error for {slug}: {e}")
             return []
 
+    def _get_branch_id(self, data: dict, slug: str) -> Optional[str]:
+        branches = data.get('data', {}).get('manga', {}).get('branches', [])
+        if not branches:
+            print(f"Senkuro: нет веток для {slug}")
+            return None
+        return branches[0]['id']
+
+    def _chapters_payload(self, branch_id: str, after: Optional[str]) -> dict:
+        return self._payload(
+            "fetchMangaChapters",
+            {
+                "after": after,
+                "branchId": branch_id,
+                "orderBy": {"direction": "ASC", "field": "NUMBER"}
+            },
+            "8c854e121f05aa93b0c37889e732410df9ea207b4186c965c845a8d970bdcc12",
+        )
+
+    def _parse_chapters(self, ch_data: dict) -> List[ChapterRef]:
+        """Парсинг одной страницы списка глав (mangaChapters)"""
+        chapters = []
+        for edge in ch_data.get('edges', []):
+            node = edge.get('node', {})
+            # number, volume, title, url (slug главы для get_pages)
+            chapters.append(ChapterRef(
+                node.get('number', 0),
+                node.get('volume', 1),
+                node.get('title', ''),
+                node.get('slug', ''),
+            ))
+        return chapters
+
     # --- СТРАНИЦЫ ---
-    def get_pages(self, **kwargs) -> List[str]:
+    def get_pages(self, **kwargs) -> List[PageRef]:
         """
         Получить список URL всех страниц главы
         
@@ -235,7 +335,7 @@ class SenkuroParser(BaseParser):
             chapter_slug (str): Slug главы (из Chapter.url)
         
         Returns:
-            List[str]: Список URL изображений страниц
+            List[PageRef]: Страницы главы
         """
         chapter_slug = kwargs.get('chapter_slug')
         
@@ -243,37 +343,49 @@ class SenkuroParser(BaseParser):
             print("Senkuro get_pages: chapter_slug не указан")
             return []
         
-        payload = {
-            "operationName": "fetchMangaChapter",
-            "variables": {
-                "cdnQuality": "auto",
-                "slug": chapter_slug
-            },
-            "extensions": {
-                "persistedQuery": {
-                    "version": 1,
-                    "sha256Hash": "8e166106650d3659d21e7aadc15e7e59e5def36f1793a9b15287c73a1e27aa50"
-                }
-            }
-        }
-        
         try:
-            data = self._post_request(payload)
-            pages = data.get('data', {}).get('mangaChapter', {}).get('pages', [])
-            
-            page_urls = [
-                p['image']['original']['url'] 
-                for p in pages 
-                if p.get('image') and p['image'].get('original', {}).get('url')
-            ]
-            
-            print(f"Senkuro: загружено {len(page_urls)} страниц для главы {chapter_slug}")
-            return page_urls
-            
+            data = self._post_request(self._chapter_payload(chapter_slug))
+            return self._parse_pages(data, chapter_slug)
         except Exception as e:
             print(f"Senkuro pages error for chapter {chapter_slug}: {e}")
             return []
 
+    async def aget_pages(self, **kwargs) -> List[PageRef]:
+        chapter_slug = kwargs.get('chapter_slug')
+        if not chapter_slug:
+            print("Senkuro get_pages: chapter_slug не указан")
+            return []
+
+        try:
+            data = await self._apost_request(self._chapter_payload(chapter_slug))
+            return self._parse_pages(data, chapter_slug)
+        except Exception as e:
+            print(f"Senkuro pages error for chapter {chapter_slug}: {e}")
+            return []
+
+    def _chapter_payload(self, chapter_slug: str) -> dict:
+        return self._payload(
+            "fetchMangaChapter",
+            {
+                "cdnQuality": "auto",
+                "slug": chapter_slug
+            },
+            "8e166106650d3659d21e7aadc15e7e59e5def36f1793a9b15287c73a1e27aa50",
+        )
+
+    def _parse_pages(self, data: dict, chapter_slug: str = '') -> List[PageRef]:
+        """Извлечение URL страниц из ответа fetchMangaChapter"""
+        pages = data.get('data', {}).get('mangaChapter', {}).get('pages', [])
+        
+        page_refs = [
+            PageRef(p['image']['original']['url'])
+            for p in pages 
+            if p.get('image') and p['image'].get('original', {}).get('url')
+        ]
+        
+        print(f"Senkuro: загружено {len(page_refs)} страниц для главы {chapter_slug}")
+        return page_refs
+
     # --- ВСПОМОГАТЕЛЬНЫЕ МЕТОДЫ ---
     
     def _get_description(self, localizations: list) -> str:
@@ -0,0 +1,289 @@
+# transport.py
+"""
+Транспорт HTTP-запросов парсеров.
+
+settings.PARSER_TRANSPORT:
+    'live'   — обычные запросы к внешним API (по умолчанию)
+    'record' — запросы к внешним API с сохранением ответов в фикстуры
+    'replay' — ответы только из фикстур, без сети
+
+settings.PARSER_UPSTREAM_URL — если задан, live-запросы уходят не на
+исходный хост, а на заглушку (`manage.py stub_upstream`):
+https://api.senkuro.me/graphql -> <PARSER_UPSTREAM_URL>/api.senkuro.me/graphql
+
+Асинхронные вызовы (asend) при settings.PARSER_ASYNC_HTTP идут через aiohttp
+с одной сессией на event loop — это режим для ASGI (см. luanovel/asgi.py).
+Сессия закрывается вместе со своим loop: под ASGI это один loop процесса, а
+async_to_sync вне его (WSGI, команды) заводит loop на вызов, и незакрытая
+сессия оставляла бы по пулу соединений на каждый такой вызов.
+Иначе, или если aiohttp не установлен, синхронный send выполняется в потоке.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+import time
+import weakref
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+def fixture_key(method: str, url: str, body: bytes = b'') -> str:
+    """Ключ фикстуры: метод + подготовленный URL + тело (JSON канонизируется)"""
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(',', ':')).encode()
+        except ValueError:
+            pass
+    digest = hashlib.sha1(method.upper().encode() + b' ' + url.encode() + b'\n' + (body or b''))
+    return digest.hexdigest()
+
+
+def prepare(method: str, url: str, **kwargs) -> requests.PreparedRequest:
+    return requests.Request(
+        method, url,
+        params=kwargs.get('params'),
+        json=kwargs.get('json'),
+        data=kwargs.get('data'),
+        headers=kwargs.get('headers'),
+    ).prepare()
+
+
+def _body(prepared: requests.PreparedRequest) -> bytes:
+    body = prepared.body or b''
+    return body.encode() if isinstance(body, str) else body
+
+
+class FixtureStore:
+    """Фикстуры ответов: <dir>/<key>.json (метаданные) + <key>.body (тело)"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def save(self, key: str, prepared, response: requests.Response, source: str = '', operation: str = ''):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        meta = {
+            'method': prepared.method,
+            'url': prepared.url,
+            'request_body': base64.b64encode(_body(prepared)).decode(),
+            'source': source,
+            'operation': operation,
+            'status': response.status_code,
+            'content_type': response.headers.get('Content-Type', ''),
+        }
+        (self.directory / f'{key}.body').write_bytes(response.content)
+        (self.directory / f'{key}.json').write_text(json.dumps(meta, ensure_ascii=False, indent=1))
+
+    def load(self, key: str):
+        """Возвращает (метаданные, тело) или None"""
+        meta_path = self.directory / f'{key}.json'
+        if not meta_path.exists():
+            return None
+        meta = json.loads(meta_path.read_text())
+        return meta, (self.directory / f'{key}.body').read_bytes()
+
+
+def build_response(url: str, status: int, content: bytes, content_type: str = '') -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response._content = content
+    response._content_consumed = True
+    response.url = url
+    response.encoding = 'utf-8'
+    if content_type:
+        response.headers['Content-Type'] = content_type
+    return response
+
+
+# loop -> (сессия, _session_closer)
+_sessions = weakref.WeakKeyDictionary()
+
+
+async def _session_closer(session):
+    """
+    Закрывает сессию при остановке её loop: asyncio.run() (и так запускаемые
+    uvicorn и async_to_sync) перед закрытием loop вызывает shutdown_asyncgens,
+    а тот — aclose() у всех приостановленных асинхронных генераторов.
+    """
+    try:
+        yield
+    finally:
+        await session.close()
+
+
+async def _session():
+    """Сессия aiohttp текущего event loop (пул соединений переиспользуется между запросами)"""
+    loop = asyncio.get_running_loop()
+    session, _ = _sessions.get(loop, (None, None))
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=getattr(settings, 'PARSER_ASYNC_CONNECTIONS', 100))
+        )
+        closer = _session_closer(session)
+        await closer.asend(None)
+        _sessions[loop] = session, closer
+    return session
+
+
+class LiveTransport:
+
+    def __init__(self, upstream_url: str = None):
+        self.upstream_url = upstream_url.rstrip('/') if upstream_url else None
+
+    def rewrite(self, url: str) -> str:
+        if not self.upstream_url:
+            return url
+        parts = urlsplit(url)
+        query = f'?{parts.query}' if parts.query else ''
+        return f'{self.upstream_url}/{parts.netloc}{parts.path}{query}'
+
+    def send(self, method: str, url: str, source: str = '', operation: str = '', **kwargs) -> requests.Response:
+        return self._request(method, url, **kwargs)
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        if self.upstream_url:
+            kwargs.pop('proxies', None)
+        return requests.request(method, self.rewrite(url), **kwargs)
+
+    async def asend(self, method: str, url: str, source: str = '', operation: str = '', **kwargs) -> requests.Response:
+        if aiohttp is None or not getattr(settings, 'PARSER_ASYNC_HTTP', False):
+            # Не self.send: наследники (RecordingTransport) обрабатывают ответ в своём asend
+            return await asyncio.to_thread(self._request, method, url, **kwargs)
+
+        proxies = kwargs.pop('proxies', None) or {}
+        timeout = kwargs.pop('timeout', None)
+        proxy = None if self.upstream_url else (proxies.get('https') or proxies.get('http'))
+        try:
+            async with (await _session()).request(
+                method, self.rewrite(url),
+                params=kwargs.get('params'),
+                json=kwargs.get('json'),
+                data=kwargs.get('data'),
+                headers=kwargs.get('headers'),
+                proxy=proxy,
+                timeout=aiohttp.ClientTimeout(total=timeout),
+            ) as raw:
+                content = await raw.read()
+        except asyncio.TimeoutError as e:
+            raise requests.exceptions.Timeout(f"Таймаут {method} {url}") from e
+        except aiohttp.ClientError as e:
+            raise requests.exceptions.ConnectionError(str(e)) from e
+
+        # Парсеры и сигнал upstream_request работают с requests.Response
+        response = build_response(str(raw.url), raw.status, content, raw.headers.get('Content-Type', ''))
+        response.reason = raw.reason
+        return response
+
+
+class RecordingTransport(LiveTransport):
+
+    def __init__(self, fixtures_dir, upstream_url: str = None):
+        super().__init__(upstream_url)
+        self.store = FixtureStore(fixtures_dir)
+
+    def send(self, method, url, source='', operation='', **kwargs):
+        response = super().send(method, url, source=source, operation=operation, **kwargs)
+        self._save(method, url, kwargs, response, source, operation)
+        return response
+
+    async def asend(self, method, url, source='', operation='', **kwargs):
+        response = await super().asend(method, url, source=source, operation=operation, **kwargs)
+        self._save(method, url, kwargs, response, source, operation)
+        return response
+
+    def _save(self, method, url, kwargs, response, source, operation):
+        prepared = prepare(method, url, **kwargs)
+        if response.status_code < 500:
+            self.store.save(fixture_key(prepared.method, prepared.url, _body(prepared)),
+                            prepared, response, source, operation)
+
+
+class ReplayTransport:
+
+    def __init__(self, fixtures_dir):
+        self.store = FixtureStore(fixtures_dir)
+
+    def send(self, method, url, source='', operation='', **kwargs):
+        prepared = prepare(method, url, **kwargs)
+        fixture = self.store.load(fixture_key(prepared.method, prepared.url, _body(prepared)))
+        if fixture is None:
+            raise requests.exceptions.ConnectionError(f"Нет фикстуры для {prepared.method} {prepared.url}")
+        meta, content = fixture
+        return build_response(prepared.url, meta['status'], content, meta.get('content_type', ''))
+
+    async def asend(self, method, url, source='', operation='', **kwargs):
+        # Чтение фикстуры с диска — без потока
+        return self.send(method, url, source=source, operation=operation, **kwargs)
+
+
+class RateLimitedTransport:
+    """
+    Ограничение частоты запросов по источнику поверх другого транспорта
+    (фоновые команды: import_catalog). rates: {source: запросов в секунду}.
+    """
+
+    def __init__(self, inner, rates: dict):
+        self.inner = inner
+        self.rates = rates
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def _delay(self, source) -> float:
+        rate = self.rates.get(source)
+        if not rate:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(source, now))
+            self._next_slot[source] = slot + 1 / rate
+        return slot - now
+
+    def send(self, method, url, source='', operation='', **kwargs):
+        delay = self._delay(source)
+        if delay > 0:
+            time.sleep(delay)
+        return self.inner.send(method, url, source=source, operation=operation, **kwargs)
+
+    async def asend(self, method, url, source='', operation='', **kwargs):
+        delay = self._delay(source)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return await self.inner.asend(method, url, source=source, operation=operation, **kwargs)
+
+
+_transport = None
+
+
+def get_transport():
+    """Транспорт согласно settings.PARSER_TRANSPORT (создаётся один раз на процесс)"""
+    global _transport
+    if _transport is None:
+        _transport = build_transport()
+    return _transport
+
+
+def build_transport():
+    mode = getattr(settings, 'PARSER_TRANSPORT', 'live')
+    fixtures_dir = getattr(settings, 'PARSER_FIXTURES_DIR', 'fixtures/upstream')
+    upstream_url = getattr(settings, 'PARSER_UPSTREAM_URL', None)
+
+    if mode == 'replay':
+        return ReplayTransport(fixtures_dir)
+    if mode == 'record':
+        return RecordingTransport(fixtures_dir, upstream_url)
+    return LiveTransport(upstream_url)
+
+
+def set_transport(transport):
+    """Подменяет транспорт процесса (тесты, нагрузочные сценарии)"""
+    global _transport
+    _transport = transport
@@ -2,10 +2,10 @@
 
 from django.shortcuts import render
 from django.http import JsonResponse
-from manga.models import Manga, Chapter, Genre
+from manga import ingest
+from manga.models import Manga
 from parser.parsers import get_parser, PARSERS
-from django.utils.text import slugify
-from django.db import transaction
+from parser.parsers.records import RecordJsonResponse
 
 def search(request):
     """Поиск по всем сайтам"""
@@ -54,7 +54,7 @@ def api_search(request):
     if parser:
         try:
             results = parser.search(query, limit=10)
-            return JsonResponse({'results': results})
+            return RecordJsonResponse({'results': results})
         except Exception as e:
             print(f"API search error: {e}")
             return JsonResponse({'results': [], 'error': str(e)})
@@ -99,29 +99,7 @@ def _fetch_and_save_manga(slug):
         details = parser.get_manga_details(slug)
         if not details:
             return None
-        
-        with transaction.atomic():
-            manga = Manga.objects.create(
-                title=details['title'],
-                slug=slug,
-                description=details.get('description', ''),
-                cover_url=details.get('cover_url', ''),
-                original_url=details.get('original_url', ''),
-                author=details.get('author', ''),
-                artist=details.get('artist', ''),
-                year=details.get('year'),
-                total_chapters=details.get('total_chapters', 0),
-            )
-            
-            if details.get('genres'):
-                for genre_name in details['genres']:
-                    genre, _ = Genre.objects.get_or_create(
-                        name=genre_name,
-                        defaults={'slug': slugify(genre_name, allow_unicode=True) or f"genre-{genre_name[:10]}"}
-                    )
-                    manga.genres.add(genre)
-        
-        return manga
+        return ingest.save_manga(slug, 'senkuro', details)
         
     except Exception as e:
         print(f"Error fetching manga {slug}: {e}")
@@ -136,22 +114,7 @@ def _fetch_and_save_chapters(manga, slug):
         return
     
     try:
-        chapters_data = parser.get_chapters(slug)
-        
-        with transaction.atomic():
-            for chapter_data in chapters_data:
-                Chapter.objects.get_or_create(
-                    manga=manga,
-                    number=chapter_data['number'],
-                    defaults={
-                        'title': chapter_data.get('title') or '',
-                        'url': chapter_data['url'],
-                        'volume': chapter_data.get('volume', 1),
-                    }
-                )
-        
-        manga.total_chapters = manga.chapters.count()
-        manga.save(update_fields=['total_chapters'])
+        ingest.save_chapters(manga, parser.iter_chapters(slug))
         
     except Exception as e:
-        print(f"Error fetching chapters for {slug}: {e}")
\ No newline at end of file
+        print(f"Error fetching chapters for {slug}: {e}")
@@ -1,3 +1,5 @@
+import atexit
+
 from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
@@ -5,4 +7,15 @@ class UsersConfig(AppConfig):
     name = 'users'
     
     def ready(self):
-        import users.signals
\ No newline at end of file
+        import users.signals
+        from users import progress
+
+        # Не теряем буфер прогресса при штатной остановке воркера
+        atexit.register(_flush_progress, progress)
+
+
+def _flush_progress(progress):
+    try:
+        progress.flush()
+    except Exception:
+        pass
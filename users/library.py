@@ -0,0 +1,67 @@
+# users/library.py
+"""Библиотека пользователя: закладки по статусам с прогрессом и новыми главами"""
+from django.db.models import Count, FloatField, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from manga.models import Chapter
+from .models import Bookmark, ReadingProgress
+
+
+def library_queryset(user):
+    """
+    Закладки одним запросом.
+
+    Каждая закладка аннотирована:
+        last_chapter_id, last_read_number, last_read_volume — последняя прочитанная глава
+        unread_count — количество глав с номером больше прочитанного
+    """
+    last_read = ReadingProgress.objects.filter(user=user, manga=OuterRef('manga'))
+
+    unread = (
+        Chapter.objects
+        .filter(manga=OuterRef('manga'), number__gt=OuterRef('last_read_number'))
+        .order_by()
+        .values('manga')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+
+    return (
+        Bookmark.objects
+        .filter(user=user)
+        .select_related('manga')
+        .annotate(
+            last_chapter_id=Subquery(last_read.values('last_chapter_id')[:1]),
+            last_read_number=Coalesce(
+                Subquery(last_read.values('last_chapter__number')[:1]),
+                Value(-1.0),
+                output_field=FloatField(),
+            ),
+            last_read_volume=Subquery(last_read.values('last_chapter__volume')[:1]),
+        )
+        .annotate(
+            unread_count=Coalesce(Subquery(unread), Value(0), output_field=IntegerField()),
+        )
+        .order_by('-created_at')
+    )
+
+
+def get_library(user) -> list:
+    """
+    Закладки, сгруппированные по статусу (в порядке Bookmark.STATUS_CHOICES).
+
+    Returns:
+        list: [{'status': 'reading', 'label': 'Reading', 'bookmarks': [...]}, ...]
+    """
+    groups = {key: [] for key, _ in Bookmark.STATUS_CHOICES}
+    for bookmark in library_queryset(user):
+        if bookmark.last_chapter_id is None:
+            bookmark.last_read_number = None
+        groups.setdefault(bookmark.status, []).append(bookmark)
+
+    labels = dict(Bookmark.STATUS_CHOICES)
+    return [
+        {'status': status, 'label': labels.get(status, status), 'bookmarks': bookmarks}
+        for status, bookmarks in groups.items()
+        if bookmarks
+    ]
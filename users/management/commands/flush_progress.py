@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users import progress
+
+
+class Command(BaseCommand):
+    help = 'Сбрасывает буфер прогресса чтения в БД (запускать по cron)'
+
+    def handle(self, *args, **options):
+        written = progress.flush()
+        self.stdout.write(self.style.SUCCESS(f'Записано строк прогресса: {written}'))
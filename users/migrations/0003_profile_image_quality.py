@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 23:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_profile_alter_mangareadingsettings_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='image_quality',
+            field=models.CharField(choices=[('auto', 'Auto (Save-Data)'), ('original', 'Original'), ('high', 'High'), ('saver', 'Data saver')], default='auto', max_length=10),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-18 23:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_profile_image_quality'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='readingprogress',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
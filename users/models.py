@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from manga.models import Manga, Chapter
 
@@ -9,6 +10,14 @@ class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     
     is_vertical = models.BooleanField(default=True, verbose_name="Vertical Reading")
+    IMAGE_QUALITY_CHOICES = [
+        ('auto', 'Auto (Save-Data)'),
+        ('original', 'Original'),
+        ('high', 'High'),
+        ('saver', 'Data saver'),
+    ]
+    # Качество картинок (manga/images.py); auto — по заголовку Save-Data браузера
+    image_quality = models.CharField(max_length=10, choices=IMAGE_QUALITY_CHOICES, default='auto')
     
     def __str__(self):
         return f"Profile: {self.user.username}"
@@ -39,7 +48,8 @@ class ReadingProgress(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='history')
     manga = models.ForeignKey(Manga, on_delete=models.CASCADE)
     last_chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE)
-    updated_at = models.DateTimeField(auto_now=True)
+    # Время чтения главы; ставит users/progress.py при сбросе буфера
+    updated_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         unique_together = ['user', 'manga']
@@ -0,0 +1,176 @@
+# users/progress.py
+"""
+Буфер записи прогресса чтения (write-behind).
+
+Каждое открытие главы раньше делало update_or_create в ReadingProgress.
+Теперь прогресс складывается в кэш (одна запись на пару user/manga —
+последняя глава побеждает) и сбрасывается в БД пачкой: по интервалу,
+при переполнении буфера или командой `manage.py flush_progress`.
+
+Запись прогресса — один cache.set без блокировок. Общая блокировка
+(luanovel.cache.lock) берётся, только когда пары ещё нет в индексе ожидающих:
+иначе параллельные воркеры затирают добавления друг друга, и записи, выпавшие
+из индекса, не сбрасываются никогда. Сброшенные записи не удаляются (запись
+без блокировки между сравнением и удалением потерялась бы), а получают срок
+FLUSHED_TIMEOUT; ожидающей запись считается, только пока её пара в индексе.
+"""
+import logging
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+
+from luanovel.cache import lock
+from luanovel.metrics import record_cache
+from manga.models import Chapter
+from .models import ReadingProgress
+
+logger = logging.getLogger(__name__)
+
+INDEX_KEY = 'progress:pending'
+LAST_FLUSH_KEY = 'progress:last_flush'
+FLUSH_LOCK_KEY = 'progress:flush_lock'
+INDEX_LOCK_KEY = 'progress:index_lock'
+# Сколько живёт уже сброшенная запись
+FLUSHED_TIMEOUT = 3600
+
+
+def _cache():
+    return caches[getattr(settings, 'PROGRESS_CACHE_ALIAS', 'buffers')]
+
+
+def _entry_key(user_id, manga_id) -> str:
+    return f'progress:{user_id}:{manga_id}'
+
+
+def record(user_id: int, manga_id: int, chapter_id: int, number: float):
+    """Запоминает последнюю прочитанную главу без записи в БД"""
+    cache = _cache()
+    cache.set(_entry_key(user_id, manga_id), (chapter_id, float(number), time.time()), None)
+    # Индекс читается после записи: если сброс убрал пару раньше, мы это увидим
+    index = cache.get(INDEX_KEY) or set()
+    if (user_id, manga_id) not in index:
+        with lock(cache, INDEX_LOCK_KEY):
+            index = cache.get(INDEX_KEY) or set()
+            index.add((user_id, manga_id))
+            cache.set(INDEX_KEY, index, None)
+
+    _maybe_flush(cache, len(index))
+
+
+def get_pending(user_id: int, manga_id: int):
+    """Возвращает (chapter_id, number) ещё не сброшенного прогресса или None"""
+    key = _entry_key(user_id, manga_id)
+    values = _cache().get_many([key, INDEX_KEY])
+    entry = values.get(key) if (user_id, manga_id) in values.get(INDEX_KEY, ()) else None
+    record_cache('progress', entry is not None)
+    if entry:
+        return entry[0], entry[1]
+    return None
+
+
+def has_pending(user_id: int) -> bool:
+    index = _cache().get(INDEX_KEY) or set()
+    return any(uid == user_id for uid, _ in index)
+
+
+def flush(user_id: int = None) -> int:
+    """
+    Сбрасывает буфер в БД одним bulk upsert.
+
+    Args:
+        user_id (int): Сбросить только записи этого пользователя
+
+    Returns:
+        int: Количество записанных строк
+    """
+    cache = _cache()
+    index = cache.get(INDEX_KEY) or set()
+    pairs = [pair for pair in index if user_id is None or pair[0] == user_id]
+    if not pairs:
+        return 0
+
+    keys = {_entry_key(*pair): pair for pair in pairs}
+    entries = cache.get_many(list(keys))
+
+    # Глава, манга или пользователь могли быть удалены, пока запись ждала сброса:
+    # такая запись уронила бы весь upsert (и все следующие сбросы) ошибкой FK
+    chapters = dict(
+        Chapter.objects.filter(id__in={entry[0] for entry in entries.values()}).values_list('id', 'manga_id')
+    )
+    users = set(User.objects.filter(id__in={keys[key][0] for key in entries}).values_list('id', flat=True))
+    valid = {
+        key: entry for key, entry in entries.items()
+        if chapters.get(entry[0]) == keys[key][1] and keys[key][0] in users
+    }
+    if len(valid) < len(entries):
+        logger.warning(f"Прогресс чтения: пропущено записей с удалёнными главами или пользователями: "
+                       f"{len(entries) - len(valid)}")
+
+    # updated_at — время чтения из записи, а не время сброса: порядок истории сохраняется
+    objs = [
+        ReadingProgress(
+            user_id=keys[key][0], manga_id=keys[key][1], last_chapter_id=entry[0],
+            updated_at=datetime.fromtimestamp(entry[2], timezone.utc),
+        )
+        for key, entry in valid.items()
+    ]
+    if objs:
+        ReadingProgress.objects.bulk_create(
+            objs,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['user', 'manga'],
+            update_fields=['last_chapter', 'updated_at'],
+        )
+
+    with lock(cache, INDEX_LOCK_KEY):
+        # Пока шла запись, читатель мог уйти на следующую главу — такие записи оставляем
+        current = cache.get_many(list(entries))
+        done = [key for key, entry in entries.items() if current.get(key) == entry]
+        for key in done:
+            cache.touch(key, FLUSHED_TIMEOUT)
+        removed = [*done, *(key for key in keys if key not in entries)]
+
+        index = cache.get(INDEX_KEY) or set()
+        index.difference_update(keys[key] for key in removed)
+        cache.set(INDEX_KEY, index, None)
+
+        # Запись без блокировки могла попасть между чтением current и правкой
+        # индекса и не застать свою пару удалённой — такие пары возвращаем
+        again = cache.get_many(removed)
+        changed = [key for key in removed if again.get(key) not in (None, entries.get(key))]
+        if changed:
+            for key in changed:
+                cache.touch(key, None)
+            index.update(keys[key] for key in changed)
+            cache.set(INDEX_KEY, index, None)
+
+    if user_id is None:
+        cache.set(LAST_FLUSH_KEY, time.time(), None)
+    return len(objs)
+
+
+def _maybe_flush(cache, size: int):
+    """Сброс при переполнении буфера или по истечении интервала"""
+    buffer_size = getattr(settings, 'PROGRESS_BUFFER_SIZE', 200)
+    interval = getattr(settings, 'PROGRESS_FLUSH_INTERVAL', 30)
+
+    last_flush = cache.get(LAST_FLUSH_KEY)
+    if last_flush is None:
+        cache.add(LAST_FLUSH_KEY, time.time(), None)
+        last_flush = time.time()
+
+    if size < buffer_size and time.time() - last_flush < interval:
+        return
+
+    if not cache.add(FLUSH_LOCK_KEY, 1, 60):
+        return
+    try:
+        flush()
+    except Exception as e:
+        logger.error(f"Progress flush error: {e}")
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
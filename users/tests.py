@@ -1,3 +1,161 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from manga.models import Manga, Chapter
+from users import progress
+from users.library import get_library
+from users.models import Bookmark, ReadingProgress
+
+
+class ProgressBufferTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass')
+        cls.manga = Manga.objects.create(
+            title='Test', slug='test', source='senkuro',
+            cover_url='https://example.com/c.jpg', original_url='https://senkuro.me/manga/test',
+        )
+        cls.ch1 = Chapter.objects.create(manga=cls.manga, number=1, url='ch-1')
+        cls.ch2 = Chapter.objects.create(manga=cls.manga, number=2, url='ch-2')
+
+    def setUp(self):
+        caches['buffers'].clear()
+        self.addCleanup(caches['buffers'].clear)
+        self.client.force_login(self.user)
+
+    def test_update_progress_is_buffered_and_visible(self):
+        response = self.client.post(reverse('users:update_progress'), {'chapter_id': self.ch1.id})
+        self.client.post(reverse('users:update_progress'), {'chapter_id': self.ch2.id})
+
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertFalse(ReadingProgress.objects.exists())
+        self.assertEqual(progress.get_pending(self.user.id, self.manga.id), (self.ch2.id, 2.0))
+
+        response = self.client.get(reverse('manga:detail', args=['test']))
+        self.assertEqual(response.context['last_read_chapter_id'], self.ch2.id)
+
+    def test_flush_coalesces_to_latest_chapter(self):
+        progress.record(self.user.id, self.manga.id, self.ch1.id, 1)
+        progress.record(self.user.id, self.manga.id, self.ch2.id, 2)
+
+        self.assertEqual(progress.flush(), 1)
+        self.assertEqual(ReadingProgress.objects.get().last_chapter, self.ch2)
+        self.assertIsNone(progress.get_pending(self.user.id, self.manga.id))
+        self.assertEqual(progress.flush(), 0)
+
+    def test_concurrent_records_are_all_indexed(self):
+        users = [User.objects.create_user(f'r{i}', password='pass') for i in range(8)]
+        threads = [
+            threading.Thread(target=progress.record, args=(user.id, self.manga.id, self.ch1.id, 1))
+            for user in users
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(progress.flush(), 8)
+
+    def test_flush_keeps_read_time(self):
+        with mock.patch('users.progress.time.time', return_value=1_700_000_000):
+            progress.record(self.user.id, self.manga.id, self.ch1.id, 1)
+        progress.flush()
+        self.assertEqual(ReadingProgress.objects.get().updated_at.timestamp(), 1_700_000_000)
+
+    def test_repeated_record_takes_no_lock(self):
+        progress.record(self.user.id, self.manga.id, self.ch1.id, 1)
+        with mock.patch('users.progress.lock', side_effect=AssertionError):
+            progress.record(self.user.id, self.manga.id, self.ch2.id, 2)
+        self.assertEqual(progress.get_pending(self.user.id, self.manga.id), (self.ch2.id, 2.0))
+
+    def test_record_during_flush_is_not_lost(self):
+        progress.record(self.user.id, self.manga.id, self.ch1.id, 1)
+        cache = caches['buffers']
+        touch = cache.touch
+
+        def touch_after_record(key, timeout):
+            # Читатель перешёл на следующую главу, пока сброс правил индекс
+            if timeout == progress.FLUSHED_TIMEOUT:
+                progress.record(self.user.id, self.manga.id, self.ch2.id, 2)
+            return touch(key, timeout)
+
+        with mock.patch.object(cache, 'touch', side_effect=touch_after_record):
+            self.assertEqual(progress.flush(), 1)
+        self.assertEqual(progress.get_pending(self.user.id, self.manga.id), (self.ch2.id, 2.0))
+        self.assertEqual(progress.flush(), 1)
+        self.assertEqual(ReadingProgress.objects.get().last_chapter, self.ch2)
+
+    def test_deleted_chapter_does_not_block_flush(self):
+        other = Manga.objects.create(title='Other', slug='other', cover_url='https://example.com/c.jpg',
+                                     original_url='https://senkuro.me/manga/other')
+        gone = Chapter.objects.create(manga=other, number=1, url='other-1')
+        progress.record(self.user.id, other.id, gone.id, 1)
+        progress.record(self.user.id, self.manga.id, self.ch1.id, 1)
+        gone.delete()
+
+        self.assertEqual(progress.flush(), 1)
+        self.assertEqual(ReadingProgress.objects.get().last_chapter, self.ch1)
+        self.assertFalse(progress.has_pending(self.user.id))
+
+    def test_size_limit_triggers_flush(self):
+        with self.settings(PROGRESS_BUFFER_SIZE=1):
+            progress.record(self.user.id, self.manga.id, self.ch1.id, 1)
+        self.assertTrue(ReadingProgress.objects.filter(last_chapter=self.ch1).exists())
+
+
+class LibraryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass')
+
+    def setUp(self):
+        caches['buffers'].clear()
+        self.addCleanup(caches['buffers'].clear)
+
+    def _add_title(self, slug, status, chapters=3, read=None):
+        manga = Manga.objects.create(
+            title=slug, slug=slug, source='senkuro',
+            cover_url='https://example.com/c.jpg', original_url=f'https://senkuro.me/manga/{slug}',
+        )
+        created = [Chapter.objects.create(manga=manga, number=n, url=f'{slug}-{n}') for n in range(1, chapters + 1)]
+        Bookmark.objects.create(user=self.user, manga=manga, status=status)
+        if read:
+            ReadingProgress.objects.create(user=self.user, manga=manga, last_chapter=created[read - 1])
+        return manga
+
+    def _profile_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('users:profile', args=['reader']))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_unread_counts_and_grouping(self):
+        self._add_title('a', 'reading', chapters=5, read=2)
+        self._add_title('b', 'planned', chapters=4)
+
+        library = get_library(self.user)
+
+        self.assertEqual([group['status'] for group in library], ['reading', 'planned'])
+        reading = library[0]['bookmarks'][0]
+        self.assertEqual(reading.last_read_number, 2)
+        self.assertEqual(reading.unread_count, 3)
+        planned = library[1]['bookmarks'][0]
+        self.assertIsNone(planned.last_read_number)
+        self.assertEqual(planned.unread_count, 4)
+
+    def test_profile_queries_do_not_grow_with_library(self):
+        self._add_title('a', 'reading', read=1)
+        baseline = self._profile_queries()
+
+        for slug in ('b', 'c', 'd'):
+            self._add_title(slug, 'completed', read=2)
 
-# Create your tests here.
+        self.assertEqual(self._profile_queries(), baseline)
@@ -11,5 +11,7 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
     path('bookmark/toggle/', views.toggle_bookmark, name='toggle_bookmark'),
     path('@<str:username>/', views.profile, name='profile'),
-    path('update-progress/', views.update_reading_progress, name='update_progress')
+    path('update-progress/', views.update_reading_progress, name='update_progress'),
+    path('library/', views.library, name='library'),
+    path('image-quality/', views.set_image_quality, name='set_image_quality'),
 ]
\ No newline at end of file
@@ -3,7 +3,10 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from .forms import UserRegisterForm
 from manga.models import Manga
-from .models import Bookmark, ReadingProgress, Chapter
+from .models import Bookmark, Chapter, Profile
+from . import progress
+from .library import get_library
+from manga import counters, images
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
@@ -26,12 +29,7 @@ def update_reading_progress(request):
         chapter_id = request.POST.get('chapter_id')
         chapter = get_object_or_404(Chapter, id=chapter_id)
         
-
-        progress, created = ReadingProgress.objects.update_or_create(
-            user=request.user,
-            manga=chapter.manga,
-            defaults={'last_chapter': chapter}
-        )
+        progress.record(request.user.id, chapter.manga_id, chapter.id, chapter.number)
         
 
         return JsonResponse({
@@ -50,7 +48,9 @@ def toggle_bookmark(request):
         manga = get_object_or_404(Manga, id=manga_id)
         
         if status == 'remove':
-            Bookmark.objects.filter(user=request.user, manga=manga).delete()
+            deleted, _ = Bookmark.objects.filter(user=request.user, manga=manga).delete()
+            if deleted:
+                counters.incr(manga.id, 'bookmarks_count', -1)
             return JsonResponse({'status': 'success', 'message': 'Удалено из закладок'})
         
         bookmark, created = Bookmark.objects.update_or_create(
@@ -58,6 +58,8 @@ def toggle_bookmark(request):
             manga=manga,
             defaults={'status': status}
         )
+        if created:
+            counters.incr(manga.id, 'bookmarks_count')
         
 
         status_display = dict(Bookmark.STATUS_CHOICES).get(status, status)
@@ -65,18 +67,64 @@ def toggle_bookmark(request):
     
     return JsonResponse({'status': 'error', 'message': 'Неверный запрос'}, status=400)
 
+@login_required
+def set_image_quality(request):
+    """Качество картинок в читалке и каталоге (manga/images.py)"""
+    quality = request.POST.get('image_quality')
+    if request.method != 'POST' or quality not in dict(Profile.IMAGE_QUALITY_CHOICES):
+        return JsonResponse({'status': 'error', 'message': 'Неверный запрос'}, status=400)
+    profile, _ = Profile.objects.get_or_create(user=request.user)
+    profile.image_quality = quality
+    # post_save сбрасывает кэш настройки в manga.images
+    profile.save(update_fields=['image_quality'])
+    return JsonResponse({'status': 'success', 'image_quality': quality})
+
 def profile(request, username):
 
     profile_user = get_object_or_404(User, username=username)
     
-    bookmarks = profile_user.bookmarks.all().select_related('manga')
+    if request.user == profile_user and progress.has_pending(profile_user.id):
+        progress.flush(user_id=profile_user.id)
+    
+    library = get_library(profile_user)
     
     history = profile_user.history.all().select_related('manga', 'last_chapter')[:10]
 
     context = {
         'profile_user': profile_user,
-        'bookmarks': bookmarks,
+        'library': library,
         'history': history,
-        'is_own_profile': request.user == profile_user 
+        'is_own_profile': request.user == profile_user,
+        'image_tier': images.image_tier(request),
+        'image_quality_choices': Profile.IMAGE_QUALITY_CHOICES,
+        'image_quality': images.preference(request.user) if request.user == profile_user else None,
     }
     return render(request, 'users/profile.html', context)
+
+
+@login_required
+def library(request):
+    """Библиотека текущего пользователя в JSON"""
+    if progress.has_pending(request.user.id):
+        progress.flush(user_id=request.user.id)
+
+    groups = []
+    for group in get_library(request.user):
+        groups.append({
+            'status': group['status'],
+            'label': group['label'],
+            'items': [
+                {
+                    'manga_id': bookmark.manga.id,
+                    'slug': bookmark.manga.slug,
+                    'title': bookmark.manga.title,
+                    'cover_url': bookmark.manga.cover_url,
+                    'last_chapter_id': bookmark.last_chapter_id,
+                    'last_read_number': bookmark.last_read_number,
+                    'last_read_volume': bookmark.last_read_volume,
+                    'unread_count': bookmark.unread_count,
+                }
+                for bookmark in group['bookmarks']
+            ],
+        })
+    return JsonResponse({'library': groups})